@@ -13,8 +13,6 @@ from flask import Flask, g, request, make_response, jsonify, session
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -143,6 +141,81 @@ app.config["TELEGRAM_CHAT_ID"] = os.environ.get("TELEGRAM_CHAT_ID")
 if not app.config["TELEGRAM_BOT_TOKEN"] or not app.config["TELEGRAM_CHAT_ID"]:
     logger.warning("Telegram configuration is missing. Notifications will not work.")
 
+# Website check engine configuration
+app.config["CHECK_CONCURRENCY"] = int(os.environ.get("CHECK_CONCURRENCY", "20"))  # Max fetches in flight per run
+app.config["FETCH_TIMEOUT"] = float(os.environ.get("FETCH_TIMEOUT", "30"))  # Per-request timeout in seconds
+app.config["FETCH_MAX_BYTES"] = int(os.environ.get("FETCH_MAX_BYTES", str(5 * 1024 * 1024)))  # Default per-page download cap
+app.config["FETCH_ALLOWED_CONTENT_TYPES"] = [
+    content_type.strip().lower()
+    for content_type in os.environ.get(
+        "FETCH_ALLOWED_CONTENT_TYPES",
+        "text/html,application/xhtml+xml,application/xml,text/xml,text/plain"
+    ).split(',')
+    if content_type.strip()
+]
+app.config["CHECK_DEDUP_WINDOW"] = float(os.environ.get("CHECK_DEDUP_WINDOW", "300"))  # Seconds a fetched URL is reused across users
+app.config["FETCH_MAX_CONNECTIONS"] = int(os.environ.get("FETCH_MAX_CONNECTIONS", "100"))  # Pooled connections per process
+app.config["FETCH_MAX_CONNECTIONS_PER_HOST"] = int(os.environ.get("FETCH_MAX_CONNECTIONS_PER_HOST", "6"))
+app.config["FETCH_KEEPALIVE_EXPIRY"] = float(os.environ.get("FETCH_KEEPALIVE_EXPIRY", "60"))  # Idle keep-alive seconds
+# Content extraction runs in a process pool, created on the first check a process runs
+# (0 = extract in the calling thread). Every gunicorn worker, the scheduler and each
+# check worker gets its own pool, so keep it small. The pool isn't forked from the
+# multi-threaded parent: forkserver (or spawn) workers start from a clean process.
+app.config["EXTRACTION_WORKERS"] = int(os.environ.get("EXTRACTION_WORKERS", str(min(2, os.cpu_count() or 1))))
+app.config["EXTRACTION_START_METHOD"] = os.environ.get("EXTRACTION_START_METHOD", "forkserver")
+# Callable ("module.function") that strips volatile tokens from raw HTML before fingerprinting ("none" to disable)
+app.config["RAW_FINGERPRINT_NORMALIZER"] = os.environ.get("RAW_FINGERPRINT_NORMALIZER", "")
+# Per-host politeness limits: requests per second and burst, with optional "domain=rate:burst,..." overrides
+app.config["FETCH_HOST_RATE"] = float(os.environ.get("FETCH_HOST_RATE", "1"))
+app.config["FETCH_HOST_BURST"] = int(os.environ.get("FETCH_HOST_BURST", "3"))
+app.config["FETCH_HOST_LIMITS"] = os.environ.get("FETCH_HOST_LIMITS", "")
+# Check results are written in batches: flushed every N results, or when a result arrives this many seconds after the first
+app.config["CHECK_WRITE_BATCH_SIZE"] = int(os.environ.get("CHECK_WRITE_BATCH_SIZE", "100"))
+app.config["CHECK_WRITE_FLUSH_INTERVAL"] = float(os.environ.get("CHECK_WRITE_FLUSH_INTERVAL", "5"))
+app.config["CHECK_WRITER_MODE"] = os.environ.get("CHECK_WRITER_MODE", "batch")  # batch or copy
+# Check history retention: keep the latest N checks (plus the latest change) per website,
+# pruned by a separate maintenance job on its own cron schedule
+app.config["CHECK_RETENTION_KEEP"] = int(os.environ.get("CHECK_RETENTION_KEEP", "3"))
+app.config["CHECK_RETENTION_BATCH_SIZE"] = int(os.environ.get("CHECK_RETENTION_BATCH_SIZE", "500"))  # Websites per DELETE
+app.config["CHECK_RETENTION_CRON"] = os.environ.get("CHECK_RETENTION_CRON", "15 * * * *")
+# "count" keeps CHECK_RETENTION_KEEP checks per website; "partition" keeps CHECK_HISTORY_RETENTION_DAYS
+# of history in monthly partitions of checks (see "python db_utils.py partition")
+app.config["CHECK_RETENTION_MODE"] = os.environ.get("CHECK_RETENTION_MODE", "count").lower()
+app.config["CHECK_HISTORY_RETENTION_DAYS"] = int(os.environ.get("CHECK_HISTORY_RETENTION_DAYS", "90"))
+app.config["CHECK_PARTITION_PREMAKE_MONTHS"] = int(os.environ.get("CHECK_PARTITION_PREMAKE_MONTHS", "2"))
+# Lookback bound for "recent checks" queries so only the newest partitions are scanned
+app.config["CHECK_RECENT_WINDOW_DAYS"] = int(os.environ.get("CHECK_RECENT_WINDOW_DAYS", "31"))
+# Compressed extracted-text snapshots, stored once per content hash: "database", "filesystem" or "none"
+app.config["SNAPSHOT_BACKEND"] = os.environ.get("SNAPSHOT_BACKEND", "database").lower()
+app.config["SNAPSHOT_DIR"] = os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots"))
+app.config["SNAPSHOT_COMPRESSION_LEVEL"] = int(os.environ.get("SNAPSHOT_COMPRESSION_LEVEL", "0"))  # 0 = codec default
+# Minimum SimHash Hamming distance (0-64) from the last significant version for a change to be
+# reported; 0 reports every change. Websites can override it with change_threshold
+app.config["CHANGE_SIMHASH_THRESHOLD"] = int(os.environ.get("CHANGE_SIMHASH_THRESHOLD", "0"))
+# Website listing page sizes (dashboard first page and GET /api/websites)
+app.config["WEBSITE_PAGE_SIZE"] = int(os.environ.get("WEBSITE_PAGE_SIZE", "50"))
+app.config["WEBSITE_PAGE_SIZE_MAX"] = int(os.environ.get("WEBSITE_PAGE_SIZE_MAX", "200"))
+# Scheduler processes elect a leader with this PostgreSQL advisory lock; standbys retry every N seconds
+app.config["SCHEDULER_LOCK_ID"] = int(os.environ.get("SCHEDULER_LOCK_ID", "727401"))
+app.config["SCHEDULER_LEADER_POLL_INTERVAL"] = float(os.environ.get("SCHEDULER_LEADER_POLL_INTERVAL", "15"))
+# Scheduler jobs persist in this table; runs missed while no scheduler was up still fire
+# (once) if they are at most SCHEDULER_MISFIRE_GRACE_TIME seconds late
+app.config["SCHEDULER_JOBS_TABLE"] = os.environ.get("SCHEDULER_JOBS_TABLE", "apscheduler_jobs")
+app.config["SCHEDULER_MISFIRE_GRACE_TIME"] = int(os.environ.get("SCHEDULER_MISFIRE_GRACE_TIME", "600"))
+# Check work queue: when enabled, scheduled runs, /api/check-all and "db_utils.py check" queue
+# website ids in check_tasks and worker.py processes run them
+app.config["CHECK_QUEUE_ENABLED"] = os.environ.get("CHECK_QUEUE_ENABLED", "false").lower() in ("1", "true", "yes")
+app.config["CHECK_QUEUE_BATCH_SIZE"] = int(os.environ.get("CHECK_QUEUE_BATCH_SIZE", "100"))  # Tasks claimed per batch
+app.config["CHECK_QUEUE_VISIBILITY_TIMEOUT"] = int(os.environ.get("CHECK_QUEUE_VISIBILITY_TIMEOUT", "600"))  # Seconds before an unacked claim expires
+app.config["CHECK_QUEUE_MAX_ATTEMPTS"] = int(os.environ.get("CHECK_QUEUE_MAX_ATTEMPTS", "5"))
+app.config["CHECK_QUEUE_RETRY_DELAY"] = int(os.environ.get("CHECK_QUEUE_RETRY_DELAY", "30"))  # First retry backoff, doubled per attempt
+app.config["CHECK_QUEUE_POLL_INTERVAL"] = float(os.environ.get("CHECK_QUEUE_POLL_INTERVAL", "2"))  # Idle worker poll interval
+app.config["CHECK_QUEUE_CLEANUP_INTERVAL"] = float(os.environ.get("CHECK_QUEUE_CLEANUP_INTERVAL", "60"))  # Seconds between drops of exhausted tasks
+# Spread each schedule's checks over this many seconds after its fire time, in slots of
+# SCHEDULE_JITTER_STEP seconds; users are hashed to a fixed slot (0 = everyone runs on time)
+app.config["SCHEDULE_JITTER_WINDOW"] = int(os.environ.get("SCHEDULE_JITTER_WINDOW", "0"))
+app.config["SCHEDULE_JITTER_STEP"] = int(os.environ.get("SCHEDULE_JITTER_STEP", "60"))
+
 # Initialize database
 db.init_app(app)
 
@@ -164,174 +237,17 @@ def close_db_session(exception=None):
         session.close()
 
 def init_scheduler():
-    """Initialize the background scheduler for user-specific website checks"""
-    try:
-        # Shutdown existing scheduler if it exists
-        if hasattr(app, 'scheduler') and app.scheduler:
-            try:
-                app.scheduler.shutdown()
-                logger.info("Existing scheduler shut down")
-            except Exception as e:
-                logger.error(f"Error shutting down existing scheduler: {str(e)}")
-                
-        # Create new scheduler with explicit timezone configuration
-        # Use US Pacific Time as the primary timezone for scheduling
-        import pytz
-        scheduler_timezone = pytz.timezone('America/Los_Angeles')  # PST/PDT timezone
-        logger.info(f"Initializing scheduler with timezone: {scheduler_timezone} (US Pacific Time)")
-        
-        # Configure scheduler with timezone and job defaults
-        scheduler = BackgroundScheduler(
-            timezone=scheduler_timezone,
-            job_defaults={
-                'coalesce': True,       # Combine multiple waiting instances
-                'max_instances': 1,     # Only allow one instance to run at a time
-                'misfire_grace_time': 60 * 10  # Allow 10 minutes of misfires
-            }
-        )
-        
-        def check_websites_for_user(user_id=None, telegram_bot_token=None, telegram_chat_id=None):
-            """Check websites for a specific user or all websites if user_id is None"""
-            
-            # Create fresh application context for this job
-            with app.app_context():
-                try:
-                    # Import models within the function to avoid circular imports
-                    from models import Website, User
-                    from monitor import WebsiteMonitor
-                    
-                    if user_id:
-                        # Check websites for a specific user
-                        user = User.query.get(user_id)
-                        if not user:
-                            logger.error(f"User {user_id} not found for scheduled check")
-                            return
-                        
-                        # Use user's telegram chat ID if available, otherwise use the one passed in
-                        user_telegram_chat_id = user.telegram_chat_id or telegram_chat_id
-                        
-                        # Initialize monitor with user-specific settings for both Telegram and email
-                        monitor = WebsiteMonitor(
-                            telegram_bot_token=telegram_bot_token,
-                            telegram_chat_id=user_telegram_chat_id,
-                            email_notifications_enabled=user.email_notifications_enabled,
-                            notification_email=user.notification_email or user.email
-                        )
-                        
-                        # Get only this user's websites
-                        websites = Website.query.filter_by(user_id=user_id).all()
-                        logger.info(f"Checking {len(websites)} websites for user {user.username} (ID: {user_id})")
-                    else:
-                        # Legacy mode: check all websites (for backward compatibility)
-                        # Initialize monitor with global telegram settings
-                        # For legacy mode, we don't enable email notifications
-                        monitor = WebsiteMonitor(
-                            telegram_bot_token=app.config["TELEGRAM_BOT_TOKEN"],
-                            telegram_chat_id=app.config["TELEGRAM_CHAT_ID"],
-                            email_notifications_enabled=False,
-                            notification_email=None
-                        )
-                        
-                        # Get all websites
-                        websites = Website.query.all()
-                        logger.info(f"Checking {len(websites)} websites (global check)")
-                    
-                    # Check each website and properly close session after each one
-                    for website in websites:
-                        try:
-                            monitor.check_website(website)
-                            # Sleep a brief moment between website checks to avoid overwhelming the database
-                            import time
-                            time.sleep(1)
-                        except Exception as e:
-                            logger.error(f"Error checking website {website.url}: {str(e)}")
-                            # Continue with next website even if this one fails
-                            
-                except Exception as e:
-                    logger.error(f"Error in scheduled website check: {str(e)}")
-                finally:
-                    # Make sure everything is properly cleaned up
-                    db.session.remove()
-
-        # First, add default global checks at fixed times (for backward compatibility)
-        scheduler.add_job(
-            check_websites_for_user,
-            CronTrigger(
-                hour='8', 
-                minute='0', 
-                timezone=scheduler_timezone  # Use same timezone as the rest of the scheduler
-            ),
-            id='global_check',
-            name='Global Website Check',
-            replace_existing=True
-        )
-        
-        # Then, try to add user-specific schedule jobs from the database
-        with app.app_context():
-            try:
-                from models import User
-                
-                # Get all active users and set up their schedules
-                users = User.query.filter_by(is_active=True).all()
-                logger.info(f"Setting up schedules for {len(users)} active users")
-                
-                for user in users:
-                    # Skip users without schedules
-                    if not any([user.schedule_1, user.schedule_2, user.schedule_3, user.schedule_4]):
-                        logger.info(f"User {user.username} has no schedules defined, skipping")
-                        continue
-                    
-                    user_id_str = str(user.id)
-                    
-                    # Add each of the user's schedules if defined
-                    schedule_fields = [
-                        (user.schedule_1, "1"), 
-                        (user.schedule_2, "2"), 
-                        (user.schedule_3, "3"), 
-                        (user.schedule_4, "4")
-                    ]
-                    
-                    for schedule, num in schedule_fields:
-                        if not schedule:
-                            continue
-                            
-                        # Parse cron expression
-                        try:
-                            parts = schedule.split()
-                            if len(parts) != 5:  # must have 5 parts: minute, hour, day, month, day_of_week
-                                logger.error(f"Invalid cron expression for user {user.username}: {schedule}")
-                                continue
-                                
-                            minute, hour, day, month, day_of_week = parts
-                            
-                            scheduler.add_job(
-                                check_websites_for_user,
-                                CronTrigger(
-                                    minute=minute, 
-                                    hour=hour, 
-                                    day=day, 
-                                    month=month, 
-                                    day_of_week=day_of_week,
-                                    timezone=scheduler_timezone  # Explicitly use the scheduler timezone
-                                ),
-                                kwargs={
-                                    'user_id': user_id_str,
-                                    'telegram_bot_token': app.config["TELEGRAM_BOT_TOKEN"],
-                                    'telegram_chat_id': user.telegram_chat_id or app.config["TELEGRAM_CHAT_ID"]
-                                },
-                                id=f'user_{user_id_str}_schedule_{num}',
-                                name=f'User {user.username} Schedule {num}',
-                                replace_existing=True
-                            )
-                            logger.info(f"Added schedule {num} for user {user.username}: {schedule}")
-                        except Exception as e:
-                            logger.error(f"Error setting up schedule {num} for user {user.username}: {str(e)}")
-            except Exception as e:
-                logger.error(f"Error setting up user schedules: {str(e)}")
+    """
+    Start the leader-elected scheduler in a background thread of this process
 
-        scheduler.start()
-        logger.info("Scheduler started successfully with global and user-specific website checks")
-        return scheduler
+    Used by the development server (python main.py). In production the scheduler
+    runs as its own process (python scheduler.py) so web workers never run jobs.
+    """
+    try:
+        from scheduler import SchedulerService
+        service = SchedulerService()
+        service.start()
+        return service
     except Exception as e:
         logger.error(f"Failed to initialize scheduler: {str(e)}")
         return None
@@ -488,4 +404,4 @@ if app.config.get("GOOGLE_CLIENT_ID") and app.config.get("GOOGLE_CLIENT_SECRET")
 # Import routes after blueprints are registered
 from routes import *  # noqa: F401, E402
 
-# Note: The scheduler will be initialized in main.py
\ No newline at end of file
+# Note: The scheduler runs in its own process (scheduler.py), or in main.py for local development
\ No newline at end of file
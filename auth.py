@@ -152,6 +152,9 @@ def register():
         user.set_password(form.password.data)
         
         db.session.add(user)
+        # Schedule the default check for the new account
+        from scheduler import notify_schedule_change
+        notify_schedule_change(user.id)
         db.session.commit()
         
         # Set toast message in session
@@ -235,6 +238,9 @@ def google_authorize():
                 schedule_1="0 8 * * *"  # Default: 8am daily
             )
             db.session.add(user)
+            # Schedule the default check for the new account
+            from scheduler import notify_schedule_change
+            notify_schedule_change(user.id)
             db.session.commit()
             from app import set_toast_message_in_session
             set_toast_message_in_session('Account created with Google authentication!', 'success')
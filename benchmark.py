@@ -0,0 +1,347 @@
+"""
+Check Pipeline Benchmark for WebWatchDog
+Measures end-to-end website check throughput against a local HTTP stand-in
+
+Starts a local HTTP server serving a generated corpus of realistic HTML pages
+(configurable latency, size, error rate and change rate), points a throwaway
+benchmark user's websites at it and runs the real check pipeline
+(WebsiteMonitor.check_websites) against the configured PostgreSQL database.
+
+Reports pages/sec, per-check latency percentiles, CPU time per check and DB time
+per check as JSON, so runs can be compared before deploying.
+
+Usage:
+    DATABASE_URL=postgresql://postgres@localhost/webwatchdog_bench \\
+        python benchmark.py --sites 500 --runs 3 --latency-ms 150 --output bench.json
+
+Use a disposable database: the benchmark creates (and afterwards deletes) its own
+user and websites, but the app creates/migrates tables on import.
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "monitor website change content update release price stock available order shipping "
+    "product service customer support account policy privacy terms news article report "
+    "market season event schedule ticket launch feature design review community team"
+).split()
+
+
+def generate_page(page_id, version, size_bytes):
+    """
+    Build a deterministic HTML page resembling a typical article/product page
+
+    Args:
+        page_id (int): Page number in the corpus
+        version (int): Content version; bumping it changes the article text
+        size_bytes (int): Approximate size of the page body
+
+    Returns:
+        bytes: HTML document
+    """
+    rng = random.Random(page_id * 1000003 + version)
+    nonce = uuid.uuid4().hex  # Changes on every response, like a real CSP nonce
+
+    head = (
+        "<!DOCTYPE html><html lang=\"en\"><head><meta charset=\"utf-8\">"
+        f"<title>Benchmark page {page_id}</title>"
+        f"<meta name=\"csrf-token\" content=\"{uuid.uuid4().hex}\">"
+        f"<script nonce=\"{nonce}\">window.dataLayer=[];</script>"
+        "<link rel=\"stylesheet\" href=\"/static/site.css\"></head><body>\n"
+        "<nav><ul>" + "".join(f"<li><a href=\"/section/{i}\">Section {i}</a></li>" for i in range(8)) + "</ul></nav>\n"
+        f"<main><article><h1>Benchmark page {page_id}</h1>\n"
+    )
+    tail = (
+        "</article></main>\n"
+        f"<form><input type=\"hidden\" name=\"csrfmiddlewaretoken\" value=\"{uuid.uuid4().hex}\"></form>\n"
+        "<footer><p>Footer links and copyright notice</p></footer></body></html>\n"
+    )
+
+    paragraphs = []
+    length = len(head) + len(tail)
+    while length < size_bytes:
+        sentence_count = rng.randint(3, 8)
+        text = " ".join(
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+            for _ in range(sentence_count)
+        )
+        paragraph = f"<p>{text}</p>\n"
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+
+    return (head + "".join(paragraphs) + tail).encode()
+
+
+class CorpusServer:
+    """Local HTTP stand-in serving /page/<n> with configurable latency, errors and changes"""
+
+    def __init__(self, pages, size_bytes, latency_ms, jitter_ms, error_rate, seed=0):
+        self.pages = pages
+        self.size_bytes = size_bytes
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.versions = [0] * pages
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def advance(self, change_rate):
+        """Change each page's content with probability change_rate; returns the number changed"""
+        changed = 0
+        for i in range(self.pages):
+            if self.rng.random() < change_rate:
+                self.versions[i] += 1
+                changed += 1
+        return changed
+
+    def start(self):
+        corpus = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with corpus._lock:
+                    corpus.requests += 1
+                    fail = corpus.rng.random() < corpus.error_rate
+                    delay = max(0, corpus.latency_ms + corpus.rng.uniform(-corpus.jitter_ms, corpus.jitter_ms))
+                time.sleep(delay / 1000.0)
+
+                parts = self.path.strip('/').split('/')
+                if fail or len(parts) != 2 or parts[0] != 'page' or not parts[1].isdigit() \
+                        or int(parts[1]) >= corpus.pages:
+                    body = b"Internal Server Error" if fail else b"Not Found"
+                    self.send_response(500 if fail else 404)
+                    self.send_header('Content-Type', 'text/plain')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                page_id = int(parts[1])
+                body = generate_page(page_id, corpus.versions[page_id], corpus.size_bytes)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='benchmark-http', daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class DatabaseTimer:
+    """Accumulates wall time and statement count of every SQL statement on an engine"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.seconds = 0.0
+        self.statements = 0
+        self._local = threading.local()
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            self._local.started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(self._local, 'started', None)
+            if started is not None:
+                self.seconds += time.perf_counter() - started
+                self.statements += 1
+
+    def reset(self):
+        self.seconds = 0.0
+        self.statements = 0
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def cpu_seconds():
+    """CPU time of this process plus reaped children (extraction workers)"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_benchmark(args):
+    """Run the benchmark and return the results as a dict"""
+    from app import app, db
+    from models import User, Website
+    from monitor import WebsiteMonitor
+    from snapshots import release_website_snapshots
+    from extraction import shutdown_extraction_pool, warm_extraction_pool
+
+    # Measure the pipeline, not politeness: every site lives on 127.0.0.1
+    app.config["FETCH_HOST_RATE"] = args.host_rate
+    app.config["FETCH_MAX_CONNECTIONS_PER_HOST"] = args.concurrency
+    app.config["CHECK_DEDUP_WINDOW"] = 0
+    if args.extraction_workers is not None:
+        app.config["EXTRACTION_WORKERS"] = args.extraction_workers
+
+    class InstrumentedMonitor(WebsiteMonitor):
+        """Records per-check latency: fetch time plus time until the result is committed"""
+
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            self.latencies = []
+            self.extraction_seconds = 0.0
+
+        def extract_results(self, fetch_results):
+            started = time.perf_counter()
+            super().extract_results(fetch_results)
+            self.extraction_seconds += time.perf_counter() - started
+
+        def evaluate_website(self, website, fetch_result):
+            started = time.perf_counter()
+            outcome = super().evaluate_website(website, fetch_result)
+            outcome.bench_started = started - fetch_result.elapsed
+            return outcome
+
+        def notify_outcome(self, outcome):
+            # Called once the outcome's batch is committed
+            self.latencies.append(time.perf_counter() - outcome.bench_started)
+            super().notify_outcome(outcome)
+
+    corpus = CorpusServer(args.sites, args.page_kb * 1024, args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    base_url = corpus.start()
+    logger.info(f"Corpus server listening on {base_url} ({args.sites} pages of ~{args.page_kb} KB)")
+
+    results = {
+        'config': vars(args),
+        'runs': []
+    }
+
+    with app.app_context():
+        db_timer = DatabaseTimer(db.engine)
+        suffix = uuid.uuid4().hex[:8]
+        user = User(email=f"bench-{suffix}@example.invalid", username=f"bench-{suffix}", is_active=True, schedule_1=None)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        try:
+            db.session.bulk_save_objects([
+                Website(url=f"{base_url}/page/{i}", user_id=user_id) for i in range(args.sites)
+            ])
+            db.session.commit()
+
+            for run_number in range(1, args.runs + 1):
+                changed_pages = corpus.advance(args.change_rate) if run_number > 1 else 0
+                websites = Website.query.filter_by(user_id=user_id).all()
+                monitor = InstrumentedMonitor(concurrency=args.concurrency)
+
+                # Start the extraction workers (reaped after every run, see below)
+                # outside the timed window, so each run measures checks, not start-up
+                warm_extraction_pool(app.config["EXTRACTION_WORKERS"], app.config["EXTRACTION_START_METHOD"])
+
+                requests_before = corpus.requests
+                db_timer.reset()
+                cpu_before = cpu_seconds()
+                started = time.perf_counter()
+
+                outcomes = monitor.check_websites(websites, use_cache=False)
+
+                wall = time.perf_counter() - started
+                # Reap pool workers so their CPU time shows up in RUSAGE_CHILDREN
+                shutdown_extraction_pool(wait=True)
+                cpu = cpu_seconds() - cpu_before
+                checks = len(outcomes) or 1
+
+                run = {
+                    'run': run_number,
+                    'sites': len(outcomes),
+                    'pages_changed_on_server': changed_pages,
+                    'http_requests': corpus.requests - requests_before,
+                    'changes_detected': sum(1 for _, has_changed in outcomes if has_changed),
+                    'errors': sum(1 for website, _ in outcomes if website.status == 'error'),
+                    'wall_seconds': round(wall, 4),
+                    'pages_per_second': round(len(outcomes) / wall, 2) if wall else None,
+                    'latency_ms': {
+                        'p50': round(percentile(monitor.latencies, 50) * 1000, 2) if monitor.latencies else None,
+                        'p95': round(percentile(monitor.latencies, 95) * 1000, 2) if monitor.latencies else None,
+                        'p99': round(percentile(monitor.latencies, 99) * 1000, 2) if monitor.latencies else None,
+                        'mean': round(statistics.mean(monitor.latencies) * 1000, 2) if monitor.latencies else None,
+                    },
+                    'cpu_ms_per_check': round(cpu / checks * 1000, 3),
+                    'db_ms_per_check': round(db_timer.seconds / checks * 1000, 3),
+                    'db_statements_per_check': round(db_timer.statements / checks, 2),
+                    'extraction_seconds': round(monitor.extraction_seconds, 4),
+                }
+                results['runs'].append(run)
+                logger.info(f"Run {run_number}: {run['pages_per_second']} pages/s, "
+                            f"p95 {run['latency_ms']['p95']} ms, {run['db_ms_per_check']} DB ms/check")
+        finally:
+            db.session.rollback()
+            if not args.keep:
+                # Drop the snapshot references of the benchmark's checks before they cascade away
+                for website_id, in db.session.query(Website.id).filter_by(user_id=user_id):
+                    release_website_snapshots(db.session.connection(), website_id)
+                db.session.delete(db.session.get(User, user_id))
+                db.session.commit()
+            corpus.stop()
+
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the WebWatchDog check pipeline against a local HTTP server")
+    parser.add_argument('--sites', type=int, default=200, help="Number of websites/pages (default: 200)")
+    parser.add_argument('--runs', type=int, default=3, help="Check runs; run 1 records baseline hashes (default: 3)")
+    parser.add_argument('--page-kb', type=int, default=100, help="Approximate page size in KB (default: 100)")
+    parser.add_argument('--latency-ms', type=float, default=100.0, help="Server response latency (default: 100)")
+    parser.add_argument('--jitter-ms', type=float, default=50.0, help="Random +/- latency jitter (default: 50)")
+    parser.add_argument('--error-rate', type=float, default=0.01, help="Fraction of requests answered with 500 (default: 0.01)")
+    parser.add_argument('--change-rate', type=float, default=0.1, help="Fraction of pages changed between runs (default: 0.1)")
+    parser.add_argument('--concurrency', type=int, default=20, help="Fetch concurrency (default: 20)")
+    parser.add_argument('--extraction-workers', type=int, default=None, help="Override EXTRACTION_WORKERS")
+    parser.add_argument('--host-rate', type=float, default=0.0, help="Per-host rate limit; 0 disables it (default: 0)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for errors and changes (default: 0)")
+    parser.add_argument('--output', help="Write JSON results to this file instead of stdout")
+    parser.add_argument('--keep', action='store_true', help="Keep the benchmark user and websites afterwards")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run_benchmark(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+        print(f"Benchmark results written to {args.output}")
+    else:
+        print(output)
+    sys.exit(0)
@@ -0,0 +1,226 @@
+"""
+Check Queue Module for WebWatchDog
+Durable work queue of website checks in the check_tasks table
+
+With CHECK_QUEUE_ENABLED, the scheduler, /api/check-all and the db_utils.py check
+command enqueue website ids here instead of checking in-process, and any number
+of worker.py processes (on any number of hosts) run the checks.
+
+A worker claims a batch with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent
+workers never block on or take each other's tasks. Claiming doesn't hold a
+transaction open: it pushes the tasks' available_at ahead by
+CHECK_QUEUE_VISIBILITY_TIMEOUT, so tasks of a worker that dies become claimable
+again once it expires. Finished tasks are acked by deleting them, unless a new
+request was merged into the task while it ran: then it is released to run again.
+Failed batches are retried with exponential backoff until CHECK_QUEUE_MAX_ATTEMPTS,
+then dropped.
+Delivery is at-least-once: a retried batch may record a second check for sites
+that were already written.
+"""
+
+import logging
+import uuid
+
+from sqlalchemy import text
+
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+# Website ids per enqueue statement
+_ENQUEUE_CHUNK_SIZE = 10000
+
+
+class ClaimedTask:
+    """A check task claimed by a worker"""
+
+    def __init__(self, task_id, website_id, notify, use_cache, attempts, generation):
+        self.id = task_id
+        self.website_id = website_id
+        self.notify = notify
+        self.use_cache = use_cache
+        # Claim token: ack and retry only touch the task if nobody re-claimed it since
+        self.attempts = attempts
+        # Requests merged into the task since it was claimed bump its generation
+        self.generation = generation
+
+
+def enqueue_checks(website_ids, notify='owner', use_cache=True):
+    """
+    Queue checks of websites
+
+    A website that already has a queued task isn't queued twice: the queued task
+    is kept, skipping the cache if either request did and notifying the owner if
+    either request would have. Unless a worker is running it, the task starts
+    over: its attempts are reset and any retry backoff is dropped. A running task
+    keeps its claim but gets a new generation, so the worker's ack releases it to
+    run again with the merged settings instead of deleting it. A task that used
+    up its attempts while running gets its attempts reset, so it also runs again
+    if that claim expires.
+
+    Args:
+        website_ids: Iterable of website ids
+        notify: 'owner' to notify through the website owner's settings, 'global' for the global chat
+        use_cache: Reuse recent fetches from other runs (manual checks pass False)
+
+    Returns:
+        int: Number of websites queued or merged into queued tasks
+    """
+    # ON CONFLICT can't touch the same row twice in one statement
+    website_ids = [str(website_id) for website_id in dict.fromkeys(website_ids)]
+    queued = 0
+    with db.engine.begin() as conn:
+        for start in range(0, len(website_ids), _ENQUEUE_CHUNK_SIZE):
+            result = conn.execute(text("""
+                INSERT INTO check_tasks (website_id, notify, use_cache, attempts, generation, available_at, created_at)
+                SELECT website_id, :notify, :use_cache, 0, 0, NOW(), NOW()
+                FROM unnest(CAST(:website_ids AS uuid[])) AS website_id
+                ON CONFLICT (website_id) DO UPDATE SET
+                    use_cache = check_tasks.use_cache AND EXCLUDED.use_cache,
+                    notify = CASE WHEN EXCLUDED.notify = 'owner' THEN 'owner' ELSE check_tasks.notify END,
+                    attempts = CASE
+                        WHEN check_tasks.claimed_by IS NULL OR check_tasks.attempts >= :max_attempts THEN 0
+                        ELSE check_tasks.attempts
+                    END,
+                    available_at = CASE
+                        WHEN check_tasks.claimed_by IS NULL THEN NOW()
+                        ELSE check_tasks.available_at
+                    END,
+                    generation = check_tasks.generation + 1
+            """), {
+                "website_ids": website_ids[start:start + _ENQUEUE_CHUNK_SIZE],
+                "notify": notify,
+                "use_cache": use_cache,
+                "max_attempts": app.config["CHECK_QUEUE_MAX_ATTEMPTS"],
+            })
+            queued += result.rowcount
+    logger.info(f"Queued {queued} website checks")
+    return queued
+
+
+def claim_check_tasks(worker_id, batch_size=None):
+    """
+    Claim up to batch_size available tasks for a worker
+
+    Args:
+        worker_id: Name of the claiming worker (for inspection only)
+        batch_size: Maximum tasks to claim (CHECK_QUEUE_BATCH_SIZE by default)
+
+    Returns:
+        list: ClaimedTask objects, oldest first
+    """
+    with db.engine.begin() as conn:
+        rows = conn.execute(text("""
+            WITH claimable AS (
+                SELECT id FROM check_tasks
+                WHERE available_at <= NOW() AND attempts < :max_attempts
+                ORDER BY available_at
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE check_tasks
+            SET available_at = NOW() + make_interval(secs => :visibility_timeout),
+                attempts = check_tasks.attempts + 1,
+                claimed_by = :worker_id
+            FROM claimable
+            WHERE check_tasks.id = claimable.id
+            RETURNING check_tasks.id, check_tasks.website_id, check_tasks.notify,
+                      check_tasks.use_cache, check_tasks.attempts, check_tasks.generation,
+                      check_tasks.created_at
+        """), {
+            "max_attempts": app.config["CHECK_QUEUE_MAX_ATTEMPTS"],
+            "batch_size": batch_size or app.config["CHECK_QUEUE_BATCH_SIZE"],
+            "visibility_timeout": app.config["CHECK_QUEUE_VISIBILITY_TIMEOUT"],
+            "worker_id": worker_id,
+        }).fetchall()
+    rows.sort(key=lambda row: row[6])
+    return [ClaimedTask(row[0], uuid.UUID(str(row[1])), row[2], row[3], row[4], row[5]) for row in rows]
+
+
+def ack_check_tasks(tasks):
+    """
+    Delete finished tasks (unless their claim expired and another worker took them)
+
+    Tasks that had a request merged into them while they ran are released to run
+    again right away instead, with fresh attempts.
+    """
+    if not tasks:
+        return
+    params = {
+        "ids": [task.id for task in tasks],
+        "attempts": [task.attempts for task in tasks],
+        "generations": [task.generation for task in tasks],
+    }
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            DELETE FROM check_tasks
+            USING unnest(CAST(:ids AS bigint[]), CAST(:attempts AS integer[]), CAST(:generations AS integer[]))
+                AS acked(id, attempts, generation)
+            WHERE check_tasks.id = acked.id AND check_tasks.attempts = acked.attempts
+            AND check_tasks.generation = acked.generation
+        """), params)
+        conn.execute(text("""
+            UPDATE check_tasks
+            SET attempts = 0, available_at = NOW(), claimed_by = NULL
+            FROM unnest(CAST(:ids AS bigint[]), CAST(:attempts AS integer[]), CAST(:generations AS integer[]))
+                AS acked(id, attempts, generation)
+            WHERE check_tasks.id = acked.id AND check_tasks.attempts = acked.attempts
+            AND check_tasks.generation <> acked.generation
+        """), params)
+
+
+def retry_check_tasks(tasks, error):
+    """
+    Make failed tasks available again after an exponential backoff
+
+    Tasks that had a request merged into them while they ran are released to run
+    again right away instead, with fresh attempts.
+
+    Args:
+        tasks: ClaimedTask objects that failed
+        error: Error message to record
+    """
+    if not tasks:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE check_tasks
+            SET available_at = CASE
+                    WHEN check_tasks.generation <> failed.generation THEN NOW()
+                    ELSE NOW() + make_interval(
+                        secs => LEAST(:retry_delay * power(2, check_tasks.attempts - 1), :max_retry_delay))
+                END,
+                attempts = CASE WHEN check_tasks.generation <> failed.generation THEN 0 ELSE check_tasks.attempts END,
+                claimed_by = NULL,
+                last_error = :error
+            FROM unnest(CAST(:ids AS bigint[]), CAST(:attempts AS integer[]), CAST(:generations AS integer[]))
+                AS failed(id, attempts, generation)
+            WHERE check_tasks.id = failed.id AND check_tasks.attempts = failed.attempts
+        """), {
+            "ids": [task.id for task in tasks],
+            "attempts": [task.attempts for task in tasks],
+            "generations": [task.generation for task in tasks],
+            "retry_delay": app.config["CHECK_QUEUE_RETRY_DELAY"],
+            "max_retry_delay": app.config["CHECK_QUEUE_VISIBILITY_TIMEOUT"],
+            "error": error[:1000],
+        })
+
+
+def drop_exhausted_check_tasks():
+    """
+    Delete tasks that used up CHECK_QUEUE_MAX_ATTEMPTS and whose last claim expired
+
+    Returns:
+        int: Number of tasks dropped
+    """
+    with db.engine.begin() as conn:
+        dropped = conn.execute(text("""
+            DELETE FROM check_tasks
+            WHERE attempts >= :max_attempts AND available_at <= NOW()
+            RETURNING website_id, last_error
+        """), {"max_attempts": app.config["CHECK_QUEUE_MAX_ATTEMPTS"]}).fetchall()
+    for website_id, last_error in dropped:
+        logger.error(f"Giving up on check of website {website_id} after "
+                     f"{app.config['CHECK_QUEUE_MAX_ATTEMPTS']} attempts: {last_error or 'worker did not finish'}")
+    return len(dropped)
+
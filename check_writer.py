@@ -0,0 +1,338 @@
+"""
+Check Result Writer Module for WebWatchDog
+Buffers check outcomes and persists them in batches
+
+Instead of add/commit/refresh round trips per website, outcomes are flushed in
+groups: one multi-row INSERT for the Check rows and batched UPDATEs for the
+Website state columns, in a single transaction.
+
+With CHECK_WRITER_MODE=copy the batch is instead streamed into a temp staging
+table with COPY ... FROM STDIN and applied with one INSERT ... SELECT and one
+UPDATE ... FROM, so even very large batches cost a handful of statements.
+
+Crash safety: a website's state only advances in the same transaction as its
+Check row (and its snapshot reference), and notifications are sent only after
+that transaction commits. If the
+process dies with results still buffered, nothing about those sites was recorded,
+so the next run simply detects (and notifies about) the same changes again.
+"""
+
+import atexit
+import io
+import json
+import logging
+import time
+import uuid
+import weakref
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import bindparam
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import app, db
+from models import Website, Check
+from snapshots import get_snapshot_store
+
+logger = logging.getLogger(__name__)
+
+# Writers with buffered results, flushed on interpreter exit
+_open_writers = weakref.WeakSet()
+
+# Staging layout for CHECK_WRITER_MODE=copy: (column, SQL type)
+COPY_CHECK_COLUMNS = [
+    ('id', 'UUID'),
+    ('website_id', 'UUID'),
+    ('check_time', 'TIMESTAMP WITH TIME ZONE'),
+    ('status', 'VARCHAR'),
+    ('content_hash', 'VARCHAR'),
+    ('error_message', 'VARCHAR'),
+    ('diff_summary', 'JSON'),
+    ('simhash', 'BIGINT'),
+    ('created_at', 'TIMESTAMP WITH TIME ZONE'),
+]
+COPY_WEBSITE_COLUMNS = [
+    ('last_checked', 'TIMESTAMP WITH TIME ZONE'),
+    ('last_content_hash', 'VARCHAR'),
+    ('status', 'VARCHAR'),
+    ('last_error', 'VARCHAR'),
+    ('last_check_status', 'VARCHAR'),
+    ('last_change_time', 'TIMESTAMP WITH TIME ZONE'),
+    ('etag', 'VARCHAR'),
+    ('last_modified', 'VARCHAR'),
+    ('last_raw_hash', 'VARCHAR'),
+    ('last_simhash', 'BIGINT'),
+]
+
+_COPY_WEBSITE_COLUMN_NAMES = {name for name, _ in COPY_WEBSITE_COLUMNS}
+
+_STAGING_COLUMNS = (
+    [f"check_{name}" for name, _ in COPY_CHECK_COLUMNS]
+    + [column for name, _ in COPY_WEBSITE_COLUMNS for column in (f"site_{name}", f"site_{name}_set")]
+    + ["apply_state"]
+)
+_STAGING_DDL = (
+    "CREATE TEMP TABLE IF NOT EXISTS check_results_staging ("
+    + ", ".join(
+        [f"check_{name} {sql_type}" for name, sql_type in COPY_CHECK_COLUMNS]
+        + [f"site_{name} {sql_type}, site_{name}_set BOOLEAN" for name, sql_type in COPY_WEBSITE_COLUMNS]
+        + ["apply_state BOOLEAN"]
+    )
+    + ") ON COMMIT DELETE ROWS"
+)
+_STAGING_INSERT_CHECKS = (
+    f"INSERT INTO checks ({', '.join(name for name, _ in COPY_CHECK_COLUMNS)}) "
+    f"SELECT {', '.join(f'check_{name}' for name, _ in COPY_CHECK_COLUMNS)} FROM check_results_staging"
+)
+_STAGING_UPDATE_WEBSITES = (
+    "UPDATE websites SET "
+    + ", ".join(
+        f"{name} = CASE WHEN staging.site_{name}_set THEN staging.site_{name} ELSE websites.{name} END"
+        for name, _ in COPY_WEBSITE_COLUMNS
+    )
+    + " FROM check_results_staging staging"
+    " WHERE websites.id = staging.check_website_id AND staging.apply_state"
+)
+
+
+def _copy_value(value):
+    """Render a value in COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    else:
+        value = str(value)
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class CheckOutcome:
+    """Result of checking one website, ready to be persisted"""
+
+    def __init__(self, monitor, website, status, check_time, content_hash=None, error_message=None,
+                 website_updates=None, content=None, diff_summary=None, simhash=None):
+        self.monitor = monitor
+        self.website = website
+        self.status = status
+        self.check_time = check_time
+        self.content_hash = content_hash
+        self.error_message = error_message
+        # Extracted text behind content_hash, when it was extracted during this check
+        self.content = content
+        self.diff_summary = diff_summary
+        self.simhash = simhash
+        self.website_updates = website_updates or {}
+        self.persisted = False
+
+    @property
+    def has_changed(self):
+        return self.status == 'changed'
+
+    def check_row(self):
+        """Column values for the Check row"""
+        return {
+            'id': uuid.uuid4(),
+            'website_id': self.website.id,
+            'check_time': self.check_time,
+            'status': self.status,
+            'content_hash': self.content_hash,
+            'error_message': self.error_message,
+            'diff_summary': self.diff_summary,
+            'simhash': self.simhash,
+            'created_at': self.check_time,
+        }
+
+
+class CheckResultWriter:
+    """
+    Buffers CheckOutcome objects and writes them in batches
+
+    A batch is flushed once it holds batch_size outcomes, when an outcome is added
+    flush_interval seconds or more after the batch's first one, or when the writer
+    is closed. There is no timer: a partial batch waits for the next add (or the
+    close) however long that takes. Use as a context manager so the final partial
+    batch is always flushed.
+
+    Outcomes that couldn't be written are collected in failed (see flush), so
+    callers can retry or report them; their notifications are not sent.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None):
+        self.batch_size = batch_size or app.config.get("CHECK_WRITE_BATCH_SIZE", 100)
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            app.config.get("CHECK_WRITE_FLUSH_INTERVAL", 5)
+        self.snapshot_store = get_snapshot_store(app.config)
+        self.mode = app.config.get("CHECK_WRITER_MODE", "batch")
+        if self.mode == 'copy' and db.engine.dialect.driver != 'psycopg2':
+            logger.warning(f"CHECK_WRITER_MODE=copy needs psycopg2 (driver is {db.engine.dialect.driver}), using batch mode")
+            self.mode = 'batch'
+        self._pending = []
+        self._first_pending_at = None
+        self.failed = []
+        _open_writers.add(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def add(self, outcome):
+        """Buffer an outcome, flushing if the batch is full or old enough"""
+        if not self._pending:
+            self._first_pending_at = time.monotonic()
+        self._pending.append(outcome)
+
+        if (len(self._pending) >= self.batch_size
+                or time.monotonic() - self._first_pending_at >= self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """
+        Flush any buffered outcomes
+
+        Returns:
+            list: Every outcome this writer failed to persist
+        """
+        self.flush()
+        _open_writers.discard(self)
+        return self.failed
+
+    def flush(self):
+        """
+        Persist buffered outcomes, then send their notifications
+
+        Returns:
+            list: Outcomes of this flush that couldn't be persisted (also added to failed)
+        """
+        batch, self._pending = self._pending, []
+        if not batch:
+            return []
+
+        failed = []
+        try:
+            self._write_batch(batch)
+            persisted = batch
+        except Exception as e:
+            logger.error(f"Error writing batch of {len(batch)} check results, retrying individually: {str(e)}")
+            # One bad row shouldn't lose the whole batch
+            persisted = []
+            for outcome in batch:
+                try:
+                    self._write_batch([outcome])
+                    persisted.append(outcome)
+                except Exception as row_error:
+                    logger.error(f"Failed to record check result for {outcome.website.url}: {str(row_error)}")
+                    failed.append(outcome)
+
+        logger.info(f"Recorded {len(persisted)} check results")
+        self.failed.extend(failed)
+
+        for outcome in persisted:
+            outcome.persisted = True
+            # Reflect the new state on the loaded object without marking it dirty
+            for key, value in outcome.website_updates.items():
+                set_committed_value(outcome.website, key, value)
+
+        for outcome in persisted:
+            if outcome.monitor is not None:
+                outcome.monitor.notify_outcome(outcome)
+        return failed
+
+    def _write_batch(self, batch):
+        """Insert the Check rows and update Website state in one transaction"""
+        if self.mode == 'copy' and all(set(outcome.website_updates) <= _COPY_WEBSITE_COLUMN_NAMES for outcome in batch):
+            self._copy_batch(batch)
+        else:
+            self._insert_batch(batch)
+
+    def _add_snapshot_references(self, conn, batch):
+        """Each Check row holds a reference to the snapshot of its content"""
+        if self.snapshot_store is None:
+            return
+        refs = Counter(outcome.content_hash for outcome in batch if outcome.content_hash)
+        contents = {outcome.content_hash: outcome.content for outcome in batch if outcome.content}
+        self.snapshot_store.add_references(conn, contents, refs)
+
+    def _copy_batch(self, batch):
+        """
+        COPY the batch into a staging table, then apply it with two set-based statements
+
+        The staging table is a per-connection temp table emptied at commit. Every
+        outcome becomes one staging row holding its Check columns and the Website
+        columns it updates (with a flag per column, since e.g. error results leave
+        the content hash alone). A website's updates are merged in batch order onto
+        the staging row of its last outcome, the only row that updates it, so the
+        result matches applying the updates one by one.
+        """
+        last_for_website = {}
+        merged_updates = {}
+        for index, outcome in enumerate(batch):
+            last_for_website[outcome.website.id] = index
+            merged_updates.setdefault(outcome.website.id, {}).update(outcome.website_updates)
+
+        buffer = io.StringIO()
+        for index, outcome in enumerate(batch):
+            check_row = outcome.check_row()
+            fields = [check_row[name] for name, _ in COPY_CHECK_COLUMNS]
+            apply_state = last_for_website[outcome.website.id] == index
+            updates = merged_updates[outcome.website.id] if apply_state else {}
+            for name, _ in COPY_WEBSITE_COLUMNS:
+                fields.append(updates.get(name))
+                fields.append(name in updates)
+            fields.append(apply_state)
+            buffer.write('\t'.join(_copy_value(value) for value in fields))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        with db.engine.begin() as conn:
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(_STAGING_DDL)
+                cursor.copy_expert(f"COPY check_results_staging ({', '.join(_STAGING_COLUMNS)}) FROM STDIN", buffer)
+                cursor.execute(_STAGING_INSERT_CHECKS)
+                cursor.execute(_STAGING_UPDATE_WEBSITES)
+            finally:
+                cursor.close()
+            self._add_snapshot_references(conn, batch)
+
+    def _insert_batch(self, batch):
+        """Multi-row INSERT of the Check rows plus executemany UPDATEs of Website state"""
+        website_table = Website.__table__
+
+        # Group website updates by the set of columns they touch so each group is one executemany
+        update_groups = {}
+        for outcome in batch:
+            row = dict(outcome.website_updates)
+            row['b_website_id'] = outcome.website.id
+            update_groups.setdefault(tuple(sorted(outcome.website_updates)), []).append(row)
+
+        with db.engine.begin() as conn:
+            conn.execute(Check.__table__.insert(), [outcome.check_row() for outcome in batch])
+            self._add_snapshot_references(conn, batch)
+            for columns, rows in update_groups.items():
+                if not columns:
+                    continue
+                conn.execute(
+                    website_table.update().where(website_table.c.id == bindparam('b_website_id')),
+                    rows
+                )
+
+
+def flush_open_writers():
+    """Flush writers that still hold results (called at interpreter exit)"""
+    for writer in list(_open_writers):
+        try:
+            with app.app_context():
+                writer.close()
+        except Exception as e:
+            logger.error(f"Error flushing check results at exit: {str(e)}")
+
+
+atexit.register(flush_open_writers)
@@ -9,6 +9,7 @@ Provides centralized database management functions including:
 import os
 import logging
 import sys
+from datetime import datetime, timedelta, timezone
 from sqlalchemy import create_engine, text, inspect
 from dotenv import load_dotenv
 from app import app, db
@@ -31,16 +32,28 @@ def test_database_connection():
         logger.error(f"Database connection test failed: {str(e)}")
         return False
 
-def run_migration(migration_name, migration_function):
+def run_migration(migration_name, migration_function, autocommit=False):
     """
     Generic migration runner that handles app context and logging
     
     Args:
         migration_name: Name of the migration for logging
         migration_function: Function to run the actual migration SQL
+        autocommit: Run outside a transaction (needed for CREATE INDEX CONCURRENTLY)
     """
     logger.info(f"Starting migration: {migration_name}")
     
+    if autocommit:
+        try:
+            with app.app_context():
+                with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    migration_function(conn)
+            logger.info(f"Migration '{migration_name}' completed successfully")
+            return True
+        except Exception as e:
+            logger.error(f"Migration '{migration_name}' failed: {str(e)}")
+            return False
+    
     try:
         with app.app_context():
             conn = db.engine.connect()
@@ -123,6 +136,258 @@ def add_email_notifications(conn):
     else:
         logger.info("notification_email column already exists")
 
+def add_column_if_missing(conn, table_name, column_name, column_definition):
+    """
+    Add a column to a table unless it already exists
+    
+    Args:
+        conn: Open connection inside the migration transaction
+        table_name: Table to alter
+        column_name: Name of the column to add
+        column_definition: SQL type and constraints for the column
+    """
+    result = conn.execute(text("""
+        SELECT column_name 
+        FROM information_schema.columns 
+        WHERE table_name = :table_name 
+        AND column_name = :column_name
+    """), {"table_name": table_name, "column_name": column_name})
+    
+    if result.fetchone() is None:
+        conn.execute(text(
+            f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_definition}"
+        ))
+        logger.info(f"Added {column_name} column to {table_name} table")
+    else:
+        logger.info(f"{column_name} column already exists")
+
+def add_conditional_get_columns(conn):
+    """Add HTTP validator columns (ETag / Last-Modified) to websites table"""
+    add_column_if_missing(conn, "websites", "etag", "VARCHAR")
+    add_column_if_missing(conn, "websites", "last_modified", "VARCHAR")
+
+def add_raw_fingerprint_column(conn):
+    """Add raw HTML fingerprint column to websites table"""
+    add_column_if_missing(conn, "websites", "last_raw_hash", "VARCHAR")
+
+def add_max_content_bytes_column(conn):
+    """Add per-site download size cap column to websites table"""
+    add_column_if_missing(conn, "websites", "max_content_bytes", "INTEGER")
+
+def add_latest_state_columns(conn):
+    """Add denormalized latest-check columns to websites table and backfill them from checks"""
+    add_column_if_missing(conn, "websites", "last_check_status", "VARCHAR")
+    add_column_if_missing(conn, "websites", "last_change_time", "TIMESTAMP WITH TIME ZONE")
+    add_column_if_missing(conn, "websites", "last_error", "VARCHAR")
+    
+    # Backfill only rows that have never been summarized, so re-running is cheap
+    result = conn.execute(text("""
+        UPDATE websites
+        SET last_check_status = latest.status,
+            last_error = CASE WHEN latest.status = 'error' THEN latest.error_message END
+        FROM (
+            SELECT DISTINCT ON (website_id) website_id, status, error_message
+            FROM checks
+            ORDER BY website_id, check_time DESC
+        ) latest
+        WHERE websites.id = latest.website_id
+        AND websites.last_check_status IS NULL
+    """))
+    logger.info(f"Backfilled latest check status for {result.rowcount} websites")
+    
+    result = conn.execute(text("""
+        UPDATE websites
+        SET last_change_time = changes.last_change_time
+        FROM (
+            SELECT website_id, MAX(check_time) AS last_change_time
+            FROM checks
+            WHERE status = 'changed'
+            GROUP BY website_id
+        ) changes
+        WHERE websites.id = changes.website_id
+        AND websites.last_change_time IS NULL
+    """))
+    logger.info(f"Backfilled last change time for {result.rowcount} websites")
+
+def create_content_snapshots_table(conn):
+    """Create the content_snapshots table for the snapshot store"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS content_snapshots (
+            content_hash VARCHAR(64) PRIMARY KEY,
+            codec VARCHAR(10) NOT NULL,
+            data BYTEA,
+            original_size INTEGER NOT NULL,
+            compressed_size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    """))
+    logger.info("content_snapshots table is present")
+
+def add_diff_summary_column(conn):
+    """Add diff summary column to checks table"""
+    add_column_if_missing(conn, "checks", "diff_summary", "JSON")
+
+def add_simhash_columns(conn):
+    """Add SimHash fingerprint and change threshold columns"""
+    add_column_if_missing(conn, "checks", "simhash", "BIGINT")
+    add_column_if_missing(conn, "websites", "last_simhash", "BIGINT")
+    add_column_if_missing(conn, "websites", "change_threshold", "INTEGER")
+
+def create_check_tasks_table(conn):
+    """Create the check_tasks work queue table"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS check_tasks (
+            id BIGSERIAL PRIMARY KEY,
+            website_id UUID NOT NULL UNIQUE REFERENCES websites(id) ON DELETE CASCADE,
+            notify VARCHAR(10) NOT NULL DEFAULT 'owner',
+            use_cache BOOLEAN NOT NULL DEFAULT TRUE,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            generation INTEGER NOT NULL DEFAULT 0,
+            available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            claimed_by VARCHAR,
+            last_error VARCHAR,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_check_tasks_available_at ON check_tasks (available_at)"))
+    logger.info("check_tasks table is present")
+
+def add_check_task_generation_column(conn):
+    """Add the merge generation column to check_tasks table"""
+    add_column_if_missing(conn, "check_tasks", "generation", "INTEGER NOT NULL DEFAULT 0")
+
+def create_index_concurrently(conn, index_name, definition):
+    """
+    Build an index without blocking writes, unless a valid one already exists
+    
+    A failed concurrent build leaves an INVALID index behind, which is dropped
+    and rebuilt.
+    
+    Args:
+        conn: Connection in AUTOCOMMIT mode
+        index_name: Name of the index
+        definition: "ON table (...) [WHERE ...]" part of the CREATE INDEX statement
+    """
+    result = conn.execute(text("""
+        SELECT i.indisvalid
+        FROM pg_class c
+        JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = :index_name
+    """), {"index_name": index_name}).fetchone()
+    
+    if result is not None:
+        if result[0]:
+            logger.info(f"{index_name} index already exists")
+            return
+        logger.warning(f"{index_name} index is invalid (interrupted build), rebuilding")
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+    
+    conn.execute(text(f"CREATE INDEX CONCURRENTLY {index_name} {definition}"))
+    logger.info(f"Created {index_name} index")
+
+def add_check_indexes(conn):
+    """Add indexes for the checks and websites access paths (run with autocommit)"""
+    create_index_concurrently(conn, "ix_checks_website_id_check_time",
+                              "ON checks (website_id, check_time DESC)")
+    create_index_concurrently(conn, "ix_checks_website_id_changed",
+                              "ON checks (website_id, check_time DESC) WHERE status = 'changed'")
+    create_index_concurrently(conn, "ix_websites_user_id_url",
+                              "ON websites (user_id, url)")
+
+# Ranks each website's checks newest-first, and separately ranks its 'changed'
+# checks, then deletes everything outside the newest :keep checks that is not
+# the newest change, releasing the deleted checks' snapshot references
+PRUNE_CHECKS_SQL = text("""
+    WITH expired AS (
+        SELECT id
+        FROM (
+            SELECT id,
+                   status,
+                   row_number() OVER (PARTITION BY website_id ORDER BY check_time DESC) AS recent_rank,
+                   row_number() OVER (PARTITION BY website_id, status = 'changed' ORDER BY check_time DESC) AS status_rank
+            FROM checks
+            WHERE website_id = ANY(CAST(:website_ids AS uuid[]))
+        ) ranked
+        WHERE recent_rank > :keep
+        AND NOT (status = 'changed' AND status_rank = 1)
+    ),
+    deleted AS (
+        DELETE FROM checks
+        USING expired
+        WHERE checks.id = expired.id
+        RETURNING checks.content_hash
+    ),
+    released AS (
+        UPDATE content_snapshots
+        SET ref_count = content_snapshots.ref_count - refs.count
+        FROM (
+            SELECT content_hash, COUNT(*) AS count
+            FROM deleted
+            WHERE content_hash IS NOT NULL
+            GROUP BY content_hash
+        ) refs
+        WHERE content_snapshots.content_hash = refs.content_hash
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM deleted
+""")
+
+def prune_check_history(keep=None, batch_size=None, website_ids=None):
+    """
+    Delete old check records for every website in set-based batches
+    
+    Keeps the latest `keep` checks of each website plus its latest 'changed'
+    check. Websites are processed in batches of `batch_size` ids, each batch in
+    its own short transaction, so large tables never hold long locks.
+    
+    Args:
+        keep: Checks to keep per website (default CHECK_RETENTION_KEEP)
+        batch_size: Websites per DELETE statement (default CHECK_RETENTION_BATCH_SIZE)
+        website_ids: Optional list of website IDs to limit pruning to
+        
+    Returns:
+        int: Number of deleted checks
+    """
+    with app.app_context():
+        keep = keep if keep is not None else app.config.get("CHECK_RETENTION_KEEP", 3)
+        batch_size = batch_size or app.config.get("CHECK_RETENTION_BATCH_SIZE", 500)
+        
+        if website_ids is None:
+            # Walk website ids in key order so each batch is a cheap index range scan
+            def id_batches():
+                last_id = None
+                while True:
+                    with db.engine.connect() as conn:
+                        if last_id is None:
+                            rows = conn.execute(text(
+                                "SELECT id FROM websites ORDER BY id LIMIT :limit"
+                            ), {"limit": batch_size})
+                        else:
+                            rows = conn.execute(text(
+                                "SELECT id FROM websites WHERE id > CAST(:last_id AS uuid) ORDER BY id LIMIT :limit"
+                            ), {"last_id": last_id, "limit": batch_size})
+                        ids = [str(row[0]) for row in rows]
+                    if not ids:
+                        return
+                    yield ids
+                    last_id = ids[-1]
+            batches = id_batches()
+        else:
+            website_ids = [str(website_id) for website_id in website_ids]
+            batches = (website_ids[i:i + batch_size] for i in range(0, len(website_ids), batch_size))
+        
+        deleted = 0
+        for ids in batches:
+            try:
+                with db.engine.begin() as conn:
+                    deleted += conn.execute(PRUNE_CHECKS_SQL, {"website_ids": ids, "keep": keep}).scalar()
+            except Exception as e:
+                logger.error(f"Error pruning checks for a batch of {len(ids)} websites: {str(e)}")
+        
+        logger.info(f"Check retention complete: deleted {deleted} old checks (keeping {keep} per website)")
+        return deleted
+
 def cleanup_old_checks(website_id=None):
     """
     Cleanup old check records for a specific website or all websites
@@ -130,28 +395,235 @@ def cleanup_old_checks(website_id=None):
     Args:
         website_id: Optional ID of specific website to clean up. If None, cleans all.
     """
-    from monitor import WebsiteMonitor
-    from models import Website
+    if website_id:
+        deleted = prune_check_history(website_ids=[website_id])
+        logger.info(f"Cleaned up {deleted} old checks for website ID {website_id}")
+    else:
+        prune_check_history()
+
+# Partitioned check history: checks is range-partitioned by check_time into
+# monthly partitions named checks_pYYYYMM, plus checks_default for stray rows
+CHECK_PARTITION_PREFIX = "checks_p"
+
+def month_start(value, offset=0):
+    """First instant (UTC) of the month `offset` months after value's month"""
+    month_index = value.year * 12 + value.month - 1 + offset
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+def is_checks_partitioned(conn):
+    """True if the checks table is a partitioned table"""
+    result = conn.execute(text(
+        "SELECT relkind FROM pg_class WHERE relname = 'checks' AND relnamespace = 'public'::regnamespace"
+    )).fetchone()
+    return result is not None and result[0] == 'p'
+
+def create_check_partition(conn, start):
+    """
+    Create the monthly partition of checks starting at `start` if it doesn't exist
     
-    monitor = WebsiteMonitor()
+    Args:
+        conn: Open connection
+        start (datetime): First instant of the month
+        
+    Returns:
+        bool: True if the partition was created
+    """
+    name = f"{CHECK_PARTITION_PREFIX}{start.strftime('%Y%m')}"
+    exists = conn.execute(text("SELECT 1 FROM pg_class WHERE relname = :name"), {"name": name}).fetchone()
+    if exists:
+        return False
     
+    end = month_start(start, 1)
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF checks "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    logger.info(f"Created check partition {name}")
+    return True
+
+def convert_checks_to_partitioned(conn):
+    """
+    Convert checks into a table range-partitioned by check_time (run once, opt-in)
+    
+    The existing rows are copied into monthly partitions inside the migration
+    transaction, so the table is briefly locked; run it during a quiet period.
+    The primary key becomes (id, check_time) because PostgreSQL requires the
+    partition key in every unique constraint.
+    """
+    if is_checks_partitioned(conn):
+        logger.info("checks table is already partitioned")
+        return
+    
+    # Move the old table aside, renaming its indexes so the new ones can take their names
+    conn.execute(text("ALTER TABLE checks RENAME TO checks_legacy"))
+    for row in conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'checks_legacy'"
+    )).fetchall():
+        conn.execute(text(f'ALTER INDEX "{row[0]}" RENAME TO "{row[0]}_legacy"'))
+    
+    conn.execute(text(
+        "UPDATE checks_legacy SET check_time = COALESCE(created_at, NOW()) WHERE check_time IS NULL"
+    ))
+    conn.execute(text(
+        "CREATE TABLE checks (LIKE checks_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (check_time)"
+    ))
+    conn.execute(text("ALTER TABLE checks ALTER COLUMN check_time SET NOT NULL"))
+    conn.execute(text("ALTER TABLE checks ADD PRIMARY KEY (id, check_time)"))
+    conn.execute(text(
+        "ALTER TABLE checks ADD FOREIGN KEY (website_id) REFERENCES websites (id) ON DELETE CASCADE"
+    ))
+    conn.execute(text(
+        "CREATE INDEX ix_checks_website_id_check_time ON checks (website_id, check_time DESC)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX ix_checks_website_id_changed ON checks (website_id, check_time DESC) "
+        "WHERE status = 'changed'"
+    ))
+    
+    # Partitions from the oldest existing row through the pre-created future months
+    oldest = conn.execute(text("SELECT MIN(check_time) FROM checks_legacy")).scalar()
+    now = datetime.now(timezone.utc)
+    start = month_start(oldest or now)
+    last = month_start(now, app.config.get("CHECK_PARTITION_PREMAKE_MONTHS", 2))
+    while start <= last:
+        create_check_partition(conn, start)
+        start = month_start(start, 1)
+    conn.execute(text("CREATE TABLE checks_default PARTITION OF checks DEFAULT"))
+    
+    result = conn.execute(text("INSERT INTO checks SELECT * FROM checks_legacy"))
+    logger.info(f"Copied {result.rowcount} checks into the partitioned table")
+    conn.execute(text("DROP TABLE checks_legacy"))
+
+def maintain_check_partitions(retention_days=None, premake_months=None):
+    """
+    Create upcoming monthly check partitions and drop expired ones
+    
+    A partition is dropped once every row in it is older than the retention
+    period, replacing row-by-row deletes with a detach and a DROP TABLE.
+    
+    Args:
+        retention_days: Days of history to keep (default CHECK_HISTORY_RETENTION_DAYS)
+        premake_months: Months ahead to create partitions for (default CHECK_PARTITION_PREMAKE_MONTHS)
+        
+    Returns:
+        tuple: (partitions created, partitions dropped)
+    """
     with app.app_context():
-        if website_id:
-            # Clean up for a specific website
+        retention_days = retention_days if retention_days is not None else \
+            app.config.get("CHECK_HISTORY_RETENTION_DAYS", 90)
+        premake_months = premake_months if premake_months is not None else \
+            app.config.get("CHECK_PARTITION_PREMAKE_MONTHS", 2)
+        
+        created = 0
+        dropped = 0
+        with db.engine.begin() as conn:
+            if not is_checks_partitioned(conn):
+                logger.warning("checks table is not partitioned; run 'python db_utils.py partition' first")
+                return created, dropped
+            
+            now = datetime.now(timezone.utc)
+            for offset in range(premake_months + 1):
+                if create_check_partition(conn, month_start(now, offset)):
+                    created += 1
+            
+            cutoff = now - timedelta(days=retention_days)
+            partitions = conn.execute(text("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'checks'::regclass
+                AND c.relname LIKE :pattern
+            """), {"pattern": f"{CHECK_PARTITION_PREFIX}%"}).fetchall()
+        
+        for (name,) in partitions:
+            try:
+                start = datetime.strptime(name[len(CHECK_PARTITION_PREFIX):], '%Y%m').replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            if month_start(start, 1) > cutoff:
+                continue
             try:
-                monitor.cleanup_old_checks(website_id)
-                logger.info(f"Cleaned up old checks for website ID {website_id}")
+                # One short transaction per partition keeps the parent lock brief
+                with db.engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE checks DETACH PARTITION {name}"))
+                    # Release the snapshot references held by the partition's checks
+                    conn.execute(text(f"""
+                        UPDATE content_snapshots
+                        SET ref_count = content_snapshots.ref_count - refs.count
+                        FROM (
+                            SELECT content_hash, COUNT(*) AS count
+                            FROM {name}
+                            WHERE content_hash IS NOT NULL
+                            GROUP BY content_hash
+                        ) refs
+                        WHERE content_snapshots.content_hash = refs.content_hash
+                    """))
+                    conn.execute(text(f"DROP TABLE {name}"))
+                dropped += 1
+                logger.info(f"Dropped expired check partition {name}")
             except Exception as e:
-                logger.error(f"Error cleaning up checks for website ID {website_id}: {str(e)}")
+                logger.error(f"Error dropping check partition {name}: {str(e)}")
+        
+        logger.info(f"Check partition maintenance complete: {created} created, {dropped} dropped")
+        return created, dropped
+
+def collect_snapshots(reconcile=False):
+    """Remove snapshots no retained check references (see snapshots.collect_snapshot_garbage)"""
+    from snapshots import get_snapshot_store, collect_snapshot_garbage
+    
+    with app.app_context():
+        return collect_snapshot_garbage(db.engine, get_snapshot_store(app.config), reconcile=reconcile)
+
+def run_check_retention():
+    """Apply the configured retention mode (CHECK_RETENTION_MODE: count or partition)"""
+    with app.app_context():
+        if app.config.get("CHECK_RETENTION_MODE", "count") == "partition":
+            result = maintain_check_partitions()
         else:
-            # Clean up for all websites
-            websites = Website.query.all()
-            for website in websites:
-                try:
-                    monitor.cleanup_old_checks(website.id)
-                    logger.info(f"Cleaned up old checks for {website.url}")
-                except Exception as e:
-                    logger.error(f"Error cleaning up checks for {website.url}: {str(e)}")
+            result = prune_check_history()
+        
+        try:
+            collect_snapshots()
+        except Exception as e:
+            logger.error(f"Error collecting unreferenced snapshots: {str(e)}")
+        return result
+
+def enqueue_website_checks(website_id=None, user_id=None):
+    """
+    Queue website checks for the worker processes (CHECK_QUEUE_ENABLED)
+    
+    Args:
+        website_id: Optional specific website ID to check
+        user_id: Optional specific user ID to check websites for
+    """
+    from models import Website
+    from check_queue import enqueue_checks
+    
+    with app.app_context():
+        if website_id:
+            website = Website.query.get(website_id)
+            if not website:
+                logger.error(f"Website ID {website_id} not found")
+                return False
+                
+            # If user_id provided, verify the website belongs to that user
+            if user_id and str(website.user_id) != str(user_id):
+                logger.error(f"Website ID {website_id} does not belong to user {user_id}")
+                return False
+            website_ids = [website.id]
+        else:
+            query = db.session.query(Website.id)
+            if user_id:
+                query = query.filter(Website.user_id == user_id)
+            website_ids = [row[0] for row in query]
+            if not website_ids:
+                logger.error("No matching websites to check")
+                return False
+        
+        # Like the in-process check, notify the user when one is given, otherwise the global chat
+        queued = enqueue_checks(website_ids, notify='owner' if user_id else 'global')
+        logger.info(f"Queued {queued} website checks for the check workers")
+        return True
 
 def check_websites(website_id=None, user_id=None):
     """
@@ -160,9 +632,16 @@ def check_websites(website_id=None, user_id=None):
     Args:
         website_id: Optional specific website ID to check
         user_id: Optional specific user ID to check websites for
+
+    Returns:
+        bool: True if every check succeeded and its result was recorded
     """
     from monitor import WebsiteMonitor
     from models import Website, User
+    from check_writer import CheckResultWriter
+    
+    if app.config["CHECK_QUEUE_ENABLED"]:
+        return enqueue_website_checks(website_id, user_id)
     
     # Configure the monitor with either global or user-specific settings
     if user_id:
@@ -200,12 +679,16 @@ def check_websites(website_id=None, user_id=None):
                 return False
                 
             try:
-                monitor.check_website(website)
-                logger.info(f"Checked website: {website.url}")
-                return True
+                with CheckResultWriter(batch_size=1) as writer:
+                    monitor.check_websites([website], use_cache=False, writer=writer)
             except Exception as e:
                 logger.error(f"Error checking website {website.url}: {str(e)}")
                 return False
+            if writer.failed:
+                logger.error(f"Failed to record check result for {website.url}")
+                return False
+            logger.info(f"Checked website: {website.url}")
+            return True
         else:
             # Check all websites or all websites for a specific user
             query = Website.query
@@ -216,14 +699,20 @@ def check_websites(website_id=None, user_id=None):
             success_count = 0
             error_count = 0
             
-            for website in websites:
-                try:
-                    monitor.check_website(website)
+            # Fetch all websites concurrently, then record each result
+            with CheckResultWriter() as writer:
+                results = monitor.check_websites(websites, writer=writer)
+            unrecorded = {id(outcome.website) for outcome in writer.failed}
+            for website, has_changed in results:
+                if id(website) in unrecorded:
+                    logger.error(f"Failed to record check result for {website.url}")
+                    error_count += 1
+                elif website.status == 'error':
+                    logger.error(f"Error checking website {website.url}")
+                    error_count += 1
+                else:
                     logger.info(f"Checked website: {website.url}")
                     success_count += 1
-                except Exception as e:
-                    logger.error(f"Error checking website {website.url}: {str(e)}")
-                    error_count += 1
             
             logger.info(f"Website check complete. Success: {success_count}, Errors: {error_count}")
             return success_count > 0 and error_count == 0
@@ -231,7 +720,7 @@ def check_websites(website_id=None, user_id=None):
 # Command line interface for direct script usage
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python db_utils.py [test|migrate|check|cleanup]")
+        print("Usage: python db_utils.py [test|migrate|check|cleanup|partition|snapshots-gc]")
         sys.exit(1)
         
     command = sys.argv[1].lower()
@@ -249,13 +738,30 @@ if __name__ == "__main__":
         # Run all migrations
         migrations = [
             ("add_telegram_bot_token", add_telegram_bot_token),
-            ("add_email_notifications", add_email_notifications)
+            ("add_email_notifications", add_email_notifications),
+            ("add_conditional_get_columns", add_conditional_get_columns),
+            ("add_raw_fingerprint_column", add_raw_fingerprint_column),
+            ("add_max_content_bytes_column", add_max_content_bytes_column),
+            ("add_latest_state_columns", add_latest_state_columns),
+            ("create_content_snapshots_table", create_content_snapshots_table),
+            ("add_diff_summary_column", add_diff_summary_column),
+            ("add_simhash_columns", add_simhash_columns),
+            ("create_check_tasks_table", create_check_tasks_table),
+            ("add_check_task_generation_column", add_check_task_generation_column)
+        ]
+        
+        # Index builds use CREATE INDEX CONCURRENTLY, which can't run in a transaction
+        index_migrations = [
+            ("add_check_indexes", add_check_indexes)
         ]
         
         success = True
         for name, func in migrations:
             if not run_migration(name, func):
                 success = False
+        for name, func in index_migrations:
+            if not run_migration(name, func, autocommit=True):
+                success = False
                 
         sys.exit(0 if success else 1)
         
@@ -290,10 +796,27 @@ if __name__ == "__main__":
             website_id = sys.argv[2].split("=")[1]
             
         print(f"Cleaning up old checks{f' for website_id={website_id}' if website_id else ''}...")
-        cleanup_old_checks(website_id)
+        if website_id:
+            cleanup_old_checks(website_id)
+        else:
+            run_check_retention()
+        sys.exit(0)
+        
+    elif command == "snapshots-gc":
+        # Remove unreferenced snapshots; --reconcile recounts references from checks first
+        print("Collecting unreferenced snapshots...")
+        collect_snapshots(reconcile="--reconcile" in sys.argv[2:])
+        sys.exit(0)
+        
+    elif command == "partition":
+        # Convert checks to a partitioned table (once), then create/drop partitions
+        print("Partitioning check history...")
+        if not run_migration("convert_checks_to_partitioned", convert_checks_to_partitioned):
+            sys.exit(1)
+        maintain_check_partitions()
         sys.exit(0)
         
     else:
         print(f"Unknown command: {command}")
-        print("Available commands: test, migrate, check, cleanup")
+        print("Available commands: test, migrate, check, cleanup, partition, snapshots-gc")
         sys.exit(1)
\ No newline at end of file
@@ -119,7 +119,7 @@ User=www-data
 Group=www-data
 WorkingDirectory=$DEPLOY_DIR
 Environment=\"PATH=$DEPLOY_DIR/venv/bin\"
-ExecStart=$DEPLOY_DIR/venv/bin/python check_websites.py
+ExecStart=$DEPLOY_DIR/venv/bin/python scheduler.py
 Restart=always
 
 [Install]
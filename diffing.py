@@ -0,0 +1,238 @@
+"""
+Diff Engine Module for WebWatchDog
+Summarizes what changed between two versions of a page's extracted text
+
+Text is split into paragraph blocks and each block is hashed. The two versions are
+aligned on the block hashes, which is cheap even for very large pages because
+unchanged paragraphs compare as single integers. The word-level diff only runs on
+the blocks that were actually replaced, and only for as many of them as the
+summary keeps. Very large texts are only counted, without alignment.
+"""
+
+import difflib
+import re
+from collections import Counter
+
+# Extracted text with very long lines (e.g. the BeautifulSoup fallback, which
+# collapses the page to one line) is split further into sentences, and sentences
+# that are still too long into word-aligned pieces. This also bounds the input of
+# each word diff.
+_MAX_BLOCK_CHARS = 2000
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+# Above this many characters (both versions together) diff_texts only counts
+# added and removed blocks
+MAX_DIFF_INPUT_CHARS = 500000
+
+
+def split_blocks(text):
+    """
+    Split extracted text into paragraph blocks
+
+    Args:
+        text (str): Extracted page text
+
+    Returns:
+        list: Non-empty, stripped blocks
+    """
+    blocks = []
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) > _MAX_BLOCK_CHARS:
+            for sentence in _SENTENCE_BREAK.split(line):
+                blocks.extend(_split_long(sentence))
+        else:
+            blocks.append(line)
+    return blocks
+
+
+def _split_long(text):
+    """Split text into pieces of at most _MAX_BLOCK_CHARS, at spaces where possible"""
+    while len(text) > _MAX_BLOCK_CHARS:
+        cut = text.rfind(' ', 0, _MAX_BLOCK_CHARS + 1)
+        if cut <= 0:
+            cut = _MAX_BLOCK_CHARS
+        yield text[:cut]
+        text = text[cut:].lstrip()
+    if text:
+        yield text
+
+
+def _changed_words(old_block, new_block):
+    """Word-level diff of one replaced block: (removed words, added words)"""
+    old_words = old_block.split()
+    new_words = new_block.split()
+    removed = []
+    added = []
+    matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ('replace', 'delete'):
+            removed.append(' '.join(old_words[i1:i2]))
+        if tag in ('replace', 'insert'):
+            added.append(' '.join(new_words[j1:j2]))
+    return removed, added
+
+
+def _count_blocks(old_blocks, new_blocks):
+    """Added, removed and unchanged blocks of two versions, ignoring their order"""
+    old_counts = Counter(old_blocks)
+    new_counts = Counter(new_blocks)
+    added = new_counts - old_counts
+    removed = old_counts - new_counts
+    unchanged = sum((old_counts & new_counts).values())
+
+    def pick(blocks, counts):
+        picked = []
+        for block in blocks:
+            if counts[block] > 0:
+                counts[block] -= 1
+                picked.append(block)
+        return picked
+
+    return pick(new_blocks, added), pick(old_blocks, removed), unchanged
+
+
+def diff_texts(old_text, new_text, max_items=20, max_chars=300, max_input_chars=MAX_DIFF_INPUT_CHARS):
+    """
+    Summarize the differences between two versions of extracted text
+
+    When both versions together are longer than max_input_chars, the blocks aren't
+    aligned: the summary only has the added and removed blocks (no 'modified'
+    pairs) and 'truncated' is set.
+
+    Args:
+        old_text (str): Previous version
+        new_text (str): Current version
+        max_items (int): Maximum number of entries kept per list in the summary
+        max_chars (int): Maximum length of each entry
+        max_input_chars (int): Size above which changes are only counted
+
+    Returns:
+        dict: {
+            'added': [paragraphs only in the new version],
+            'removed': [paragraphs only in the old version],
+            'modified': [{'old': ..., 'new': ..., 'removed': [...], 'added': [...]}],
+            'added_count', 'removed_count', 'modified_count', 'unchanged_count': int,
+            'truncated': bool
+        }
+    """
+    old_blocks = split_blocks(old_text)
+    new_blocks = split_blocks(new_text)
+
+    if len(old_text or '') + len(new_text or '') > max_input_chars:
+        added, removed, unchanged = _count_blocks(old_blocks, new_blocks)
+        return _summary(added, removed, [], 0, unchanged, True, max_items, max_chars)
+
+    # Trim the common prefix and suffix before aligning; most changes are local
+    start = 0
+    while start < len(old_blocks) and start < len(new_blocks) and old_blocks[start] == new_blocks[start]:
+        start += 1
+    old_end = len(old_blocks)
+    new_end = len(new_blocks)
+    while old_end > start and new_end > start and old_blocks[old_end - 1] == new_blocks[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+
+    old_middle = old_blocks[start:old_end]
+    new_middle = new_blocks[start:new_end]
+    matcher = difflib.SequenceMatcher(
+        None,
+        # str hashes are cached on the objects, so this costs one pass over each block
+        [hash(block) for block in old_middle],
+        [hash(block) for block in new_middle],
+        autojunk=False
+    )
+
+    added = []
+    removed = []
+    modified = []
+    modified_count = 0
+    unchanged = start + (len(old_blocks) - old_end)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            unchanged += i2 - i1
+            continue
+        if tag == 'delete':
+            removed.extend(old_middle[i1:i2])
+        elif tag == 'insert':
+            added.extend(new_middle[j1:j2])
+        else:
+            # Pair replaced blocks up for a word diff; any surplus is plain added/removed
+            pairs = min(i2 - i1, j2 - j1)
+            modified_count += pairs
+            # Only the pairs the summary keeps get a word diff
+            for offset in range(min(pairs, max_items - len(modified))):
+                old_block = old_middle[i1 + offset]
+                new_block = new_middle[j1 + offset]
+                removed_words, added_words = _changed_words(old_block, new_block)
+                modified.append({
+                    'old': old_block,
+                    'new': new_block,
+                    'removed': removed_words,
+                    'added': added_words,
+                })
+            removed.extend(old_middle[i1 + pairs:i2])
+            added.extend(new_middle[j1 + pairs:j2])
+
+    truncated = max(len(added), len(removed), modified_count) > max_items
+    return _summary(added, removed, modified, modified_count, unchanged, truncated, max_items, max_chars)
+
+
+def _summary(added, removed, modified, modified_count, unchanged, truncated, max_items, max_chars):
+    """Assemble the diff_texts result, clipping lists and entries"""
+
+    def clip(value):
+        return value if len(value) <= max_chars else value[:max_chars - 1] + '…'
+
+    return {
+        'added': [clip(block) for block in added[:max_items]],
+        'removed': [clip(block) for block in removed[:max_items]],
+        'modified': [
+            {
+                'old': clip(entry['old']),
+                'new': clip(entry['new']),
+                'removed': [clip(words) for words in entry['removed'][:max_items]],
+                'added': [clip(words) for words in entry['added'][:max_items]],
+            }
+            for entry in modified[:max_items]
+        ],
+        'added_count': len(added),
+        'removed_count': len(removed),
+        'modified_count': modified_count,
+        'unchanged_count': unchanged,
+        'truncated': truncated,
+    }
+
+
+def format_diff_summary(summary, max_items=3, max_chars=120):
+    """
+    Render a diff summary as short plain text for notifications
+
+    Args:
+        summary (dict): Output of diff_texts
+        max_items (int): Entries shown per section
+        max_chars (int): Maximum length of each shown entry
+
+    Returns:
+        str: Multi-line summary, or an empty string if there is nothing to show
+    """
+    if not summary:
+        return ''
+
+    def clip(value):
+        return value if len(value) <= max_chars else value[:max_chars - 1] + '…'
+
+    lines = [
+        f"{summary['added_count']} added, {summary['removed_count']} removed, "
+        f"{summary['modified_count']} modified paragraphs"
+    ]
+    for entry in summary['modified'][:max_items]:
+        changes = [f"-{words}" for words in entry['removed'][:2]] + [f"+{words}" for words in entry['added'][:2]]
+        lines.append(f"~ {clip(' '.join(changes) or entry['new'])}")
+    for block in summary['added'][:max_items]:
+        lines.append(f"+ {clip(block)}")
+    for block in summary['removed'][:max_items]:
+        lines.append(f"- {clip(block)}")
+    return '\n'.join(lines)
@@ -3,17 +3,19 @@ Email Notification Module for WebWatchDog
 Handles sending email notifications when website changes are detected
 """
 
+import html
 import logging
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 from datetime import datetime
+from diffing import format_diff_summary
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def send_change_notification(user_email, website_url, check_time=None):
+def send_change_notification(user_email, website_url, check_time=None, diff_summary=None):
     """
     Send an email notification when a website change is detected
     
@@ -21,6 +23,7 @@ def send_change_notification(user_email, website_url, check_time=None):
         user_email (str): Email address to send notification to
         website_url (str): URL of the website that changed
         check_time (datetime, optional): Time when the change was detected
+        diff_summary (dict, optional): Summary of the changes from diffing.diff_texts
     
     Returns:
         bool: True if email was sent successfully, False otherwise
@@ -45,6 +48,15 @@ def send_change_notification(user_email, website_url, check_time=None):
         # Format the check time
         check_time_str = check_time.strftime('%A, %B %d, %Y at %I:%M %p') if check_time else datetime.utcnow().strftime('%A, %B %d, %Y at %I:%M %p')
         
+        # Summary of what changed, when available
+        changes_html = ''
+        if diff_summary:
+            changes_html = (
+                '<p><strong>What changed:</strong></p>'
+                '<pre style="white-space: pre-wrap; background-color: #f8f9fa; padding: 10px; font-size: 13px;">'
+                f'{html.escape(format_diff_summary(diff_summary, max_items=5, max_chars=200))}</pre>'
+            )
+        
         # Create message
         msg = MIMEMultipart()
         msg['From'] = f"WebWatchDog <{sender_email}>"
@@ -67,6 +79,7 @@ def send_change_notification(user_email, website_url, check_time=None):
                     <p><strong>Detected:</strong> {check_time_str}</p>
                 </div>
                 
+                {changes_html}
                 <p>Please visit the website to review the changes.</p>
                 
                 <p>Thank you for using WebWatchDog!</p>
@@ -0,0 +1,395 @@
+"""
+Content Extraction Module for WebWatchDog
+CPU-bound extraction and hashing stage of the check pipeline
+
+Kept free of Flask and database imports so it can run inside worker processes.
+"""
+
+import hashlib
+import importlib
+import logging
+import multiprocessing
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import trafilatura
+
+try:
+    import numpy
+except ImportError:  # optional dependency, SimHash falls back to pure Python
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hash_content(content):
+    """
+    Generate the change-detection hash of extracted text
+
+    Args:
+        content (str): Extracted page text
+
+    Returns:
+        str: SHA-256 hex digest of the whitespace-normalized text, or None if empty
+    """
+    if not content:
+        logger.warning("Empty content received for hashing")
+        return None
+
+    # Remove excessive whitespace and normalize
+    content = ' '.join(content.split())
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+# SimHash over word shingles: near-duplicate versions of a page get fingerprints a
+# small Hamming distance apart, so the size of a change can be measured cheaply
+SIMHASH_SHINGLE_SIZE = 3
+_MASK64 = (1 << 64) - 1
+# Odd multipliers combining the word hashes of a shingle (order sensitive)
+_SHINGLE_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9)
+_WORD_RE = re.compile(r'\w+')
+
+
+def _word_hash(word):
+    return int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'little')
+
+
+def _mix64(value):
+    """splitmix64 finalizer: spreads the bits of a combined shingle hash"""
+    value ^= value >> 30
+    value = (value * 0xBF58476D1CE4E5B9) & _MASK64
+    value ^= value >> 27
+    value = (value * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def _simhash_python(word_ids, vocabulary_hashes, size):
+    hashes = [vocabulary_hashes[word_id] for word_id in word_ids]
+    count = len(hashes) - size + 1
+    combined = [0] * count
+    for offset in range(size):
+        multiplier = _SHINGLE_MULTIPLIERS[offset]
+        combined = [value ^ ((word_hash * multiplier) & _MASK64)
+                    for value, word_hash in zip(combined, hashes[offset:offset + count])]
+
+    shingles = {}
+    for value in combined:
+        value = _mix64(value)
+        shingles[value] = shingles.get(value, 0) + 1
+
+    # Tally per byte position first (8 dict updates per shingle instead of 64 bit tests)
+    byte_counts = [{} for _ in range(8)]
+    for value, weight in shingles.items():
+        for position, byte in enumerate(value.to_bytes(8, 'little')):
+            byte_counts[position][byte] = byte_counts[position].get(byte, 0) + weight
+
+    total = len(combined)
+    fingerprint = 0
+    for position, counts in enumerate(byte_counts):
+        for bit in range(8):
+            mask = 1 << bit
+            # Majority vote per bit: set when more than half of the shingles have it
+            if sum(weight for byte, weight in counts.items() if byte & mask) * 2 > total:
+                fingerprint |= 1 << (position * 8 + bit)
+    return fingerprint
+
+
+def _simhash_numpy(word_ids, vocabulary_hashes, size):
+    words = numpy.array(vocabulary_hashes, dtype=numpy.uint64)[numpy.array(word_ids, dtype=numpy.int64)]
+    count = len(word_ids) - size + 1
+    values = numpy.zeros(count, dtype=numpy.uint64)
+    for offset in range(size):
+        values ^= words[offset:offset + count] * numpy.uint64(_SHINGLE_MULTIPLIERS[offset])
+    values ^= values >> numpy.uint64(30)
+    values *= numpy.uint64(0xBF58476D1CE4E5B9)
+    values ^= values >> numpy.uint64(27)
+    values *= numpy.uint64(0x94D049BB133111EB)
+    values ^= values >> numpy.uint64(31)
+    values, weights = numpy.unique(values, return_counts=True)
+    # One row of 64 bits (least significant first) per distinct shingle
+    bits = numpy.unpackbits(values.astype('<u8').view(numpy.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    counts = weights.dot(bits)
+    # Majority vote per bit: set when more than half of the shingles have it
+    set_bits = numpy.nonzero(counts * 2 > count)[0]
+    return sum(1 << int(bit) for bit in set_bits)
+
+
+def simhash(content, size=SIMHASH_SHINGLE_SIZE):
+    """
+    64-bit SimHash of the word shingles of extracted text
+
+    Words are hashed once per distinct word, shingle hashes are combined from the
+    word hashes, and the per-bit vote is vectorized with numpy when it is installed.
+
+    Args:
+        content (str): Extracted page text
+        size (int): Words per shingle
+
+    Returns:
+        int: Unsigned 64-bit fingerprint, or None for empty text
+    """
+    words = _WORD_RE.findall((content or '').lower())
+    if not words:
+        return None
+    size = min(size, len(words))
+
+    vocabulary = {}
+    word_ids = [vocabulary.setdefault(word, len(vocabulary)) for word in words]
+    vocabulary_hashes = [_word_hash(word) for word in vocabulary]
+
+    if numpy is not None:
+        return _simhash_numpy(word_ids, vocabulary_hashes, size)
+    return _simhash_python(word_ids, vocabulary_hashes, size)
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two 64-bit fingerprints"""
+    return bin((a ^ b) & _MASK64).count('1')
+
+
+def simhash_to_signed(value):
+    """Map an unsigned 64-bit fingerprint onto the signed BIGINT range for storage"""
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+# Per-request tokens that change on every response without the page changing
+_VOLATILE_PATTERNS = [
+    # CSP nonces on script/style tags
+    re.compile(rb'\s(?:data-)?nonce=(?:"[^"]*"|\'[^\']*\'|[^\s>]+)', re.IGNORECASE),
+    # Hidden CSRF inputs (Django, Rails, ASP.NET, Laravel, ...)
+    re.compile(rb'<input[^>]+name=["\'][^"\']*(?:csrf|xsrf|authenticity_token|requestverificationtoken|_token)[^"\']*["\'][^>]*>',
+               re.IGNORECASE),
+    # CSRF meta tags
+    re.compile(rb'<meta[^>]+name=["\'](?:csrf-token|csrf-param|_csrf|_csrf_header)["\'][^>]*>', re.IGNORECASE),
+]
+
+
+def default_raw_normalizer(data):
+    """
+    Strip nonces and CSRF tokens from raw HTML before fingerprinting
+
+    Args:
+        data (bytes): A run of the response body ending after a tag (">")
+
+    Returns:
+        bytes: The lines with volatile tokens removed
+    """
+    for pattern in _VOLATILE_PATTERNS:
+        data = pattern.sub(b'', data)
+    return data
+
+
+def load_raw_normalizer(path):
+    """
+    Resolve the configured raw fingerprint normalizer
+
+    Args:
+        path (str): "module.function" of a callable taking and returning bytes,
+            "none" to hash the body unmodified, or empty for the default
+
+    Returns:
+        callable or None
+    """
+    if not path:
+        return default_raw_normalizer
+    if path.lower() == 'none':
+        return None
+    module_name, _, function_name = path.rpartition('.')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+# Longest run without a tag end held back for the raw fingerprint normalizer
+_MAX_PENDING_BYTES = 64 * 1024
+
+
+class RawFingerprinter:
+    """
+    Incremental fingerprint of a raw response body
+
+    Data is normalized up to the last tag end of each chunk, so it can be fed in
+    arbitrary chunks as they arrive and tokens split across chunk boundaries are
+    still stripped. Only the tail after that tag end is carried over, and a tail
+    without one is normalized once it outgrows _MAX_PENDING_BYTES, so minified
+    single-line pages are hashed in linear time.
+    """
+
+    def __init__(self, normalizer=default_raw_normalizer):
+        self.normalizer = normalizer
+        self._hash = hashlib.sha256()
+        self._pending = b''
+
+    def update(self, chunk):
+        if self.normalizer is None:
+            self._hash.update(chunk)
+            return
+        cut = chunk.rfind(b'>') + 1
+        if cut:
+            self._hash.update(self.normalizer(self._pending + chunk[:cut]))
+            self._pending = chunk[cut:]
+        elif len(self._pending) + len(chunk) > _MAX_PENDING_BYTES:
+            self._hash.update(self.normalizer(self._pending + chunk))
+            self._pending = b''
+        else:
+            self._pending += chunk
+
+    def hexdigest(self):
+        if self._pending:
+            self._hash.update(self.normalizer(self._pending))
+            self._pending = b''
+        return self._hash.hexdigest()
+
+
+def extract_text(html_content, url):
+    """
+    Extract the readable text from raw HTML
+
+    Args:
+        html_content (bytes or str): Raw page body
+        url (str): URL of the page, used for logging
+
+    Returns:
+        str: Extracted text
+    """
+    # Try trafilatura first
+    downloaded = trafilatura.load_html(html_content)
+    content = trafilatura.extract(downloaded)
+
+    # If trafilatura fails, try basic HTML extraction
+    if not content:
+        logger.warning(f"Trafilatura failed for {url}, trying fallback method")
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html_content, 'lxml')
+
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.decompose()
+
+        # Get text and normalize whitespace
+        content = ' '.join(soup.get_text().split())
+
+    if not content:
+        raise Exception("Failed to extract content using both methods")
+
+    logger.info(f"Successfully extracted content from {url} (length: {len(content)})")
+    return content
+
+
+def extract_and_hash(html_content, url):
+    """
+    Extraction stage entry point (runs in a worker process)
+
+    Returns:
+        tuple: (extracted text, content hash, SimHash fingerprint)
+    """
+    content = extract_text(html_content, url)
+    content_hash = hash_content(content)
+    if not content_hash:
+        raise Exception("Failed to generate content hash")
+    return content, content_hash, simhash(content)
+
+
+def get_extraction_pool(workers, start_method='forkserver'):
+    """
+    Return the process-wide extraction pool, creating it on first use
+
+    The pool is only created by a process that actually extracts pages. Workers
+    shouldn't be forked from the checking process, which runs the fetch engine's
+    event loop thread, scheduler threads and a database pool: a forked child can
+    inherit a lock held by another thread and deadlock. Start methods this
+    platform lacks fall back to spawn.
+
+    Args:
+        workers (int): Number of worker processes; 0 disables the pool
+        start_method (str): multiprocessing start method for the workers
+
+    Returns:
+        ProcessPoolExecutor or None when extraction should run inline
+    """
+    global _pool
+    if workers <= 0:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            if start_method not in multiprocessing.get_all_start_methods():
+                start_method = 'spawn'
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(start_method)
+            )
+            logger.info(f"Extraction pool started with {workers} worker processes ({start_method})")
+        return _pool
+
+
+def _hold_worker(seconds):
+    """Pool task that keeps its worker busy, so each task of a warm-up lands on another worker"""
+    time.sleep(seconds)
+
+
+def warm_extraction_pool(workers, start_method='forkserver'):
+    """
+    Start every extraction worker now instead of as the first pages arrive
+
+    Args:
+        workers (int): Number of worker processes; 0 disables the pool
+        start_method (str): multiprocessing start method for the workers
+    """
+    pool = get_extraction_pool(workers, start_method)
+    if pool is not None:
+        for future in [pool.submit(_hold_worker, 0.2) for _ in range(workers)]:
+            future.result()
+
+
+def shutdown_extraction_pool(wait=False):
+    """Stop the extraction pool (it is recreated on next use)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
+
+
+def run_extraction(jobs, workers, start_method='forkserver'):
+    """
+    Extract and hash many pages, spreading the work across the process pool
+
+    Args:
+        jobs: List of (html_content, url) tuples
+        workers (int): Pool size; 0 runs everything in the calling thread
+        start_method (str): multiprocessing start method for the workers
+
+    Returns:
+        list: One (content, content_hash, simhash, error) tuple per job, in order
+    """
+    pool = get_extraction_pool(workers, start_method) if len(jobs) > 1 else None
+
+    if pool is None:
+        results = []
+        for html_content, url in jobs:
+            try:
+                results.append(extract_and_hash(html_content, url) + (None,))
+            except Exception as e:
+                results.append((None, None, None, e))
+        return results
+
+    futures = [pool.submit(extract_and_hash, html_content, url) for html_content, url in jobs]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result() + (None,))
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM-killed); start a fresh pool on the next run
+            logger.error(f"Extraction pool broken: {str(e)}")
+            shutdown_extraction_pool()
+            results.append((None, None, None, e))
+        except Exception as e:
+            results.append((None, None, None, e))
+    return results
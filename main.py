@@ -36,7 +36,7 @@ import routes
 if __name__ == "__main__":
     logger.info("Starting WebWatchDog server...")
     
-    # Initialize the scheduler and attach it to the app context
+    # Run the scheduler in this process for local development (production runs scheduler.py)
     try:
         logger.info("Initializing scheduler with user-specific schedules...")
         app.scheduler = init_scheduler()
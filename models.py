@@ -1,6 +1,7 @@
 import os
 import secrets
 from datetime import datetime, timedelta
+from flask import current_app
 from app import db
 import uuid
 from sqlalchemy import UUID, String, TypeDecorator
@@ -64,7 +65,27 @@ class Website(db.Model):
     url = db.Column(db.String, nullable=False)
     last_checked = db.Column(db.DateTime(timezone=True))
     last_content_hash = db.Column(db.String)
+    last_raw_hash = db.Column(db.String)  # Fingerprint of the normalized raw HTML behind last_content_hash
     status = db.Column(db.String, default='pending')  # pending, success, error
+    
+    # Latest-state summary kept up to date by the check pipeline, so listings
+    # don't need to load the checks table
+    last_check_status = db.Column(db.String, nullable=True)  # status of the latest check: success, changed, error
+    last_change_time = db.Column(db.DateTime(timezone=True), nullable=True)  # time of the latest 'changed' check
+    last_error = db.Column(db.String, nullable=True)  # error message of the latest check, if it failed
+    
+    # HTTP validators from the last full response, used for conditional GET
+    etag = db.Column(db.String, nullable=True)
+    last_modified = db.Column(db.String, nullable=True)
+    
+    # Optional per-site download cap in bytes, overriding FETCH_MAX_BYTES
+    max_content_bytes = db.Column(db.Integer, nullable=True)
+    
+    # SimHash of the version from the last significant change, and the Hamming
+    # distance from it a new version needs to count as changed (overrides
+    # CHANGE_SIMHASH_THRESHOLD; 0 reports every change)
+    last_simhash = db.Column(db.BigInteger, nullable=True)
+    change_threshold = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
     
     # User foreign key
@@ -75,8 +96,23 @@ class Website(db.Model):
                            cascade='all, delete-orphan',
                            order_by='desc(Check.check_time)')
     
+    def recent_checks(self, limit=3, status=None):
+        """
+        Latest checks of this website, newest first
+        
+        The lookback is bounded by CHECK_RECENT_WINDOW_DAYS so that, with
+        partitioned check history, only the newest partitions are scanned.
+        """
+        since = datetime.utcnow() - timedelta(days=current_app.config.get("CHECK_RECENT_WINDOW_DAYS", 31))
+        query = Check.query.filter(Check.website_id == self.id, Check.check_time >= since)
+        if status:
+            query = query.filter(Check.status == status)
+        return query.order_by(Check.check_time.desc()).limit(limit).all()
+    
     __table_args__ = (
         db.UniqueConstraint('url', 'user_id', name='uq_website_url_user'),
+        # The unique constraint leads with url; listings filter by user and sort by url
+        db.Index('ix_websites_user_id_url', 'user_id', 'url'),
     )
 
 class Check(db.Model):
@@ -88,8 +124,47 @@ class Check(db.Model):
     status = db.Column(db.String, nullable=False)  # success, error, changed
     content_hash = db.Column(db.String)
     error_message = db.Column(db.String)
+    simhash = db.Column(db.BigInteger, nullable=True)  # SimHash of the extracted text (signed 64-bit)
+    diff_summary = db.Column(db.JSON(none_as_null=True), nullable=True)  # Paragraph-level summary of a 'changed' check (see diffing.py)
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+
+# Latest checks of a website (Website.checks ordering, retention window function)
+db.Index('ix_checks_website_id_check_time', Check.website_id, Check.check_time.desc())
+# Latest change of a website; only 'changed' rows are indexed
+db.Index('ix_checks_website_id_changed', Check.website_id, Check.check_time.desc(),
+         postgresql_where=(Check.status == 'changed'))
+
+class ContentSnapshot(db.Model):
+    """Compressed extracted text, stored once per distinct content hash"""
+    __tablename__ = 'content_snapshots'
+
+    content_hash = db.Column(db.String(64), primary_key=True)
+    codec = db.Column(db.String(10), nullable=False)  # zstd or zlib
+    data = db.Column(db.LargeBinary, nullable=True)  # None when the filesystem backend holds the data
+    original_size = db.Column(db.Integer, nullable=False)
+    compressed_size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Retained checks with this content hash
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
 
+class CheckTask(db.Model):
+    """Queued check of one website, claimed and run by worker.py"""
+    __tablename__ = 'check_tasks'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    # At most one queued task per website; enqueueing it again merges into the queued one
+    website_id = db.Column(UUIDType, db.ForeignKey('websites.id', ondelete='CASCADE'), nullable=False, unique=True)
+    notify = db.Column(db.String(10), nullable=False, default='owner')  # owner (user's settings) or global
+    use_cache = db.Column(db.Boolean, nullable=False, default=True)  # False for manual checks
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    generation = db.Column(db.Integer, nullable=False, default=0)  # Bumped by every request merged into the task
+    available_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)  # Pushed ahead while claimed
+    claimed_by = db.Column(db.String, nullable=True)
+    last_error = db.Column(db.String, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+
+# Workers claim the tasks that became available first
+db.Index('ix_check_tasks_available_at', CheckTask.available_at)
+
 class PasswordReset(db.Model):
     __tablename__ = 'password_resets'
     
@@ -1,23 +1,478 @@
-import hashlib
-import trafilatura
 import logging
 import asyncio
-import requests
+import atexit
+import ssl
+import threading
+import time
+import certifi
+import httpx
 import contextlib
+import html
+import urllib.parse
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from telegram import Bot
-from sqlalchemy import and_, or_
-from app import db
-from models import Website, Check
+from app import app, db
 from email_sender import send_change_notification
+from check_writer import CheckOutcome, CheckResultWriter
+from extraction import (extract_text, hash_content, run_extraction, load_raw_normalizer, RawFingerprinter,
+                        hamming_distance, simhash_to_signed)
+from diffing import diff_texts, format_diff_summary
+from snapshots import get_snapshot_store
+
+
+class FetchResult:
+    """Outcome of fetching a single URL: either the raw HTML bytes or the error that occurred"""
+
+    def __init__(self, url, body=None, error=None, status_code=None, elapsed=0.0, etag=None, last_modified=None,
+                 raw_hash=None):
+        self.url = url
+        self.body = body
+        self.error = error
+        self.status_code = status_code
+        self.elapsed = elapsed
+        self.etag = etag
+        self.last_modified = last_modified
+        # Fingerprint of the normalized raw body, compared before paying for extraction
+        self.raw_hash = raw_hash
+        # Filled in by the extraction stage, then shared by every Website row that
+        # reuses this result
+        self.content = None
+        self.content_hash = None
+        self.simhash = None
+        self.extraction_error = None
+        # Runs currently using this result; the raw body is dropped when the last one is done
+        self.users = 0
+        self.lock = threading.Lock()
+
+    @property
+    def needs_extraction(self):
+        return self.ok and not self.not_modified and self.content_hash is None and self.extraction_error is None
+
+    def set_extracted(self, content, content_hash, error, simhash=None):
+        """Store the extraction stage output and release the raw body"""
+        with self.lock:
+            self.content = content
+            self.content_hash = content_hash
+            self.simhash = simhash
+            self.extraction_error = error
+            # The raw page isn't needed once hashed; don't keep it alive in the dedup cache
+            self.body = None
+
+    def retain(self, needs_body=False):
+        """
+        Register a run using this result
+
+        Args:
+            needs_body: The run may still have to extract the page
+
+        Returns:
+            bool: False if the body was already released and is needed (fetch again)
+        """
+        with self.lock:
+            if needs_body and self.body is None and self.needs_extraction:
+                return False
+            self.users += 1
+            return True
+
+    def release(self):
+        """Unregister a run; the raw body is dropped once no run needs it"""
+        with self.lock:
+            self.users -= 1
+            if self.users <= 0:
+                self.body = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def not_modified(self):
+        """True when the server answered a conditional request with 304 Not Modified"""
+        return self.status_code == 304
+
+
+def normalize_url(url):
+    """
+    Normalize a URL for deduplication
+
+    Lowercases the scheme and host, drops default ports and fragments, and uses "/"
+    for an empty path. Query strings and path case are kept since servers may treat
+    them as significant.
+    """
+    try:
+        parts = urllib.parse.urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        netloc = (parts.hostname or '').lower()
+        port = parts.port
+        if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+            netloc = f"{netloc}:{port}"
+        if parts.username:
+            netloc = f"{parts.username}{':' + parts.password if parts.password else ''}@{netloc}"
+        return urllib.parse.urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+    except ValueError:
+        return url
+
+
+class FetchCache:
+    """
+    Process-wide cache of recent full fetches keyed by normalized URL.
+
+    Lets runs for different users that fall within the same freshness window share
+    one fetch and one extraction per URL. Errors and 304 responses are not cached,
+    since a 304 only holds for the validators of the row that requested it.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0
+
+    def get(self, key, window):
+        """Return a result fetched within the last `window` seconds, or None"""
+        if window <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] <= window:
+                return entry[1]
+            return None
+
+    def put(self, key, result, window):
+        """Remember a successful full fetch for `window` seconds"""
+        if window <= 0 or not result.ok or result.not_modified:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._entries[key] = (now, result)
+
+            # Sweep expired entries at most twice per window
+            if now >= self._next_purge:
+                expired = [k for k, (fetched_at, _) in self._entries.items() if now - fetched_at > window]
+                for k in expired:
+                    del self._entries[k]
+                self._next_purge = now + window / 2
+
+
+class TokenBucket:
+    """Token bucket allowing `burst` requests at once, refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """
+        Take one token, returning how many seconds the caller must wait before using it.
+
+        Tokens may go negative so waiting callers queue up in order instead of racing
+        for the next refill.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+
+class HostRateLimiter:
+    """
+    Process-wide politeness limiter with one token bucket per host.
+
+    Hosts get the default rate and burst unless a domain override matches the host
+    itself or one of its parent domains. A rate of 0 disables limiting for that host.
+    """
+
+    def __init__(self, default_rate, default_burst, overrides=None):
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.overrides = overrides or {}
+        self._buckets = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a limiter from FETCH_HOST_RATE, FETCH_HOST_BURST and FETCH_HOST_LIMITS"""
+        return cls(
+            config.get("FETCH_HOST_RATE", 1.0),
+            config.get("FETCH_HOST_BURST", 3),
+            cls.parse_overrides(config.get("FETCH_HOST_LIMITS", ""))
+        )
+
+    @staticmethod
+    def parse_overrides(spec):
+        """
+        Parse per-domain limits
+
+        Args:
+            spec: Comma separated "domain=rate:burst" entries, e.g. "example.com=0.5:2,cdn.net=10:20"
+
+        Returns:
+            dict: domain -> (rate, burst)
+        """
+        overrides = {}
+        for entry in (spec or "").split(','):
+            entry = entry.strip()
+            if not entry:
+                continue
+            try:
+                domain, limits = entry.split('=', 1)
+                rate, _, burst = limits.partition(':')
+                overrides[domain.strip().lower()] = (float(rate), int(burst) if burst else 1)
+            except ValueError:
+                logging.error(f"Invalid FETCH_HOST_LIMITS entry ignored: {entry}")
+        return overrides
+
+    def limits_for(self, host):
+        """Return (rate, burst) for a host, honouring the most specific domain override"""
+        labels = host.lower().split('.')
+        for i in range(len(labels)):
+            domain = '.'.join(labels[i:])
+            if domain in self.overrides:
+                return self.overrides[domain]
+        return self.default_rate, self.default_burst
+
+    async def acquire(self, host):
+        """Wait until the host's bucket allows another request (engine loop only)"""
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst = self.limits_for(host)
+            if rate <= 0:
+                return
+            bucket = TokenBucket(rate, burst)
+            self._buckets[host] = bucket
+
+        wait = bucket.reserve()
+        if wait > 0:
+            logging.debug(f"Rate limiting {host}: waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+
+class FetchEngine:
+    """
+    Concurrent fetch engine backed by a dedicated asyncio event loop.
+
+    The loop runs in a daemon thread so callers in any thread (scheduler jobs,
+    request handlers, the CLI) can submit a batch of URLs and block until all of
+    them have been fetched. Only network I/O happens on the loop; extraction and
+    database work stay in the calling thread.
+
+    A single pooled HTTP client lives on the loop for the lifetime of the process,
+    so keep-alive connections (and their completed TLS handshakes) are reused
+    across runs and across WebsiteMonitor instances. Every request passes through
+    the per-host rate limiter, so concurrent runs for different users still share
+    one politeness budget per origin.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._client = None
+        self._host_semaphores = {}
+        self._ssl_context = None
+        self._rate_limiter = None
+        self._raw_normalizer = None
+
+    def _get_loop(self):
+        """Start the event loop thread on first use (or after it died)"""
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                # A client bound to a previous loop (or inherited across fork) can't be reused
+                self._client = None
+                self._host_semaphores = {}
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name='fetch-engine',
+                    daemon=True
+                )
+                self._thread.start()
+                logging.info("Fetch engine event loop started")
+            return self._loop
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+
+    def close(self):
+        """Close the pooled client; called at interpreter exit"""
+        if self._client is not None and self._loop is not None and self._thread.is_alive():
+            try:
+                self.run(self._client.aclose())
+            except Exception as e:
+                logging.error(f"Error closing fetch engine client: {str(e)}")
+            self._client = None
+
+    def _get_client(self):
+        """Return the shared pooled client, creating it on first use (engine loop only)"""
+        if self._client is None:
+            if self._ssl_context is None:
+                # Built once per process: loading the CA bundle is the expensive part
+                self._ssl_context = ssl.create_default_context(cafile=certifi.where())
+
+            limits = httpx.Limits(
+                max_connections=app.config.get("FETCH_MAX_CONNECTIONS", 100),
+                max_keepalive_connections=app.config.get("FETCH_MAX_CONNECTIONS", 100),
+                keepalive_expiry=app.config.get("FETCH_KEEPALIVE_EXPIRY", 60)
+            )
+            self._client = httpx.AsyncClient(
+                limits=limits,
+                verify=self._ssl_context,
+                follow_redirects=True
+            )
+            logging.info(f"Fetch engine HTTP client created (max connections: {limits.max_connections}, "
+                         f"per host: {app.config.get('FETCH_MAX_CONNECTIONS_PER_HOST', 6)})")
+        return self._client
+
+    def _get_raw_fingerprinter(self):
+        """New fingerprinter using the configured RAW_FINGERPRINT_NORMALIZER"""
+        if self._raw_normalizer is None:
+            try:
+                self._raw_normalizer = (load_raw_normalizer(app.config.get("RAW_FINGERPRINT_NORMALIZER", "")),)
+            except Exception as e:
+                logging.error(f"Invalid RAW_FINGERPRINT_NORMALIZER, using default: {str(e)}")
+                self._raw_normalizer = (load_raw_normalizer(""),)
+        return RawFingerprinter(self._raw_normalizer[0])
+
+    def _get_rate_limiter(self):
+        """Return the process-wide host rate limiter (engine loop only)"""
+        if self._rate_limiter is None:
+            self._rate_limiter = HostRateLimiter.from_config(app.config)
+        return self._rate_limiter
+
+    def _get_host_semaphore(self, host):
+        """Per-host connection limit shared by every fetch in this process (engine loop only)"""
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, app.config.get("FETCH_MAX_CONNECTIONS_PER_HOST", 6)))
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    def fetch_many(self, urls, headers, concurrency, timeout, conditional_headers=None, max_bytes=None):
+        """
+        Fetch all URLs concurrently
+
+        Args:
+            urls: List of URLs to fetch
+            headers: Request headers sent with every request
+            concurrency: Maximum number of requests in flight at once
+            timeout: Per-request timeout in seconds
+            conditional_headers: Optional list of per-URL extra headers (If-None-Match etc.)
+            max_bytes: Optional list of per-URL body size caps (None or 0 for no cap)
+
+        Returns:
+            list: FetchResult objects in the same order as urls
+        """
+        urls = list(urls)
+        if conditional_headers is None:
+            conditional_headers = [None] * len(urls)
+        if max_bytes is None:
+            max_bytes = [None] * len(urls)
+        return self.run(self._fetch_many(urls, headers, concurrency, timeout, list(conditional_headers), list(max_bytes)))
+
+    async def _fetch_many(self, urls, headers, concurrency, timeout, conditional_headers, max_bytes):
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        client = self._get_client()
+
+        async def fetch_limited(url, extra_headers, limit):
+            request_headers = dict(headers)
+            if extra_headers:
+                request_headers.update(extra_headers)
+            try:
+                host = httpx.URL(url).host
+            except Exception as e:
+                logging.error(f"Request error for {url}: {str(e)}")
+                return FetchResult(url, error=e)
+            # Wait for the host's rate limit and connection slot before taking a run
+            # slot, so a throttled host doesn't hold slots other hosts could use
+            await self._get_rate_limiter().acquire(host)
+            async with self._get_host_semaphore(host):
+                async with semaphore:
+                    return await self._fetch(client, url, request_headers, timeout, limit)
+
+        return await asyncio.gather(*(
+            fetch_limited(url, extra_headers, limit)
+            for url, extra_headers, limit in zip(urls, conditional_headers, max_bytes)
+        ))
+
+    def _check_content_type(self, response):
+        """Abort before reading the body if the server sent something we can't extract"""
+        allowed = app.config.get("FETCH_ALLOWED_CONTENT_TYPES")
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if allowed and content_type and content_type not in allowed:
+            raise Exception(f"Unsupported content type: {content_type}")
+
+    async def _fetch(self, client, url, headers, timeout, max_bytes=None):
+        started = time.monotonic()
+        try:
+            logging.info(f"Fetching content from {url}")
+            async with client.stream('GET', url, headers=headers, timeout=timeout) as response:
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+
+                # 304 carries no body; the caller reuses the previously stored hash
+                if response.status_code == 304:
+                    return FetchResult(
+                        url,
+                        status_code=304,
+                        elapsed=time.monotonic() - started,
+                        etag=etag,
+                        last_modified=last_modified
+                    )
+
+                response.raise_for_status()
+                self._check_content_type(response)
+
+                declared_length = response.headers.get('Content-Length', '')
+                if max_bytes and declared_length.isdigit() and int(declared_length) > max_bytes:
+                    raise Exception(f"Response size {declared_length} bytes exceeds limit of {max_bytes} bytes")
+
+                # Stream the body so memory per fetch is bounded by max_bytes, hashing as chunks arrive
+                fingerprinter = self._get_raw_fingerprinter()
+                chunks = []
+                received = 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if max_bytes and received > max_bytes:
+                        raise Exception(f"Response body exceeds limit of {max_bytes} bytes, download aborted")
+                    fingerprinter.update(chunk)
+                    chunks.append(chunk)
+
+            return FetchResult(
+                url,
+                body=b''.join(chunks),
+                status_code=response.status_code,
+                elapsed=time.monotonic() - started,
+                etag=etag,
+                last_modified=last_modified,
+                raw_hash=fingerprinter.hexdigest()
+            )
+        except Exception as e:
+            logging.error(f"Request error for {url}: {str(e)}")
+            return FetchResult(url, error=e, elapsed=time.monotonic() - started)
+
+
+# One engine per process, shared by all WebsiteMonitor instances
+fetch_engine = FetchEngine()
+atexit.register(fetch_engine.close)
+fetch_cache = FetchCache()
+
 
 class WebsiteMonitor:
-    def __init__(self, telegram_bot_token=None, telegram_chat_id=None, email_notifications_enabled=False, notification_email=None):
+    def __init__(self, telegram_bot_token=None, telegram_chat_id=None, email_notifications_enabled=False, notification_email=None,
+                 concurrency=None):
         self.telegram_bot_token = telegram_bot_token
         self.telegram_chat_id = telegram_chat_id
         self.email_notifications_enabled = email_notifications_enabled
         self.notification_email = notification_email
+        self.concurrency = concurrency or app.config.get("CHECK_CONCURRENCY", 20)
+        self.timeout = app.config.get("FETCH_TIMEOUT", 30)
+        # Snapshot store for loading previous versions when diffing (created on first use)
+        self.snapshot_store = None
         
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -41,47 +496,103 @@ class WebsiteMonitor:
 
     def get_content_hash(self, content):
         """Generate hash of content"""
-        if not content:
-            logging.warning("Empty content received for hashing")
-            return None
-
-        # Remove excessive whitespace and normalize
-        content = ' '.join(content.split())
-        return hashlib.sha256(content.encode()).hexdigest()
+        return hash_content(content)
+
+    def fetch_pages(self, urls, conditional_headers=None, max_bytes=None):
+        """Fetch raw HTML for many URLs concurrently, returning FetchResult objects in order"""
+        return fetch_engine.fetch_many(urls, self.headers, self.concurrency, self.timeout, conditional_headers, max_bytes)
+
+    def get_max_bytes(self, website):
+        """Body size cap for a website: its own override, else the global FETCH_MAX_BYTES"""
+        return website.max_content_bytes or app.config.get("FETCH_MAX_BYTES")
+
+    def get_conditional_headers(self, website):
+        """
+        Build If-None-Match / If-Modified-Since headers from the validators of the last response.
+
+        Validators are only sent once we have a stored hash, since a 304 reuses that hash.
+        """
+        headers = {}
+        if not website.last_content_hash:
+            return headers
+        if website.etag:
+            headers['If-None-Match'] = website.etag
+        if website.last_modified:
+            headers['If-Modified-Since'] = website.last_modified
+        return headers
+
+    def get_group_conditional_headers(self, websites):
+        """
+        Conditional headers for a URL shared by several Website rows.
+
+        A 304 reuses the stored hash, so validators are only sent when every row
+        would send the same ones and holds the same hash.
+        """
+        headers = self.get_conditional_headers(websites[0])
+        for website in websites[1:]:
+            if (website.last_content_hash != websites[0].last_content_hash
+                    or self.get_conditional_headers(website) != headers):
+                return {}
+        return headers
+
+    def is_raw_unchanged(self, website, fetch_result):
+        """True when the raw body fingerprint matches the one behind the stored content hash"""
+        return bool(
+            fetch_result.raw_hash
+            and website.last_content_hash
+            and website.last_raw_hash == fetch_result.raw_hash
+        )
+
+    def extract_results(self, fetch_results):
+        """
+        Extraction stage: turn raw bodies into text and hashes
+
+        Pages that still need extraction are spread across the EXTRACTION_WORKERS
+        process pool so parsing scales across cores instead of sharing the GIL with
+        the rest of the run. Each result is extracted once even if several Website
+        rows (or runs) share it.
+        """
+        pending = []
+        seen = set()
+        for fetch_result in fetch_results:
+            if fetch_result.needs_extraction and id(fetch_result) not in seen:
+                seen.add(id(fetch_result))
+                pending.append(fetch_result)
+
+        if not pending:
+            return
+
+        logging.info(f"Extracting content for {len(pending)} pages")
+        outputs = run_extraction(
+            [(fetch_result.body, fetch_result.url) for fetch_result in pending],
+            app.config.get("EXTRACTION_WORKERS", 0),
+            app.config.get("EXTRACTION_START_METHOD", "forkserver")
+        )
+        for fetch_result, (content, content_hash, simhash, error) in zip(pending, outputs):
+            if error is not None:
+                logging.error(f"Error extracting content for {fetch_result.url}: {str(error)}")
+            fetch_result.set_extracted(content, content_hash, error, simhash)
+
+    def get_result_hash(self, fetch_result, url):
+        """Return the content hash of a fetched page, extracting it first if needed"""
+        if fetch_result.needs_extraction:
+            self.extract_results([fetch_result])
+        if fetch_result.extraction_error is not None:
+            raise fetch_result.extraction_error
+        return fetch_result.content_hash
+
+    def extract_content(self, html_content, url):
+        """Extract the readable text from raw HTML"""
+        return extract_text(html_content, url)
 
     def fetch_website_content(self, url):
         try:
-            logging.info(f"Fetching content from {url}")
-
-            # Try with requests first to get the raw HTML
-            response = requests.get(url, headers=self.headers, timeout=30)
-            response.raise_for_status()
-            html_content = response.text
-
-            # Try trafilatura first
-            downloaded = trafilatura.load_html(html_content)
-            content = trafilatura.extract(downloaded)
-
-            # If trafilatura fails, try basic HTML extraction
-            if not content:
-                logging.warning(f"Trafilatura failed for {url}, trying fallback method")
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(html_content, 'lxml')
-
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.decompose()
+            result = self.fetch_pages([url], max_bytes=[app.config.get("FETCH_MAX_BYTES")])[0]
+            if not result.ok:
+                raise result.error
+            return self.extract_content(result.body, url)
 
-                # Get text and normalize whitespace
-                content = ' '.join(soup.get_text().split())
-
-            if not content:
-                raise Exception("Failed to extract content using both methods")
-
-            logging.info(f"Successfully fetched content from {url} (length: {len(content)})")
-            return content
-
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logging.error(f"Request error for {url}: {str(e)}")
             raise
         except Exception as e:
@@ -107,220 +618,369 @@ class WebsiteMonitor:
         except Exception as e:
             logging.error(f"Error in send_telegram_notification: {str(e)}")
 
-    def cleanup_old_checks(self, website_id):
-        """Keep only the last 3 checks for a website, always preserving the most recent change detection."""
+    def check_websites(self, websites, use_cache=True, writer=None, monitors=None):
+        """
+        Check many websites for changes
+
+        Websites are grouped by normalized URL so each distinct page is fetched and
+        hashed once, and pages fetched by another run within CHECK_DEDUP_WINDOW
+        seconds are reused. URLs are processed in chunks of self.concurrency: each
+        chunk's pages are fetched concurrently, extracted, and every Website row gets
+        its own Check record and notifications before the next chunk is fetched, so
+        only about one chunk of raw pages is in memory at a time. Results are
+        persisted in batches by a CheckResultWriter; notifications go out once their
+        batch is committed.
+
+        Args:
+            websites: Iterable of Website objects
+            use_cache: Reuse recent fetches from other runs (manual checks pass False)
+            writer: Optional CheckResultWriter to share; one is created (and flushed) if omitted
+            monitors: Optional dict of website id -> WebsiteMonitor that records and notifies
+                about that website (e.g. its owner's), for runs covering several users
+
+        Returns:
+            list: (website, has_changed) tuples in the same order as websites
+        """
+        websites = list(websites)
+        if not websites:
+            return []
+
+        window = app.config.get("CHECK_DEDUP_WINDOW", 300) if use_cache else 0
+
+        groups = {}
+        for website in websites:
+            groups.setdefault(normalize_url(website.url), []).append(website)
+
+        logging.info(f"Checking {len(groups)} unique URLs for {len(websites)} websites "
+                     f"with concurrency {self.concurrency}")
+        keys = list(groups)
+        chunk_size = max(1, self.concurrency)
+        outcomes = {}
+        with contextlib.ExitStack() as stack:
+            if writer is None:
+                writer = stack.enter_context(CheckResultWriter())
+            # Fetch, extract and record about one round of concurrent fetches at a
+            # time, so the raw pages held in memory are bounded by the concurrency
+            # rather than by the size of the run
+            for start in range(0, len(keys), chunk_size):
+                chunk = {key: groups[key] for key in keys[start:start + chunk_size]}
+                for outcome in self.check_url_groups(chunk, window, writer, monitors):
+                    outcomes[id(outcome.website)] = outcome
+
+        return [(website, outcomes[id(website)].has_changed) for website in websites]
+
+    def check_url_groups(self, groups, window, writer, monitors=None):
+        """
+        Fetch, extract and evaluate one chunk of a check_websites run
+
+        Args:
+            groups: dict of normalized URL -> Website objects sharing it
+            window: Seconds recent fetches from other runs are reused (0 = no reuse)
+            writer: CheckResultWriter the outcomes are added to
+            monitors: Optional dict of website id -> WebsiteMonitor (see check_websites)
+
+        Returns:
+            list: CheckOutcome objects
+        """
+        results_by_url = {}
+        to_fetch = []
         try:
-            # Keep the most recent 'changed' status check
-            latest_change = Check.query.filter(
-                and_(
-                    Check.website_id == website_id,
-                    Check.status == 'changed'
-                )
-            ).order_by(Check.check_time.desc()).first()
-
-            checks_to_keep_ids = []
-            if latest_change:
-                checks_to_keep_ids.append(latest_change.id)
-
-            # Get the 3 most recent checks (excluding the latest change if it exists)
-            recent_checks = Check.query.filter(
-                and_(
-                    Check.website_id == website_id,
-                    Check.id.notin_(checks_to_keep_ids) if checks_to_keep_ids else True
-                )
-            ).order_by(Check.check_time.desc()).limit(3).all()
-
-            checks_to_keep_ids.extend([check.id for check in recent_checks])
-
-            # Delete all other checks for this website
-            delete_query = Check.query.filter(
-                and_(
-                    Check.website_id == website_id,
-                    Check.id.notin_(checks_to_keep_ids)
-                )
+            for key, group in groups.items():
+                cached = fetch_cache.get(key, window)
+                needs_body = cached is not None and not all(self.is_raw_unchanged(website, cached) for website in group)
+                if cached is not None and cached.retain(needs_body):
+                    results_by_url[key] = cached
+                else:
+                    to_fetch.append(key)
+
+            logging.info(f"Fetching {len(to_fetch)} unique URLs "
+                         f"({len(groups) - len(to_fetch)} reused from recent fetches)")
+            fetch_results = self.fetch_pages(
+                [groups[key][0].url for key in to_fetch],
+                [self.get_group_conditional_headers(groups[key]) for key in to_fetch],
+                # Rows sharing a URL get the most generous of their caps
+                [max(self.get_max_bytes(website) or 0 for website in groups[key]) for key in to_fetch]
             )
+            for key, fetch_result in zip(to_fetch, fetch_results):
+                fetch_result.retain()
+                fetch_cache.put(key, fetch_result, window)
+                results_by_url[key] = fetch_result
+
+            # CPU-bound extraction across the process pool, only for pages whose raw
+            # bytes differ from what at least one of their rows saw last time
+            self.extract_results([
+                results_by_url[key]
+                for key, group in groups.items()
+                if not all(self.is_raw_unchanged(website, results_by_url[key]) for website in group)
+            ])
+
+            outcomes = []
+            for key, group in groups.items():
+                for website in group:
+                    monitor = monitors.get(website.id, self) if monitors else self
+                    outcome = monitor.evaluate_website(website, results_by_url[key])
+                    writer.add(outcome)
+                    outcomes.append(outcome)
+            return outcomes
+        finally:
+            # Raw pages aren't needed once hashed, including the ones left in the dedup cache
+            for fetch_result in results_by_url.values():
+                fetch_result.release()
+
+    def check_website(self, website, fetch_result=None):
+        """
+        Check a single website for changes and record the result immediately
+
+        Args:
+            website: Website object to check
+            fetch_result: Optional FetchResult from a concurrent fetch; fetched on demand if omitted
+
+        Returns:
+            bool: True if the content changed since the last check
+        """
+        if fetch_result is None:
+            fetch_result = self.fetch_pages(
+                [website.url],
+                [self.get_conditional_headers(website)],
+                [self.get_max_bytes(website)]
+            )[0]
+
+        outcome = self.evaluate_website(website, fetch_result)
+        with CheckResultWriter(batch_size=1) as writer:
+            writer.add(outcome)
+
+        if not outcome.persisted:
+            return False
+        logging.info(f"Successfully updated website status for {website.url} (changed: {outcome.has_changed})")
+        return outcome.has_changed
+
+    def evaluate_website(self, website, fetch_result):
+        """
+        Work out the result of a check without touching the database
+
+        Args:
+            website: Website object being checked
+            fetch_result: FetchResult for the website's URL
+
+        Returns:
+            CheckOutcome: The Check row and Website state to record
+        """
+        check_time = datetime.utcnow()
 
-            # Only run the delete if there are checks to remove
-            count = delete_query.count()
-            if count > 0:
-                delete_query.delete(synchronize_session=False)
-                logging.info(f"Deleted {count} old checks for website {website_id}")
-                db.session.commit()
-            
-            logging.info("Cleanup of old checks completed successfully")
-
-        except Exception as e:
-            logging.error(f"Error during cleanup of old checks: {str(e)}")
-            db.session.rollback()
-            # Continue with operation, don't fail the entire check because cleanup failed
-
-    def check_website(self, website):
-        """Check a website for changes, with proper database session handling"""
-        # Initialize timezone for error notifications
-        pst_time = datetime.now(ZoneInfo('America/Los_Angeles'))
-        
         try:
             logging.info(f"Checking website: {website.url}")
-            content = self.fetch_website_content(website.url)
-
-            if not content:
-                raise Exception("No content extracted from website")
-
-            current_hash = self.get_content_hash(content)
-            if not current_hash:
-                raise Exception("Failed to generate content hash")
-
-            # Compare content hashes
-            if website.last_content_hash:
-                logging.debug(f"Hash comparison: {website.last_content_hash[:8]} vs {current_hash[:8]}")
+            if not fetch_result.ok:
+                raise fetch_result.error
+
+            content = None
+            current_simhash = None
+            if fetch_result.not_modified:
+                # Server confirmed the page is unchanged - skip download and extraction
+                logging.info(f"{website.url} not modified since last check (HTTP 304)")
+                current_hash = website.last_content_hash
+            elif self.is_raw_unchanged(website, fetch_result):
+                # Same bytes as last time (after stripping nonces) - extraction would give the same hash
+                logging.info(f"{website.url} raw content unchanged, skipping extraction")
+                current_hash = website.last_content_hash
             else:
-                logging.debug("No previous hash available for comparison")
-
-            # Create check record with UTC timestamp
-            check = Check(
-                website_id=website.id,
-                status='success',
-                content_hash=current_hash,
-                check_time=datetime.utcnow()
-            )
+                current_hash = self.get_result_hash(fetch_result, website.url)
+                content = fetch_result.content
+                current_simhash = simhash_to_signed(fetch_result.simhash)
+
+            # Always update the website's last content hash and status with UTC timestamp
+            website_updates = {
+                'last_checked': check_time,
+                'last_content_hash': current_hash,
+                'status': 'success',
+                'last_error': None,
+            }
+
+            # Remember the validators and raw fingerprint for the next check
+            if not fetch_result.not_modified:
+                website_updates['etag'] = fetch_result.etag
+                website_updates['last_modified'] = fetch_result.last_modified
+                website_updates['last_raw_hash'] = fetch_result.raw_hash
 
             # Compare hashes and detect changes
-            has_changed = False
+            status = 'success'
+            diff_summary = None
             if website.last_content_hash:
-                has_changed = website.last_content_hash != current_hash
-                if has_changed:
-                    check.status = 'changed'
-                    pst_time = datetime.now(ZoneInfo('America/Los_Angeles'))
-                    logging.info(f"Change detected for {website.url}")
-
-                    # Send Telegram notification if configured
-                    if self.telegram_chat_id and self.telegram_bot_token:
-                        try:
-                            # Create and run an event loop for the async notification
-                            with contextlib.closing(asyncio.new_event_loop()) as notification_loop:
-                                asyncio.set_event_loop(notification_loop)
-                                notification_loop.run_until_complete(self.send_telegram_notification(
-                                    f"🔔 Change detected on {website.url}\n"
-                                    f"Time: {pst_time.strftime('%Y-%m-%d %I:%M:%S %p PST')}"
-                                ))
-                        except Exception as e:
-                            logging.error(f"Error sending Telegram notification: {str(e)}")
-                    
-                    # Send email notification if enabled
-                    if self.email_notifications_enabled and self.notification_email:
-                        try:
-                            logging.info(f"Sending email notification to {self.notification_email}")
-                            email_sent = send_change_notification(
-                                self.notification_email, 
-                                website.url, 
-                                check_time=check.check_time
-                            )
-                            if email_sent:
-                                logging.info(f"Email notification sent successfully to {self.notification_email}")
-                            else:
-                                logging.warning(f"Failed to send email notification to {self.notification_email}")
-                        except Exception as e:
-                            logging.error(f"Error sending email notification: {str(e)}")
+                logging.debug(f"Hash comparison: {website.last_content_hash[:8]} vs {current_hash[:8]}")
+                if website.last_content_hash != current_hash:
+                    if self.is_significant_change(website, current_simhash):
+                        status = 'changed'
+                        logging.info(f"Change detected for {website.url}")
+                        diff_summary = self.get_diff_summary(website, content)
+                        # The new version becomes the baseline for measuring the next change
+                        website_updates['last_simhash'] = current_simhash
             else:
                 logging.info(f"First check for {website.url}, setting initial hash")
+                website_updates['last_simhash'] = current_simhash
+            if website.last_simhash is None and current_simhash is not None:
+                website_updates['last_simhash'] = current_simhash
 
-            # Always update the website's last content hash and status with UTC timestamp
-            website.last_checked = datetime.utcnow()
-            website.last_content_hash = current_hash
-            website.status = 'success'
-
-            try:
-                # Add and commit changes in the correct order
-                db.session.add(check)
-                db.session.add(website)
-                db.session.commit()
-                logging.info("Database changes committed successfully")
+            website_updates['last_check_status'] = status
+            if status == 'changed':
+                website_updates['last_change_time'] = check_time
 
-                # Verify the update by refreshing from database
-                db.session.refresh(website)
-                db.session.refresh(check)
+            return CheckOutcome(self, website, status, check_time, content_hash=current_hash,
+                                website_updates=website_updates, content=content,
+                                diff_summary=diff_summary, simhash=current_simhash)
 
-                # Clean up old checks after successful update using a try-except to isolate failures
-                try:
-                    self.cleanup_old_checks(website.id)
-                except Exception as cleanup_error:
-                    logging.error(f"Cleanup error (non-fatal): {str(cleanup_error)}")
-                    # Don't let cleanup errors affect the main operation
+        except Exception as e:
+            error_msg = str(e)
+            logging.error(f"Error checking website {website.url}: {error_msg}")
+            return CheckOutcome(self, website, 'error', check_time, error_message=error_msg,
+                                website_updates={
+                                    'status': 'error',
+                                    'last_checked': check_time,
+                                    'last_check_status': 'error',
+                                    'last_error': error_msg,
+                                })
+
+    def is_significant_change(self, website, current_simhash):
+        """
+        Decide whether a content hash change is big enough to report
+
+        The SimHash of the new version is compared with the one from the last
+        significant change, so small edits can't accumulate unnoticed. The
+        threshold is the website's change_threshold, or CHANGE_SIMHASH_THRESHOLD;
+        0 (the default) reports every change.
+
+        Args:
+            website: Website being checked
+            current_simhash: Signed SimHash of the new version, or None if unknown
+
+        Returns:
+            bool: True if the change should be reported
+        """
+        threshold = website.change_threshold
+        if threshold is None:
+            threshold = app.config.get("CHANGE_SIMHASH_THRESHOLD", 0)
+        if not threshold or current_simhash is None or website.last_simhash is None:
+            return True
+
+        distance = hamming_distance(current_simhash, website.last_simhash)
+        if distance < threshold:
+            logging.info(f"Insignificant change on {website.url} (SimHash distance {distance} < {threshold})")
+            return False
+        return True
+
+    def get_previous_content(self, website):
+        """Load the extracted text behind the website's stored hash from the snapshot store"""
+        if self.snapshot_store is None:
+            self.snapshot_store = get_snapshot_store(app.config)
+        if self.snapshot_store is None or not website.last_content_hash:
+            return None
+        with db.engine.connect() as conn:
+            return self.snapshot_store.get(conn, website.last_content_hash)
 
-            except Exception as db_error:
-                logging.error(f"Error committing database changes: {str(db_error)}")
-                try:
-                    db.session.rollback()
-                except:
-                    pass
-                raise
+    def get_diff_summary(self, website, content):
+        """
+        Summarize what changed since the previous version of the page
 
-            logging.info(f"Successfully updated website status for {website.url} (changed: {has_changed})")
-            return has_changed
+        Args:
+            website: Website whose last_content_hash is the previous version
+            content: Newly extracted text
 
+        Returns:
+            dict or None when either version isn't available
+        """
+        if content is None:
+            return None
+        try:
+            previous = self.get_previous_content(website)
+            if previous is None:
+                return None
+            return diff_texts(previous, content)
         except Exception as e:
-            error_msg = str(e)
-            logging.error(f"Error checking website {website.url}: {error_msg}")
-            
+            # A missing diff shouldn't fail the check
+            logging.error(f"Error computing diff for {website.url}: {str(e)}")
+            return None
+
+    def notify_outcome(self, outcome):
+        """
+        Send notifications for a recorded check result
+
+        Called by CheckResultWriter once the result's batch has been committed.
+
+        Args:
+            outcome: CheckOutcome that was persisted
+        """
+        if outcome.status == 'changed':
+            self.send_change_notifications(outcome.website.url, outcome.check_time, outcome.diff_summary)
+        elif outcome.status == 'error':
+            self.send_error_notifications(outcome.website.url, outcome.error_message, outcome.check_time)
+
+    def run_telegram_notification(self, message):
+        """Run send_telegram_notification from synchronous code"""
+        # Create and run an event loop for the async notification
+        with contextlib.closing(asyncio.new_event_loop()) as notification_loop:
+            asyncio.set_event_loop(notification_loop)
+            notification_loop.run_until_complete(self.send_telegram_notification(message))
+
+    def send_change_notifications(self, url, check_time, diff_summary=None):
+        """Notify the user by Telegram and email that a website changed"""
+        pst_time = datetime.now(ZoneInfo('America/Los_Angeles'))
+
+        # Send Telegram notification if configured
+        if self.telegram_chat_id and self.telegram_bot_token:
             try:
-                # Create a fresh check record for the error
-                check = Check(
-                    website_id=website.id,
-                    status='error',
-                    error_message=error_msg,
-                    check_time=datetime.utcnow()
+                message = (
+                    f"🔔 Change detected on {url}\n"
+                    f"Time: {pst_time.strftime('%Y-%m-%d %I:%M:%S %p PST')}"
                 )
+                if diff_summary:
+                    message += f"\n\n{html.escape(format_diff_summary(diff_summary))}"
+                self.run_telegram_notification(message)
+            except Exception as e:
+                logging.error(f"Error sending Telegram notification: {str(e)}")
 
-                # Update website status
-                website.status = 'error'
-                website.last_checked = datetime.utcnow()
-
-                # Add and commit changes
-                db.session.add(check)
-                db.session.add(website)  # Make sure website changes are saved
-                
-                # Use a short transaction
-                db.session.commit()
-                logging.info(f"Error status recorded for {website.url}")
-                
-                # Send notifications about the error
-                
-                # Send Telegram notification if configured
-                if self.telegram_chat_id and self.telegram_bot_token:
-                    try:
-                        # Create and run an event loop for the async notification
-                        with contextlib.closing(asyncio.new_event_loop()) as error_loop:
-                            asyncio.set_event_loop(error_loop)
-                            error_loop.run_until_complete(self.send_telegram_notification(
-                                f"❌ Error checking {website.url}\n"
-                                f"Time: {pst_time.strftime('%Y-%m-%d %I:%M:%S %p PST')}\n"
-                                f"Error: {error_msg}"
-                            ))
-                    except Exception as notify_error:
-                        logging.error(f"Error sending Telegram error notification: {str(notify_error)}")
-                        
-                # Send email notification if enabled
-                if self.email_notifications_enabled and self.notification_email:
-                    try:
-                        logging.info(f"Sending error email notification to {self.notification_email}")
-                        # For errors, we use the same notification function but add error context
-                        email_sent = send_change_notification(
-                            self.notification_email, 
-                            f"{website.url} (Error: {error_msg[:50]}...)", 
-                            check_time=check.check_time
-                        )
-                        if email_sent:
-                            logging.info(f"Error email notification sent successfully to {self.notification_email}")
-                        else:
-                            logging.warning(f"Failed to send error email notification to {self.notification_email}")
-                    except Exception as e:
-                        logging.error(f"Error sending error email notification: {str(e)}")
-                    
-            except Exception as db_error:
-                logging.error(f"Failed to record error status: {str(db_error)}")
-                try:
-                    db.session.rollback()
-                except:
-                    pass
-            
-            return False
\ No newline at end of file
+        # Send email notification if enabled
+        if self.email_notifications_enabled and self.notification_email:
+            try:
+                logging.info(f"Sending email notification to {self.notification_email}")
+                email_sent = send_change_notification(
+                    self.notification_email,
+                    url,
+                    check_time=check_time,
+                    diff_summary=diff_summary
+                )
+                if email_sent:
+                    logging.info(f"Email notification sent successfully to {self.notification_email}")
+                else:
+                    logging.warning(f"Failed to send email notification to {self.notification_email}")
+            except Exception as e:
+                logging.error(f"Error sending email notification: {str(e)}")
+
+    def send_error_notifications(self, url, error_msg, check_time):
+        """Notify the user by Telegram and email that a website check failed"""
+        pst_time = datetime.now(ZoneInfo('America/Los_Angeles'))
+
+        # Send Telegram notification if configured
+        if self.telegram_chat_id and self.telegram_bot_token:
+            try:
+                self.run_telegram_notification(
+                    f"❌ Error checking {url}\n"
+                    f"Time: {pst_time.strftime('%Y-%m-%d %I:%M:%S %p PST')}\n"
+                    f"Error: {error_msg}"
+                )
+            except Exception as notify_error:
+                logging.error(f"Error sending Telegram error notification: {str(notify_error)}")
+
+        # Send email notification if enabled
+        if self.email_notifications_enabled and self.notification_email:
+            try:
+                logging.info(f"Sending error email notification to {self.notification_email}")
+                # For errors, we use the same notification function but add error context
+                email_sent = send_change_notification(
+                    self.notification_email,
+                    f"{url} (Error: {error_msg[:50]}...)",
+                    check_time=check_time
+                )
+                if email_sent:
+                    logging.info(f"Error email notification sent successfully to {self.notification_email}")
+                else:
+                    logging.warning(f"Failed to send error email notification to {self.notification_email}")
+            except Exception as e:
+                logging.error(f"Error sending error email notification: {str(e)}")
@@ -1,9 +1,11 @@
 from flask import render_template, jsonify, request, g, redirect, url_for, session
 from datetime import datetime
+import base64
 import logging
 from app import app, db, set_toast_message_in_session
 from models import Website, Check, User
 from monitor import WebsiteMonitor
+from snapshots import release_website_snapshots
 from sqlalchemy import UUID
 from flask_login import login_required, current_user
 
@@ -21,6 +23,73 @@ def before_request():
     else:
         g.user_id = None
 
+# Columns the website listing can return, by field name
+WEBSITE_LIST_FIELDS = {
+    'id': Website.id,
+    'url': Website.url,
+    'status': Website.status,
+    'last_checked': Website.last_checked,
+    'last_check_status': Website.last_check_status,
+    'last_change_time': Website.last_change_time,
+    'last_error': Website.last_error,
+    'created_at': Website.created_at,
+}
+
+def encode_website_cursor(url):
+    """Opaque keyset cursor for the website listing (position after the given URL)"""
+    return base64.urlsafe_b64encode(url.encode()).decode()
+
+def decode_website_cursor(cursor):
+    """Inverse of encode_website_cursor; raises ValueError on malformed cursors"""
+    try:
+        return base64.urlsafe_b64decode(cursor.encode()).decode()
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def query_websites_page(user_id, limit, cursor=None, status=None, changed_since=None, fields=None):
+    """
+    Fetch one page of a user's websites ordered by URL using keyset pagination
+    
+    URLs are unique per user, so the last URL of a page is enough to resume from,
+    and each page is a range scan on the (user_id, url) index no matter how deep
+    into the list it is.
+    
+    Args:
+        user_id: Owner of the websites
+        limit (int): Maximum number of websites to return
+        cursor (str): Cursor returned with the previous page, or None for the first page
+        status (str): Optional filter: 'changed' matches the latest check status,
+            anything else matches Website.status
+        changed_since (datetime): Optional lower bound on last_change_time
+        fields (list): Field names from WEBSITE_LIST_FIELDS to select (default: all)
+        
+    Returns:
+        tuple: (list of rows with the selected fields as attributes, next cursor or None)
+    """
+    fields = list(fields or WEBSITE_LIST_FIELDS)
+    # The cursor is built from the url, so always select it
+    columns = [WEBSITE_LIST_FIELDS[name] for name in fields]
+    if 'url' not in fields:
+        columns.append(Website.url)
+    
+    query = db.session.query(*columns).filter(Website.user_id == user_id)
+    if cursor:
+        query = query.filter(Website.url > decode_website_cursor(cursor))
+    if status == 'changed':
+        query = query.filter(Website.last_check_status == 'changed')
+    elif status:
+        query = query.filter(Website.status == status)
+    if changed_since:
+        query = query.filter(Website.last_change_time >= changed_since)
+    
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(Website.url).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_website_cursor(rows[-1].url)
+    return rows, next_cursor
+
 @app.route('/')
 def index():
     """Redirect to dashboard if logged in, otherwise show login page"""
@@ -34,10 +103,13 @@ def index():
 def dashboard():
     """Display the main dashboard with the user's monitored websites"""
     try:
-        # Get current user's websites, ordered by URL
-        websites = Website.query.filter_by(user_id=current_user.id).order_by(Website.url).all()
+        # Render the first page of the user's websites, ordered by URL; the rest
+        # are loaded from /api/websites as the user scrolls
+        websites, next_cursor = query_websites_page(current_user.id, app.config["WEBSITE_PAGE_SIZE"])
         return render_template('dashboard.html', 
                               websites=websites, 
+                              next_cursor=next_cursor,
+                              page_size=app.config["WEBSITE_PAGE_SIZE"],
                               current_year=session.get('current_year', datetime.now().year),
                               user=current_user)
     except Exception as e:
@@ -49,6 +121,69 @@ def dashboard():
                               current_year=session.get('current_year', datetime.now().year),
                               user=current_user)
 
+@app.route('/api/websites', methods=['GET'])
+@login_required
+def list_websites():
+    """
+    List the current user's websites, one page at a time
+    
+    Query parameters:
+        limit: Page size (default WEBSITE_PAGE_SIZE, capped at WEBSITE_PAGE_SIZE_MAX)
+        cursor: next_cursor from the previous page
+        status: pending, success, error or changed
+        changed_since: ISO 8601 timestamp; only websites changed at or after it
+        fields: Comma-separated subset of the website fields to return
+    """
+    try:
+        limit = request.args.get('limit', app.config["WEBSITE_PAGE_SIZE"], type=int)
+        limit = max(1, min(limit, app.config["WEBSITE_PAGE_SIZE_MAX"]))
+        
+        fields = None
+        if request.args.get('fields'):
+            fields = [name.strip() for name in request.args['fields'].split(',') if name.strip()]
+            unknown = [name for name in fields if name not in WEBSITE_LIST_FIELDS]
+            if unknown:
+                return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+        
+        changed_since = None
+        if request.args.get('changed_since'):
+            try:
+                changed_since = datetime.fromisoformat(request.args['changed_since'].replace('Z', '+00:00'))
+            except ValueError:
+                return jsonify({'error': 'changed_since must be an ISO 8601 timestamp'}), 400
+        
+        try:
+            rows, next_cursor = query_websites_page(
+                current_user.id,
+                limit,
+                cursor=request.args.get('cursor'),
+                status=request.args.get('status'),
+                changed_since=changed_since,
+                fields=fields
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        websites = []
+        for row in rows:
+            website = {}
+            for name in fields or WEBSITE_LIST_FIELDS:
+                value = getattr(row, name)
+                if isinstance(value, datetime):
+                    value = value.isoformat()
+                elif value is not None and name == 'id':
+                    value = str(value)
+                website[name] = value
+            websites.append(website)
+        
+        return jsonify({
+            'websites': websites,
+            'next_cursor': next_cursor
+        }), 200
+    except Exception as e:
+        logging.error(f"Error listing websites: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/websites', methods=['POST'])
 @login_required
 def add_website():
@@ -119,7 +254,9 @@ def delete_website(website_id):
         logging.info(f"Deleting website {website.url} with ID {website_id}")
 
         try:
-            # Delete in a single transaction with cascading
+            # Delete in a single transaction with cascading, releasing the
+            # snapshot references held by the website's checks
+            release_website_snapshots(db.session.connection(), website.id)
             db.session.delete(website)
             db.session.commit()
             
@@ -183,11 +320,10 @@ def check_website(website_id):
             email_notifications_enabled=current_user.email_notifications_enabled,
             notification_email=current_user.notification_email or current_user.email
         )
+        # The result is committed before check_website returns and the new state is
+        # already set on the website object, so no refresh is needed
         has_changed = monitor.check_website(website)
 
-        # Refresh website data from database after check
-        db.session.refresh(website)
-
         # Only set toast message for non-API requests
         if not request.path.startswith('/api/'):
             # Store toast message in session
@@ -206,6 +342,9 @@ def check_website(website_id):
         return jsonify({
             'status': website.status,
             'last_checked': last_checked_data,
+            'last_check_status': website.last_check_status,
+            'last_change_time': website.last_change_time.isoformat() if website.last_change_time else None,
+            'last_error': website.last_error,
             'has_changed': has_changed,
             'message': 'Website checked successfully'
         }), 200
@@ -213,6 +352,71 @@ def check_website(website_id):
         logging.error(f"Error checking website {website_id}: {str(e)}")
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/websites/<uuid:website_id>', methods=['PATCH'])
+@login_required
+def update_website(website_id):
+    """Update per-website check settings (change_threshold, max_content_bytes)"""
+    try:
+        website = Website.query.get_or_404(website_id)
+        if website.user_id != current_user.id:
+            return jsonify({'error': 'You do not have permission to update this website'}), 403
+        
+        data = request.get_json() or {}
+        if 'change_threshold' in data:
+            threshold = data['change_threshold']
+            if threshold is not None and (not isinstance(threshold, int) or not 0 <= threshold <= 64):
+                return jsonify({'error': 'change_threshold must be an integer between 0 and 64, or null'}), 400
+            website.change_threshold = threshold
+        if 'max_content_bytes' in data:
+            max_bytes = data['max_content_bytes']
+            if max_bytes is not None and (not isinstance(max_bytes, int) or max_bytes <= 0):
+                return jsonify({'error': 'max_content_bytes must be a positive integer, or null'}), 400
+            website.max_content_bytes = max_bytes
+        
+        db.session.commit()
+        return jsonify({
+            'id': str(website.id),
+            'change_threshold': website.change_threshold,
+            'max_content_bytes': website.max_content_bytes,
+            'message': 'Website updated successfully'
+        }), 200
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except:
+            pass
+        logging.error(f"Error updating website {website_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/websites/<uuid:website_id>/changes', methods=['GET'])
+@login_required
+def website_changes(website_id):
+    """Return the most recent detected changes of a website with their diff summaries"""
+    try:
+        website = Website.query.get_or_404(website_id)
+        if website.user_id != current_user.id:
+            return jsonify({'error': 'You do not have permission to view this website'}), 403
+        
+        limit = max(1, min(request.args.get('limit', 5, type=int), 50))
+        changes = website.recent_checks(limit=limit, status='changed')
+        
+        return jsonify({
+            'id': str(website.id),
+            'url': website.url,
+            'changes': [
+                {
+                    'check_id': str(check.id),
+                    'check_time': check.check_time.isoformat() if check.check_time else None,
+                    'content_hash': check.content_hash,
+                    'diff_summary': check.diff_summary
+                }
+                for check in changes
+            ]
+        }), 200
+    except Exception as e:
+        logging.error(f"Error loading changes for website {website_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/check-all', methods=['POST'])
 @login_required
 def check_all_websites():
@@ -243,6 +447,15 @@ def check_all_websites():
             # Store toast message in session
             set_toast_message_in_session('No websites to check', 'warning')
             return jsonify({'message': 'No websites to check'}), 200
+        
+        if app.config["CHECK_QUEUE_ENABLED"]:
+            # Check workers pick these up; results show on the dashboard as they land
+            from check_queue import enqueue_checks
+            queued = enqueue_checks([website.id for website in websites], use_cache=False)
+            return jsonify({
+                'message': f'Queued {queued} websites for checking',
+                'queued': queued
+            }), 202
             
         # Initialize monitor with email notification support
         monitor = WebsiteMonitor(
@@ -252,33 +465,24 @@ def check_all_websites():
             notification_email=current_user.notification_email or current_user.email
         )
         
+        # Fetch all websites concurrently, then record each result
         website_results = []
-        for website in websites:
-            try:
-                has_changed = monitor.check_website(website)
-                # Refresh website data
-                db.session.refresh(website)
-                
-                # Format last_checked for JSON serialization
-                last_checked = None
-                if website.last_checked:
-                    last_checked = website.last_checked.isoformat()
-                
-                website_results.append({
-                    'id': str(website.id),
-                    'url': website.url,
-                    'status': website.status,
-                    'has_changed': has_changed,
-                    'last_checked': last_checked
-                })
-            except Exception as e:
-                logging.error(f"Error checking website {website.url}: {str(e)}")
-                website_results.append({
-                    'id': str(website.id),
-                    'url': website.url,
-                    'status': 'error',
-                    'error': str(e)
-                })
+        for website, has_changed in monitor.check_websites(websites, use_cache=False):
+            # Format last_checked for JSON serialization
+            last_checked = None
+            if website.last_checked:
+                last_checked = website.last_checked.isoformat()
+            
+            website_results.append({
+                'id': str(website.id),
+                'url': website.url,
+                'status': website.status,
+                'has_changed': has_changed,
+                'last_checked': last_checked,
+                'last_check_status': website.last_check_status,
+                'last_change_time': website.last_change_time.isoformat() if website.last_change_time else None,
+                'last_error': website.last_error
+            })
                 
         # Only set toast message for non-API requests
         if not request.path.startswith('/api/'):
@@ -310,29 +514,49 @@ def debug_scheduler():
         }), 403
         
     try:
-        # Make sure we have the scheduler
-        if not hasattr(app, 'scheduler') or not app.scheduler:
+        from scheduler import (get_scheduler_leader, get_stored_jobs, jitter_slots, user_slot, schedule_job_id,
+                               SCHEDULER_TIMEZONE)
+        
+        # The scheduler normally runs in its own process; this process only has
+        # one when started with python main.py
+        service = getattr(app, 'scheduler', None)
+        scheduler = service.scheduler if service else None
+        leader = get_scheduler_leader()
+        if scheduler is None and leader is None:
             return jsonify({
                 'status': 'error',
-                'message': 'Scheduler not found. It may not be initialized.'
+                'message': 'No scheduler is running. Start one with: python scheduler.py'
             })
             
-        # Get scheduler information
-        scheduler = app.scheduler
         jobs = []
         
-        # Get current user's jobs
+        # Get current user's jobs (jobs are shared by everyone on the same schedule)
         user_id_str = str(current_user.id)
         username = current_user.username
+        user_crons = {cron for cron in (current_user.schedule_1, current_user.schedule_2,
+                                        current_user.schedule_3, current_user.schedule_4) if cron}
         
-        # Collect info on all jobs
-        for job in scheduler.get_jobs():
+        # Load spreading: this user's checks run in one slot of the jitter window
+        slots, step = jitter_slots()
+        slot = user_slot(current_user.id, slots)
+        user_job_ids = {schedule_job_id(cron, slot, step) for cron in user_crons}
+        
+        # Collect info on all jobs (when another process leads, only the IDs and
+        # run times stored in its job table are available)
+        if scheduler:
+            stored_jobs = [
+                {'id': job.id, 'name': job.name, 'next_run_time': job.next_run_time, 'trigger': str(job.trigger)}
+                for job in scheduler.get_jobs()
+            ]
+        else:
+            stored_jobs = get_stored_jobs()
+        for job in stored_jobs:
             job_info = {
-                'id': job.id,
-                'name': job.name,
-                'next_run_time': str(job.next_run_time) if job.next_run_time else 'Not scheduled',
-                'trigger': str(job.trigger),
-                'is_user_job': job.id.startswith(f'user_{user_id_str}')
+                'id': job['id'],
+                'name': job.get('name'),
+                'next_run_time': str(job['next_run_time']) if job['next_run_time'] else 'Not scheduled',
+                'trigger': job.get('trigger'),
+                'is_user_job': job['id'] in user_job_ids
             }
             jobs.append(job_info)
             
@@ -363,7 +587,7 @@ def debug_scheduler():
         from datetime import datetime
         now = datetime.now()
         import pytz
-        tz = scheduler.timezone if hasattr(scheduler, 'timezone') else pytz.UTC
+        tz = scheduler.timezone if scheduler else SCHEDULER_TIMEZONE
         pst_tz = pytz.timezone('America/Los_Angeles')  # Add explicit PST timezone
         now_with_tz = datetime.now(tz)
         now_in_pst = datetime.now(pst_tz)
@@ -372,7 +596,14 @@ def debug_scheduler():
         return jsonify({
             'status': 'success',
             'scheduler_info': {
-                'running': scheduler.running,
+                'running': scheduler.running if scheduler else leader is not None,
+                'leader': leader,
+                'leader_is_this_process': scheduler is not None,
+                'jitter': {
+                    'window_seconds': app.config["SCHEDULE_JITTER_WINDOW"],
+                    'step_seconds': step,
+                    'slots': slots
+                },
                 'timezone': str(tz),
                 'timezone_name': 'US Pacific Time (PST/PDT)',
                 'server_time': str(now),
@@ -382,7 +613,9 @@ def debug_scheduler():
             'user_info': {
                 'id': user_id_str,
                 'username': username,
-                'schedules': user_schedules
+                'schedules': user_schedules,
+                # Delay after each scheduled time before this user's checks start
+                'jitter_offset_seconds': slot * step
             },
             'jobs': jobs
         })
@@ -435,14 +668,9 @@ def run_scheduled_checks_now():
         websites = Website.query.filter_by(user_id=current_user.id).all()
         logging.info(f"Manually checking {len(websites)} websites for user {current_user.username}")
         
-        # Check each website
-        for website in websites:
-            try:
-                monitor.check_website(website)
-                logging.info(f"Manual check completed for {website.url}")
-            except Exception as e:
-                logging.error(f"Error in manual check for {website.url}: {str(e)}")
-                # Continue with next website
+        # Check all websites concurrently
+        for website, has_changed in monitor.check_websites(websites, use_cache=False):
+            logging.info(f"Manual check completed for {website.url} (status: {website.status})")
         
         # Create a toast message in session
         set_toast_message_in_session('Manual check triggered successfully', 'success')
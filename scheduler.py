@@ -0,0 +1,699 @@
+"""
+Scheduler Module for WebWatchDog
+Runs the scheduled website checks and maintenance jobs
+
+The scheduler runs as its own process (python scheduler.py), separate from the
+gunicorn web workers. Several scheduler processes can run at once, on any number
+of hosts: each one tries to take a PostgreSQL advisory lock and only the holder
+(the leader) starts the jobs. The others stay on standby and retry the lock every
+SCHEDULER_LEADER_POLL_INTERVAL seconds. The lock belongs to the leader's database
+session, so it is released as soon as the leader exits or its connection drops
+(detected by TCP keepalives if the host dies), and a standby takes over.
+
+There is one job per distinct cron expression rather than one per user schedule:
+when it fires, the websites of every user on that schedule go through a single
+check pipeline, so the job count and per-run overhead grow with the number of
+distinct schedules, not with the number of users. Optionally
+(SCHEDULE_JITTER_WINDOW) each schedule is split into slots spread over a window
+after its fire time, and every user is hashed to one slot, so popular times like
+08:00 don't start every check at the same second.
+
+Jobs live in a SQLAlchemy job store in the application database. A new leader
+resumes the stored jobs instead of rebuilding them, and runs missed during a
+restart or failover fire once (coalesced) when it takes over. It then adds jobs
+for any schedule in the users table that doesn't have one yet.
+
+Web workers never touch the jobs directly. When a user's schedules change they
+send a NOTIFY (see notify_schedule_change) and the leader, which LISTENs on its
+lock connection, makes sure that user's schedules have jobs.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import func, or_, text
+
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+# Use US Pacific Time as the primary timezone for scheduling
+SCHEDULER_TIMEZONE = pytz.timezone('America/Los_Angeles')  # PST/PDT timezone
+
+# NOTIFY channel for schedule changes; the payload is the user id
+SCHEDULE_CHANGES_CHANNEL = 'webwatchdog_schedule_changes'
+
+# The legacy global check of every website runs on the default user schedule
+GLOBAL_CHECK_CRON = "0 8 * * *"
+
+def create_user_monitor(user):
+    """Monitor that notifies a user through their Telegram chat and email settings"""
+    from monitor import WebsiteMonitor
+
+    return WebsiteMonitor(
+        telegram_bot_token=app.config["TELEGRAM_BOT_TOKEN"],
+        telegram_chat_id=user.telegram_chat_id or app.config["TELEGRAM_CHAT_ID"],
+        email_notifications_enabled=user.email_notifications_enabled,
+        notification_email=user.notification_email or user.email
+    )
+
+
+def jitter_slots():
+    """
+    Number of load-spreading slots in SCHEDULE_JITTER_WINDOW
+
+    Returns:
+        tuple: (slots, seconds between slots); (1, 0) when spreading is off
+    """
+    window = app.config.get("SCHEDULE_JITTER_WINDOW", 0)
+    step = app.config.get("SCHEDULE_JITTER_STEP", 60)
+    if window <= 0 or step <= 0:
+        return 1, 0
+    return max(1, window // step), step
+
+
+def user_slot(user_id, slots):
+    """Deterministic load-spreading slot of a user, stable across restarts and hosts"""
+    if slots <= 1:
+        return 0
+    digest = hashlib.blake2b(str(user_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % slots
+
+
+class OffsetTrigger(BaseTrigger):
+    """Fires a fixed number of seconds after each fire time of another trigger"""
+
+    def __init__(self, trigger, offset):
+        self.trigger = trigger
+        self.offset = timedelta(seconds=offset)
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        previous = previous_fire_time - self.offset if previous_fire_time else None
+        next_fire_time = self.trigger.get_next_fire_time(previous, now - self.offset)
+        return next_fire_time + self.offset if next_fire_time else None
+
+    def __str__(self):
+        return f"{self.trigger} +{int(self.offset.total_seconds())}s"
+
+
+def run_schedule(cron, slot=0, slots=1):
+    """
+    Check the websites of every user with this schedule in one shared pipeline
+
+    Each distinct URL is fetched and extracted once no matter how many users watch
+    it, and every website's result is reported through its owner's notification
+    settings. The global check's schedule also covers websites whose owners don't
+    use it, reported to the global Telegram chat as the global check always has.
+    With load spreading on, each run only covers the users hashed to its slot.
+
+    Args:
+        cron: Cron expression shared by the users to check
+        slot: Load-spreading slot this run covers
+        slots: Total number of slots the schedule is spread over
+    """
+    # Create fresh application context for this job
+    with app.app_context():
+        try:
+            # Import models within the function to avoid circular imports
+            from models import Website, User
+            from monitor import WebsiteMonitor
+
+            # Match spellings that only differ in spacing, as the job ID does
+            cron = normalize_cron(cron)
+            users = User.query.filter(
+                User.is_active.is_(True),
+                or_(*(func.regexp_replace(func.btrim(column), r'\s+', ' ', 'g') == cron
+                      for column in (User.schedule_1, User.schedule_2, User.schedule_3, User.schedule_4)))
+            ).all()
+            is_global = cron == GLOBAL_CHECK_CRON
+            if not users and not is_global:
+                # Left for the next leader takeover to prune: removing the job here
+                # could race with a user saving this schedule right now
+                logger.info(f"No users left on schedule '{cron}', nothing to check")
+                return
+
+            users = [user for user in users if user_slot(user.id, slots) == slot]
+            monitors_by_user = {user.id: create_user_monitor(user) for user in users}
+            if is_global:
+                # For the global check we don't enable email notifications
+                default_monitor = WebsiteMonitor(
+                    telegram_bot_token=app.config["TELEGRAM_BOT_TOKEN"],
+                    telegram_chat_id=app.config["TELEGRAM_CHAT_ID"],
+                    email_notifications_enabled=False,
+                    notification_email=None
+                )
+                if slots > 1:
+                    owner_ids = [user_id for user_id, in db.session.query(User.id) if user_slot(user_id, slots) == slot]
+                    websites = Website.query.filter(Website.user_id.in_(owner_ids)).all() if owner_ids else []
+                else:
+                    websites = Website.query.all()
+            elif monitors_by_user:
+                default_monitor = next(iter(monitors_by_user.values()))
+                websites = Website.query.filter(Website.user_id.in_(list(monitors_by_user))).all()
+            else:
+                return
+
+            if app.config["CHECK_QUEUE_ENABLED"]:
+                # Hand the checks to the worker processes
+                from check_queue import enqueue_checks
+                enqueue_checks([website.id for website in websites if website.user_id in monitors_by_user])
+                enqueue_checks([website.id for website in websites if website.user_id not in monitors_by_user],
+                               notify='global')
+                return
+
+            monitors = {
+                website.id: monitors_by_user.get(website.user_id, default_monitor)
+                for website in websites
+            }
+            logger.info(f"Checking {len(websites)} websites for {len(users)} users on schedule '{cron}'"
+                        f"{f' (slot {slot + 1}/{slots})' if slots > 1 else ''}{' (global check)' if is_global else ''}")
+
+            # Fetch all websites concurrently, then record each result
+            default_monitor.check_websites(websites, monitors=monitors)
+
+        except Exception as e:
+            logger.error(f"Error in scheduled website check for '{cron}': {str(e)}")
+        finally:
+            # Make sure everything is properly cleaned up
+            db.session.remove()
+
+
+def prune_check_history():
+    """Maintenance job: delete check records beyond the retention limit"""
+    try:
+        from db_utils import run_check_retention
+        run_check_retention()
+    except Exception as e:
+        logger.error(f"Error in check retention job: {str(e)}")
+
+
+def normalize_cron(cron):
+    """Canonical spelling of a cron expression: fields separated by single spaces"""
+    return ' '.join(cron.split())
+
+
+def schedule_job_id(cron, slot=0, step=0):
+    """ID of the job shared by everyone on a cron expression (and load-spreading slot)"""
+    job_id = f"schedule_{normalize_cron(cron).replace(' ', '_')}"
+    return f"{job_id}@{slot * step}" if slot else job_id
+
+
+def add_schedule_job(scheduler, cron):
+    """
+    Add the shared jobs for a cron expression unless they already exist
+
+    There is one job per load-spreading slot, each offset by its slot's share of
+    SCHEDULE_JITTER_WINDOW (a single unshifted job when spreading is off).
+
+    Args:
+        scheduler: APScheduler scheduler
+        cron: Cron expression (minute hour day month day_of_week)
+
+    Returns:
+        bool: True if the expression is valid and has its jobs
+    """
+    cron = normalize_cron(cron)
+    slots, step = jitter_slots()
+    if all(scheduler.get_job(schedule_job_id(cron, slot, step)) for slot in range(slots)):
+        return True
+
+    # Parse cron expression
+    parts = cron.split()
+    if len(parts) != 5:  # must have 5 parts: minute, hour, day, month, day_of_week
+        logger.error(f"Invalid cron expression: {cron}")
+        return False
+
+    minute, hour, day, month, day_of_week = parts
+    try:
+        for slot in range(slots):
+            trigger = CronTrigger(
+                minute=minute,
+                hour=hour,
+                day=day,
+                month=month,
+                day_of_week=day_of_week,
+                timezone=SCHEDULER_TIMEZONE  # Explicitly use the scheduler timezone
+            )
+            scheduler.add_job(
+                run_schedule,
+                OffsetTrigger(trigger, slot * step) if slot else trigger,
+                kwargs={'cron': cron, 'slot': slot, 'slots': slots},
+                id=schedule_job_id(cron, slot, step),
+                name=f'Schedule {cron}' + (f' +{slot * step}s' if slot else ''),
+                replace_existing=True
+            )
+    except Exception as e:
+        logger.error(f"Error setting up schedule '{cron}': {str(e)}")
+        return False
+    logger.info(f"Added schedule job{'s' if slots > 1 else ''} for '{cron}'")
+    return True
+
+
+def user_schedules(user):
+    """A user's distinct, non-empty cron expressions (normalized)"""
+    schedules = [user.schedule_1, user.schedule_2, user.schedule_3, user.schedule_4]
+    return list(dict.fromkeys(normalize_cron(schedule) for schedule in schedules if schedule and schedule.strip()))
+
+
+def sync_user_jobs(scheduler, user_id):
+    """
+    Make sure every schedule a user has saved has a job
+
+    Only the user's own schedules are looked at. Jobs for schedules nobody uses
+    any more are pruned when a leader takes over (see add_distinct_schedule_jobs).
+
+    Args:
+        scheduler: Running APScheduler scheduler
+        user_id: ID of the user whose settings changed
+    """
+    with app.app_context():
+        try:
+            from models import User
+
+            user = User.query.get(user_id)
+            if user and user.is_active:
+                for cron in user_schedules(user):
+                    add_schedule_job(scheduler, cron)
+        except Exception as e:
+            logger.error(f"Error syncing schedules for user {user_id}: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+def notify_schedule_change(user_id):
+    """
+    Ask the leading scheduler to re-sync a user's jobs
+
+    The notification is sent in the current database transaction, so it is only
+    delivered if the change commits: call this before db.session.commit().
+
+    Args:
+        user_id: ID of the user whose schedules changed
+    """
+    db.session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                       {"channel": SCHEDULE_CHANGES_CHANNEL, "payload": str(user_id)})
+
+
+def create_job_store():
+    """Job store keeping the scheduler's jobs in the application database"""
+    with app.app_context():
+        return SQLAlchemyJobStore(engine=db.engine, tablename=app.config["SCHEDULER_JOBS_TABLE"])
+
+
+def create_scheduler():
+    """
+    Build the scheduler on the persistent job store (not started, see start_scheduler)
+
+    Returns:
+        BackgroundScheduler
+    """
+    logger.info(f"Initializing scheduler with timezone: {SCHEDULER_TIMEZONE} (US Pacific Time)")
+
+    # Configure scheduler with timezone and job defaults
+    return BackgroundScheduler(
+        timezone=SCHEDULER_TIMEZONE,
+        jobstores={'default': create_job_store()},
+        job_defaults={
+            'coalesce': True,       # Combine multiple waiting instances
+            'max_instances': 1,     # Only allow one instance to run at a time
+            'misfire_grace_time': app.config["SCHEDULER_MISFIRE_GRACE_TIME"]
+        }
+    )
+
+
+def add_distinct_schedule_jobs(scheduler):
+    """
+    Add a job for every distinct schedule in use (one query over the users table)
+
+    Jobs of schedules nobody uses any more are removed. This runs on the leader's
+    thread, like sync_user_jobs, so it can't remove a job a notified settings
+    change has just added; a schedule saved after the query is re-added when its
+    notification is handled.
+    """
+    # The global check (for backward compatibility) shares the default schedule's job
+    add_schedule_job(scheduler, GLOBAL_CHECK_CRON)
+
+    with app.app_context():
+        try:
+            schedules = db.session.execute(text("""
+                SELECT DISTINCT schedule FROM (
+                    SELECT schedule_1 AS schedule FROM users WHERE is_active
+                    UNION ALL SELECT schedule_2 FROM users WHERE is_active
+                    UNION ALL SELECT schedule_3 FROM users WHERE is_active
+                    UNION ALL SELECT schedule_4 FROM users WHERE is_active
+                ) schedules
+                WHERE schedule IS NOT NULL AND schedule <> ''
+            """)).scalars().all()
+            # Spellings that only differ in spacing share one job
+            schedules = list(dict.fromkeys(normalize_cron(cron) for cron in schedules if cron.strip()))
+            logger.info(f"Setting up {len(schedules)} distinct user schedules")
+            for cron in schedules:
+                add_schedule_job(scheduler, cron)
+
+            in_use = set(schedules) | {GLOBAL_CHECK_CRON}
+            unused = [job for job in scheduler.get_jobs()
+                      if 'cron' in job.kwargs and normalize_cron(job.kwargs['cron']) not in in_use]
+            for job in unused:
+                job.remove()
+            if unused:
+                logger.info(f"Removed {len(unused)} jobs of schedules nobody uses")
+        except Exception as e:
+            logger.error(f"Error setting up user schedules: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+def has_stale_schedule_jobs(jobs, slots, step):
+    """
+    Whether stored schedule jobs were built for different load-spreading settings
+
+    A changed SCHEDULE_JITTER_STEP keeps the slot count but moves every offset,
+    which is part of the job ID, so the IDs are compared as well.
+    """
+    return any(
+        job.kwargs.get('slots', 1) != slots
+        or job.id != schedule_job_id(job.kwargs['cron'], job.kwargs.get('slot', 0), step)
+        for job in jobs
+    )
+
+
+def start_scheduler(scheduler, rebuild=False):
+    """
+    Start the scheduler, resuming the jobs kept in the job store
+
+    Stored schedule jobs are only replaced when SCHEDULE_JITTER_WINDOW or
+    SCHEDULE_JITTER_STEP changed since they were stored or when a rebuild is
+    requested. Runs missed while no scheduler was leading fire once (coalesced)
+    on resume if they are within
+    SCHEDULER_MISFIRE_GRACE_TIME. After resuming, every schedule in the users
+    table gets its jobs: settings saved while no leader was listening for their
+    NOTIFY would otherwise never get one.
+
+    Args:
+        scheduler: Scheduler from create_scheduler
+        rebuild: Replace all stored schedule jobs
+    """
+    # Start paused so stored jobs can be inspected before any of them fires
+    scheduler.start(paused=True)
+
+    slots, step = jitter_slots()
+    schedule_jobs = [job for job in scheduler.get_jobs() if 'cron' in job.kwargs]
+    stale = has_stale_schedule_jobs(schedule_jobs, slots, step)
+    if rebuild or stale:
+        logger.info(f"Rebuilding schedule jobs ({'rebuild requested' if rebuild else 'load spreading changed'})")
+        for job in schedule_jobs:
+            job.remove()
+    else:
+        logger.info(f"Resuming {len(schedule_jobs)} stored schedule jobs")
+
+    # Retention runs on its own schedule instead of after every check
+    try:
+        minute, hour, day, month, day_of_week = app.config["CHECK_RETENTION_CRON"].split()
+        trigger = CronTrigger(
+            minute=minute,
+            hour=hour,
+            day=day,
+            month=month,
+            day_of_week=day_of_week,
+            timezone=SCHEDULER_TIMEZONE
+        )
+        job = scheduler.get_job('check_retention')
+        # Keep the stored job (and its misfire state) unless CHECK_RETENTION_CRON changed
+        if job is None or str(job.trigger) != str(trigger):
+            scheduler.add_job(
+                prune_check_history,
+                trigger,
+                id='check_retention',
+                name='Check History Retention',
+                replace_existing=True
+            )
+    except Exception as e:
+        logger.error(f"Invalid CHECK_RETENTION_CRON '{app.config['CHECK_RETENTION_CRON']}': {str(e)}")
+
+    scheduler.resume()
+
+    # Adds only the jobs that are missing, so this is cheap when nothing changed
+    add_distinct_schedule_jobs(scheduler)
+
+
+def get_stored_jobs():
+    """
+    Jobs in the persistent job store, readable from any process
+
+    Reads the job store's table with a plain query: SQLAlchemyJobStore deletes
+    every job it fails to unpickle, which a process whose imports differ from the
+    scheduler's would do to all of them.
+
+    Returns:
+        list: dicts with each job's 'id' and 'next_run_time' (None when paused)
+    """
+    table = db.engine.dialect.identifier_preparer.quote(app.config["SCHEDULER_JOBS_TABLE"])
+    rows = db.session.execute(text(f"SELECT id, next_run_time FROM {table} ORDER BY next_run_time, id")).fetchall()
+    return [
+        {
+            'id': job_id,
+            'next_run_time': datetime.fromtimestamp(next_run_time, SCHEDULER_TIMEZONE) if next_run_time is not None else None
+        }
+        for job_id, next_run_time in rows
+    ]
+
+
+def _lock_keys(lock_id):
+    """How pg_locks reports a single bigint advisory lock key: (classid, objid)"""
+    return (lock_id >> 32) & 0xFFFFFFFF, lock_id & 0xFFFFFFFF
+
+
+class SchedulerLeaderLock:
+    """Session-level PostgreSQL advisory lock held on a dedicated connection"""
+
+    def __init__(self, engine, lock_id):
+        self.engine = engine
+        self.lock_id = lock_id
+        self.conn = None
+
+    def acquire(self):
+        """
+        Try to take the lock without waiting
+
+        Returns:
+            bool: True if this process is now the leader
+        """
+        conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            # Shows which host/process leads in pg_stat_activity (and /debug/scheduler)
+            conn.execute(text("SELECT set_config('application_name', :name, false)"),
+                         {"name": f"webwatchdog-scheduler {socket.gethostname()}:{os.getpid()}"})
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:lock_id)"),
+                                    {"lock_id": self.lock_id}).scalar()
+        except Exception:
+            self._discard(conn)
+            raise
+        if not acquired:
+            self._discard(conn)
+            return False
+        self.conn = conn
+        return True
+
+    def listen(self, channel):
+        """Subscribe the lock connection to a NOTIFY channel"""
+        self.conn.execute(text(f"LISTEN {channel}"))
+
+    def poll_notifications(self, timeout):
+        """
+        Wait up to timeout seconds for notifications on the lock connection
+
+        Returns:
+            list: Payloads received, oldest first
+        """
+        dbapi_conn = self.conn.connection.dbapi_connection
+        if select.select([dbapi_conn], [], [], timeout) != ([], [], []):
+            dbapi_conn.poll()
+        payloads = []
+        while dbapi_conn.notifies:
+            payloads.append(dbapi_conn.notifies.pop(0).payload)
+        return payloads
+
+    def is_held(self):
+        """Confirm the lock's session is still alive and still holds the lock"""
+        if self.conn is None:
+            return False
+        classid, objid = _lock_keys(self.lock_id)
+        try:
+            return self.conn.execute(text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_locks
+                    WHERE locktype = 'advisory' AND pid = pg_backend_pid() AND granted
+                    AND classid = :classid AND objid = :objid AND objsubid = 1
+                )
+            """), {"classid": classid, "objid": objid}).scalar()
+        except Exception as e:
+            logger.error(f"Scheduler leader lock connection failed: {str(e)}")
+            return False
+
+    def release(self):
+        """Give up the lock by closing its session"""
+        if self.conn is not None:
+            self._discard(self.conn)
+            self.conn = None
+
+    def _discard(self, conn):
+        # Invalidate rather than return the connection to the pool, so the
+        # session (and any lock it holds) ends here
+        try:
+            conn.invalidate()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error closing scheduler lock connection: {str(e)}")
+
+
+class SchedulerService:
+    """
+    Leader-elected scheduler: runs the jobs only while holding the advisory lock
+    """
+
+    def __init__(self, lock_id=None, poll_interval=None, rebuild=False):
+        self.lock_id = lock_id or app.config["SCHEDULER_LOCK_ID"]
+        # Rebuild the stored schedule jobs when this process first becomes leader
+        self.rebuild = rebuild
+        self.poll_interval = poll_interval or app.config["SCHEDULER_LEADER_POLL_INTERVAL"]
+        self.scheduler = None
+        self._stop = threading.Event()
+        self._thread = None
+        with app.app_context():
+            self.lock = SchedulerLeaderLock(db.engine, self.lock_id)
+
+    @property
+    def is_leader(self):
+        return self.scheduler is not None
+
+    def run(self):
+        """Campaign for leadership until stopped (blocking)"""
+        logger.info(f"Scheduler on standby, waiting for leader lock {self.lock_id}")
+        while not self._stop.is_set():
+            try:
+                acquired = self.lock.acquire()
+            except Exception as e:
+                logger.error(f"Error acquiring scheduler leader lock: {str(e)}")
+                acquired = False
+
+            if acquired:
+                self._lead()
+            else:
+                self._stop.wait(self.poll_interval)
+        logger.info("Scheduler stopped")
+
+    def start(self):
+        """Run the election loop in a background thread"""
+        self._thread = threading.Thread(target=self.run, name="scheduler-leader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop campaigning; a leader finishes running jobs and releases the lock"""
+        self._stop.set()
+
+    def _lead(self):
+        logger.info(f"Acquired scheduler leader lock {self.lock_id}, starting jobs")
+        try:
+            # Listen before loading the jobs so no change made in between is missed
+            self.lock.listen(SCHEDULE_CHANGES_CHANNEL)
+            self.scheduler = create_scheduler()
+            start_scheduler(self.scheduler, rebuild=self.rebuild)
+            self.rebuild = False
+            logger.info("Scheduler started successfully with global and user-specific website checks")
+
+            next_health_check = time.monotonic() + self.poll_interval
+            while not self._stop.is_set():
+                try:
+                    changed_user_ids = self.lock.poll_notifications(1)
+                except Exception as e:
+                    logger.error(f"Error reading schedule notifications: {str(e)}")
+                    changed_user_ids = []
+                    next_health_check = 0
+                # Several saves in a row only need one sync
+                for user_id in dict.fromkeys(changed_user_ids):
+                    sync_user_jobs(self.scheduler, user_id)
+
+                if time.monotonic() >= next_health_check:
+                    if not self.lock.is_held():
+                        # Another process may already be leading; stop firing jobs at once
+                        logger.error("Lost scheduler leader lock, returning to standby")
+                        self.scheduler.shutdown(wait=False)
+                        return
+                    next_health_check = time.monotonic() + self.poll_interval
+            # Clean shutdown: let running checks finish before handing over
+            self.scheduler.shutdown(wait=True)
+        except Exception as e:
+            logger.error(f"Scheduler error while leading: {str(e)}")
+            if self.scheduler is not None and self.scheduler.running:
+                self.scheduler.shutdown(wait=False)
+        finally:
+            self.scheduler = None
+            self.lock.release()
+
+
+def get_scheduler_leader(lock_id=None):
+    """
+    Describe the process currently holding the scheduler leader lock
+
+    Returns:
+        dict or None if no scheduler is leading
+    """
+    classid, objid = _lock_keys(lock_id or app.config["SCHEDULER_LOCK_ID"])
+    row = db.session.execute(text("""
+        SELECT a.pid, a.application_name, a.client_addr, a.backend_start
+        FROM pg_locks l
+        JOIN pg_stat_activity a ON a.pid = l.pid
+        WHERE l.locktype = 'advisory' AND l.granted
+        AND l.classid = :classid AND l.objid = :objid AND l.objsubid = 1
+    """), {"classid": classid, "objid": objid}).fetchone()
+    if row is None:
+        return None
+    return {
+        'pid': row[0],
+        'application_name': row[1],
+        'client_addr': str(row[2]) if row[2] else None,
+        'leader_since': str(row[3])
+    }
+
+
+def main():
+    """Entry point for the standalone scheduler process"""
+    parser = argparse.ArgumentParser(description="WebWatchDog check scheduler")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Rebuild the stored schedule jobs from the users table on becoming leader")
+    args = parser.parse_args()
+
+    service = SchedulerService(rebuild=args.rebuild)
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping scheduler")
+        service.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    service.run()
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    # Run from the imported module rather than __main__, so jobs and triggers are
+    # stored under the "scheduler" name that every other process can load
+    import scheduler
+    scheduler.main()
@@ -0,0 +1,286 @@
+"""
+Snapshot Store Module for WebWatchDog
+Content-addressed storage of extracted page text
+
+Each distinct version of a page's extracted text is compressed (zstd when the
+zstandard package is installed, zlib otherwise) and stored once, keyed by its
+content hash, no matter how many checks, websites or users reference it. The
+content_snapshots table tracks how many retained Check rows reference each
+snapshot; check writes increment the count, retention decrements it, and
+collect_snapshot_garbage() removes snapshots nothing references any more.
+
+Two backends are available (SNAPSHOT_BACKEND):
+- database: compressed bytes in content_snapshots.data (bytea)
+- filesystem: compressed files under SNAPSHOT_DIR, content_snapshots holds the metadata
+"""
+
+import logging
+import os
+import tempfile
+import zlib
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from models import ContentSnapshot
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+_snapshot_table = ContentSnapshot.__table__
+
+
+def compress_text(content, level=None):
+    """
+    Compress extracted text with the best available codec
+
+    Returns:
+        tuple: (codec name, compressed bytes)
+    """
+    data = content.encode('utf-8')
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=level or 10).compress(data)
+    return 'zlib', zlib.compress(data, level or 6)
+
+
+def decompress_text(codec, data):
+    """Inverse of compress_text"""
+    if codec == 'zstd':
+        if zstandard is None:
+            raise Exception("zstandard package is required to read zstd snapshots")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    if codec == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+    raise Exception(f"Unknown snapshot codec: {codec}")
+
+
+class SnapshotStore:
+    """Base store: reference counting in content_snapshots, data storage left to subclasses"""
+
+    def __init__(self, compression_level=None):
+        self.compression_level = compression_level
+
+    def add_references(self, conn, contents, refs):
+        """
+        Record new references to snapshots, storing any versions not seen before
+
+        Runs inside the caller's transaction so counts move with the Check rows.
+
+        Args:
+            conn: Connection in the check-writing transaction
+            contents: Dict of content hash -> extracted text, for versions that may be new
+            refs: Dict of content hash -> number of new Check rows referencing it
+        """
+        if not refs:
+            return
+        refs = dict(refs)
+
+        # Lock the snapshots we reference (in a fixed order, so writers can't deadlock)
+        # until commit: garbage collection can't delete one between this check and
+        # the ref_count update below
+        existing = {row[0] for row in conn.execute(text(
+            "SELECT content_hash FROM content_snapshots WHERE content_hash = ANY(:hashes) "
+            "ORDER BY content_hash FOR UPDATE"
+        ), {"hashes": sorted(refs)})}
+        candidates = [content_hash for content_hash in contents if content_hash in refs]
+
+        new_rows = []
+        for content_hash in candidates:
+            if content_hash in existing:
+                continue
+            codec, blob = compress_text(contents[content_hash], self.compression_level)
+            new_rows.append({
+                'content_hash': content_hash,
+                'codec': codec,
+                'data': self.store_data(content_hash, codec, blob),
+                'original_size': len(contents[content_hash].encode('utf-8')),
+                'compressed_size': len(blob),
+                'ref_count': refs.pop(content_hash),
+            })
+
+        if new_rows:
+            # Another writer may have stored the same version meanwhile; just add our references
+            stmt = insert(_snapshot_table)
+            conn.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=['content_hash'],
+                    set_={'ref_count': _snapshot_table.c.ref_count + stmt.excluded.ref_count}
+                ),
+                new_rows
+            )
+
+        # References to versions we have no text for (stored earlier, or never stored)
+        if refs:
+            conn.execute(text(
+                "UPDATE content_snapshots SET ref_count = ref_count + :refs WHERE content_hash = :content_hash"
+            ), [{"content_hash": content_hash, "refs": count} for content_hash, count in refs.items()])
+
+    def get(self, conn, content_hash):
+        """
+        Load the extracted text of a snapshot
+
+        Returns:
+            str or None if no snapshot exists for the hash
+        """
+        row = conn.execute(text(
+            "SELECT codec, data FROM content_snapshots WHERE content_hash = :content_hash"
+        ), {"content_hash": content_hash}).fetchone()
+        if row is None:
+            return None
+        blob = row[1] if row[1] is not None else self.load_data(content_hash, row[0])
+        if blob is None:
+            return None
+        return decompress_text(row[0], bytes(blob))
+
+    def store_data(self, content_hash, codec, blob):
+        """Store compressed bytes; returns the value for content_snapshots.data"""
+        raise NotImplementedError
+
+    def load_data(self, content_hash, codec):
+        """Load compressed bytes not held in content_snapshots.data"""
+        return None
+
+    def remove_data(self, content_hash, codec):
+        """Delete stored bytes once a snapshot is garbage collected"""
+
+
+class DatabaseSnapshotStore(SnapshotStore):
+    """Keeps compressed snapshots in the content_snapshots.data bytea column"""
+
+    def store_data(self, content_hash, codec, blob):
+        return blob
+
+
+class FilesystemSnapshotStore(SnapshotStore):
+    """Keeps compressed snapshots as files under a directory, fanned out by hash prefix"""
+
+    def __init__(self, root, compression_level=None):
+        super().__init__(compression_level)
+        self.root = root
+
+    def path_for(self, content_hash, codec):
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], f"{content_hash}.{codec}")
+
+    def store_data(self, content_hash, codec, blob):
+        path = self.path_for(content_hash, codec)
+        # Always (re)write: only a new content_snapshots row gets here, and a file
+        # already at the path belongs to a snapshot that was collected
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial snapshot
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        return None
+
+    def load_data(self, content_hash, codec):
+        try:
+            with open(self.path_for(content_hash, codec), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            logger.warning(f"Snapshot file missing for {content_hash}")
+            return None
+
+    def remove_data(self, content_hash, codec):
+        try:
+            os.remove(self.path_for(content_hash, codec))
+        except FileNotFoundError:
+            pass
+
+
+def get_snapshot_store(config):
+    """
+    Build the snapshot store selected by SNAPSHOT_BACKEND
+
+    Args:
+        config: Flask app config
+
+    Returns:
+        SnapshotStore or None when snapshots are disabled
+    """
+    backend = config.get("SNAPSHOT_BACKEND", "database")
+    level = config.get("SNAPSHOT_COMPRESSION_LEVEL") or None
+    if backend == "database":
+        return DatabaseSnapshotStore(level)
+    if backend == "filesystem":
+        return FilesystemSnapshotStore(config.get("SNAPSHOT_DIR", "snapshots"), level)
+    if backend not in ("none", ""):
+        logger.error(f"Unknown SNAPSHOT_BACKEND '{backend}', snapshots disabled")
+    return None
+
+
+def release_website_snapshots(conn, website_id):
+    """Drop the references held by a website's checks (call before deleting the website)"""
+    conn.execute(text("""
+        UPDATE content_snapshots
+        SET ref_count = content_snapshots.ref_count - released.refs
+        FROM (
+            SELECT content_hash, COUNT(*) AS refs
+            FROM checks
+            WHERE website_id = :website_id AND content_hash IS NOT NULL
+            GROUP BY content_hash
+        ) released
+        WHERE content_snapshots.content_hash = released.content_hash
+    """), {"website_id": str(website_id)})
+
+
+def collect_snapshot_garbage(engine, store, reconcile=False):
+    """
+    Delete snapshots no retained check references
+
+    Args:
+        engine: SQLAlchemy engine
+        store: SnapshotStore used to remove externally stored data (may be None)
+        reconcile: Recompute every ref_count from the checks table first (full scan)
+
+    Returns:
+        int: Number of snapshots removed
+    """
+    with engine.begin() as conn:
+        if reconcile:
+            conn.execute(text("""
+                UPDATE content_snapshots
+                SET ref_count = COALESCE(counts.refs, 0)
+                FROM content_snapshots snapshot
+                LEFT JOIN (
+                    SELECT content_hash, COUNT(*) AS refs
+                    FROM checks
+                    WHERE content_hash IS NOT NULL
+                    GROUP BY content_hash
+                ) counts ON counts.content_hash = snapshot.content_hash
+                WHERE content_snapshots.content_hash = snapshot.content_hash
+                AND content_snapshots.ref_count IS DISTINCT FROM COALESCE(counts.refs, 0)
+            """))
+        # Snapshots locked by a check writer are about to gain a reference; skip them
+        # and re-check the count on the locked rows
+        removed = conn.execute(text("""
+            DELETE FROM content_snapshots
+            WHERE content_hash IN (
+                SELECT content_hash FROM content_snapshots
+                WHERE ref_count <= 0
+                FOR UPDATE SKIP LOCKED
+            )
+            AND ref_count <= 0
+            RETURNING content_hash, codec
+        """)).fetchall()
+
+        # Remove files while the deleted rows are still locked: a check writer storing
+        # the same version again blocks on them (its FOR UPDATE or its INSERT) until
+        # commit, so it writes its file only after this one is gone
+        if store is not None:
+            for content_hash, codec in removed:
+                try:
+                    store.remove_data(content_hash, codec)
+                except Exception as e:
+                    logger.error(f"Error removing snapshot data for {content_hash}: {str(e)}")
+
+    logger.info(f"Snapshot garbage collection removed {len(removed)} snapshots")
+    return len(removed)
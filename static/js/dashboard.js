@@ -414,13 +414,28 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Function to create a new website card with animation
-    function createNewWebsiteCard(website) {
+    // Cards for newly added websites are prepended; cards loaded from later pages
+    // of /api/websites are appended with their stored state
+    function createNewWebsiteCard(website, append = false) {
         const dashboardContainer = document.querySelector('.website-cards-container');
         if (!dashboardContainer) {
             console.error("Dashboard container not found");
             return;
         }
         
+        const hasChanged = website.last_check_status === 'changed';
+        const lastCheckedText = website.last_checked ? (append ? formatDate(website.last_checked) : 'Just now') : 'Never';
+        const lastChangeHtml = website.last_change_time ? `
+                            <div class="text-muted">
+                                Last changes: <span class="timestamp" data-utc='${JSON.stringify({utc: website.last_change_time})}'>
+                                    ${formatDate(website.last_change_time)}
+                                </span>
+                            </div>` : '';
+        let statusHtml = website.status || 'pending';
+        if (website.status === 'success') {
+            statusHtml = hasChanged ? '<i data-feather="alert-circle"></i>' : '<i data-feather="check-circle"></i>';
+        }
+        
         // Create column wrapper (matches dashboard.html structure)
         const colWrapper = document.createElement('div');
         colWrapper.className = 'col-12 mb-2';
@@ -434,25 +449,27 @@ document.addEventListener('DOMContentLoaded', function() {
                     <div class="website-info">
                         <div class="d-flex align-items-center mb-2 mb-md-0">
                             <span class="status-badge status-${website.status || 'pending'} me-2">
-                                ${website.status === 'success' ? '<i data-feather="check-circle"></i>' : website.status || 'pending'}
+                                ${statusHtml}
                             </span>
                             <h5 class="card-title text-truncate mb-0 me-2">${website.url.replace('https://', '')}</h5>
+                            ${hasChanged ? '<span class="change-detected d-none d-md-inline-flex">Changes detected</span>' : ''}
                         </div>
+                        ${hasChanged ? '<div class="change-detected d-block d-md-none">Changes detected</div>' : ''}
                         <div class="timestamps d-block d-md-none small">
                             <div class="text-muted">
                                 Last checked: <span class="timestamp" data-utc='${JSON.stringify({utc: website.last_checked || null})}'>
-                                    ${website.last_checked ? 'Just now' : 'Never'}
+                                    ${lastCheckedText}
                                 </span>
-                            </div>
+                            </div>${lastChangeHtml}
                         </div>
                     </div>
                     <div class="d-flex align-items-start">
                         <div class="timestamps text-end me-3 d-none d-md-block">
                             <div class="text-muted">
                                 Last checked: <span class="timestamp" data-utc='${JSON.stringify({utc: website.last_checked || null})}'>
-                                    ${website.last_checked ? 'Just now' : 'Never'}
+                                    ${lastCheckedText}
                                 </span>
-                            </div>
+                            </div>${lastChangeHtml}
                         </div>
                         <div class="card-actions">
                             <a href="${website.url}" target="_blank" class="btn btn-sm btn-secondary">
@@ -477,8 +494,12 @@ document.addEventListener('DOMContentLoaded', function() {
         colWrapper.style.opacity = '0';
         colWrapper.style.transform = 'translateY(20px)';
         
-        // Add to DOM at the beginning of the list
-        dashboardContainer.prepend(colWrapper);
+        // Add to DOM at the beginning of the list (or the end for paginated cards)
+        if (append) {
+            dashboardContainer.appendChild(colWrapper);
+        } else {
+            dashboardContainer.prepend(colWrapper);
+        }
         
         // Initialize feather icons
         feather.replace();
@@ -672,6 +693,57 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Load further pages of websites as the user scrolls to the end of the list
+    const websiteListSentinel = document.getElementById('websiteListSentinel');
+    if (websiteListSentinel && websiteListSentinel.dataset.nextCursor && 'IntersectionObserver' in window) {
+        let loadingPage = false;
+        
+        const loadNextPage = async function() {
+            const cursor = websiteListSentinel.dataset.nextCursor;
+            if (loadingPage || !cursor) return;
+            loadingPage = true;
+            
+            try {
+                const params = new URLSearchParams({
+                    cursor: cursor,
+                    limit: websiteListSentinel.dataset.pageSize || '50'
+                });
+                const response = await fetch(`/api/websites?${params}`);
+                if (!response.ok) {
+                    const errorData = await response.json();
+                    showToast(errorData.error || 'Failed to load more websites', 'error');
+                    return;
+                }
+                
+                const data = await response.json();
+                // Websites added on this page since it loaded may sort after the cursor;
+                // they already have a card, so don't render them twice
+                (data.websites || [])
+                    .filter(website => !document.querySelector(`.website-card .check-website[data-website-id="${website.id}"]`))
+                    .forEach(website => createNewWebsiteCard(website, true));
+                websiteListSentinel.dataset.nextCursor = data.next_cursor || '';
+                
+                if (!data.next_cursor) {
+                    websiteObserver.disconnect();
+                } else if (websiteListSentinel.getBoundingClientRect().top < window.innerHeight + 400) {
+                    // Still in view (short page), so the observer won't fire again on its own
+                    setTimeout(loadNextPage, 0);
+                }
+            } catch (error) {
+                showToast('Failed to load more websites', 'error');
+            } finally {
+                loadingPage = false;
+            }
+        };
+        
+        const websiteObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
+            }
+        }, { rootMargin: '400px' });
+        websiteObserver.observe(websiteListSentinel);
+    }
+
     // Handle Check All functionality with visual feedback
     const checkAllButton = document.getElementById('checkAllWebsites');
     if (checkAllButton) {
@@ -706,7 +778,10 @@ document.addEventListener('DOMContentLoaded', function() {
                     const data = await response.json();
                     
                     // Update each website card with new data
-                    if (data.websites && Array.isArray(data.websites)) {
+                    if (data.queued !== undefined) {
+                        // Checks were queued for the workers rather than run in the request
+                        showToast(data.message, 'info');
+                    } else if (data.websites && Array.isArray(data.websites)) {
                         // Update each website's status with staggered animations
                         data.websites.forEach((websiteData, index) => {
                             // Add sequential timing to updates for visual effect
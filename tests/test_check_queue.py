@@ -0,0 +1,132 @@
+import os
+import unittest
+import uuid
+
+# Importing the app connects to (and migrates) the database in DATABASE_URL
+if not os.environ.get("DATABASE_URL"):
+    raise unittest.SkipTest("needs a disposable PostgreSQL database in DATABASE_URL")
+
+from sqlalchemy import text  # noqa: E402
+
+from app import app, db  # noqa: E402
+from check_queue import (ack_check_tasks, claim_check_tasks, drop_exhausted_check_tasks, enqueue_checks,  # noqa: E402
+                         retry_check_tasks)
+from models import User, Website  # noqa: E402
+
+
+class CheckQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+
+        name = uuid.uuid4().hex[:12]
+        user = User(email=f"{name}@example.com", username=name)
+        db.session.add(user)
+        db.session.flush()
+        self.websites = [Website(url=f"https://{name}-{i}.example.com", user_id=user.id) for i in range(3)]
+        db.session.add_all(self.websites)
+        db.session.commit()
+        self.website_ids = [website.id for website in self.websites]
+        self.addCleanup(self.delete_user, user.id)
+
+    def delete_user(self, user_id):
+        db.session.rollback()
+        with db.engine.begin() as conn:
+            conn.execute(text("DELETE FROM websites WHERE user_id = :user_id"), {"user_id": str(user_id)})
+            conn.execute(text("DELETE FROM users WHERE id = :user_id"), {"user_id": str(user_id)})
+
+    def claim(self):
+        return [task for task in claim_check_tasks("test-worker", 1000) if task.website_id in self.website_ids]
+
+    def task(self, website_id):
+        with db.engine.connect() as conn:
+            return conn.execute(text("SELECT notify, use_cache, attempts, claimed_by, available_at <= NOW() "
+                                     "FROM check_tasks WHERE website_id = :website_id"),
+                                {"website_id": str(website_id)}).fetchone()
+
+    def test_claim_and_ack(self):
+        self.assertEqual(enqueue_checks(self.website_ids), 3)
+        tasks = self.claim()
+        self.assertEqual({task.website_id for task in tasks}, set(self.website_ids))
+        self.assertTrue(all(task.attempts == 1 for task in tasks))
+
+        # Claimed tasks aren't handed out again
+        self.assertEqual(self.claim(), [])
+
+        ack_check_tasks(tasks)
+        self.assertTrue(all(self.task(website_id) is None for website_id in self.website_ids))
+
+    def test_queued_task_is_merged(self):
+        website_id = self.website_ids[0]
+        enqueue_checks([website_id], notify='global')
+        enqueue_checks([website_id, website_id], notify='owner', use_cache=False)
+        self.assertEqual(self.task(website_id)[:2], ('owner', False))
+
+        tasks = self.claim()
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual((tasks[0].notify, tasks[0].use_cache), ('owner', False))
+
+    def test_request_merged_while_running_runs_again(self):
+        website_id = self.website_ids[0]
+        enqueue_checks([website_id], notify='global')
+        task, = self.claim()
+
+        enqueue_checks([website_id], notify='owner', use_cache=False)
+        ack_check_tasks([task])
+
+        notify, use_cache, attempts, claimed_by, available = self.task(website_id)
+        self.assertEqual((notify, use_cache, attempts, claimed_by, available), ('owner', False, 0, None, True))
+        rerun, = self.claim()
+        self.assertEqual((rerun.notify, rerun.use_cache), ('owner', False))
+        ack_check_tasks([rerun])
+        self.assertIsNone(self.task(website_id))
+
+    def test_request_merged_into_failed_task_runs_again(self):
+        website_id = self.website_ids[0]
+        enqueue_checks([website_id])
+        task, = self.claim()
+
+        enqueue_checks([website_id], use_cache=False)
+        retry_check_tasks([task], "boom")
+
+        self.assertEqual(self.task(website_id)[2:], (0, None, True))
+
+    def test_stale_ack_is_ignored(self):
+        website_id = self.website_ids[0]
+        enqueue_checks([website_id])
+        task, = self.claim()
+
+        # The claim expired and another worker took the task
+        with db.engine.begin() as conn:
+            conn.execute(text("UPDATE check_tasks SET available_at = NOW() WHERE website_id = :website_id"),
+                         {"website_id": str(website_id)})
+        reclaimed, = self.claim()
+        self.assertEqual(reclaimed.attempts, 2)
+
+        ack_check_tasks([task])
+        self.assertIsNotNone(self.task(website_id))
+        ack_check_tasks([reclaimed])
+        self.assertIsNone(self.task(website_id))
+
+    def test_retry_backs_off_and_gives_up(self):
+        website_id = self.website_ids[0]
+        enqueue_checks([website_id])
+        task, = self.claim()
+
+        retry_check_tasks([task], "boom")
+        self.assertEqual(self.task(website_id)[2:], (1, None, False))
+        self.assertEqual(self.claim(), [])
+
+        with db.engine.begin() as conn:
+            conn.execute(text("UPDATE check_tasks SET attempts = :max_attempts, available_at = NOW() "
+                              "WHERE website_id = :website_id"),
+                         {"website_id": str(website_id), "max_attempts": app.config["CHECK_QUEUE_MAX_ATTEMPTS"]})
+        self.assertEqual(self.claim(), [])
+        self.assertGreaterEqual(drop_exhausted_check_tasks(), 1)
+        self.assertIsNone(self.task(website_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import unittest
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Importing the app connects to (and migrates) the database in DATABASE_URL
+if not os.environ.get("DATABASE_URL"):
+    raise unittest.SkipTest("needs a disposable PostgreSQL database in DATABASE_URL")
+
+from sqlalchemy import text  # noqa: E402
+
+from app import app, db  # noqa: E402
+from check_writer import CheckOutcome, CheckResultWriter  # noqa: E402
+from db_utils import add_latest_state_columns  # noqa: E402
+from models import User, Website  # noqa: E402
+
+
+class WriterTestCase(unittest.TestCase):
+    """A website of a fresh user, removed with its checks afterwards"""
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+
+        name = uuid.uuid4().hex[:12]
+        user = User(email=f"{name}@example.com", username=name)
+        db.session.add(user)
+        db.session.flush()
+        self.website = Website(url=f"https://{name}.example.com", user_id=user.id)
+        db.session.add(self.website)
+        db.session.commit()
+        self.addCleanup(self.delete_user, user.id)
+
+    def delete_user(self, user_id):
+        db.session.rollback()
+        with db.engine.begin() as conn:
+            conn.execute(text("DELETE FROM checks WHERE website_id IN (SELECT id FROM websites WHERE user_id = :user_id)"),
+                         {"user_id": str(user_id)})
+            conn.execute(text("DELETE FROM websites WHERE user_id = :user_id"), {"user_id": str(user_id)})
+            conn.execute(text("DELETE FROM users WHERE id = :user_id"), {"user_id": str(user_id)})
+
+
+class CheckResultWriterTest(WriterTestCase):
+
+    def outcome(self, website):
+        return CheckOutcome(None, website, 'unchanged', datetime.now(timezone.utc),
+                            website_updates={'last_check_status': 'unchanged'})
+
+    def state(self):
+        with db.engine.connect() as conn:
+            return conn.execute(text("SELECT last_check_status, last_change_time, last_error FROM websites "
+                                     "WHERE id = :website_id"), {"website_id": str(self.website.id)}).fetchone()
+
+    def check_count(self):
+        with db.engine.connect() as conn:
+            return conn.execute(text("SELECT COUNT(*) FROM checks WHERE website_id = :website_id"),
+                                {"website_id": str(self.website.id)}).scalar()
+
+    def test_batch_is_written_on_close(self):
+        with CheckResultWriter(batch_size=10, flush_interval=60) as writer:
+            outcome = self.outcome(self.website)
+            writer.add(outcome)
+            self.assertEqual(self.check_count(), 0)
+        self.assertEqual(self.check_count(), 1)
+        self.assertTrue(outcome.persisted)
+        self.assertEqual(writer.failed, [])
+
+    def test_interval_is_checked_on_add(self):
+        writer = CheckResultWriter(batch_size=10, flush_interval=0)
+        writer.add(self.outcome(self.website))
+        self.assertEqual(self.check_count(), 1)
+        writer.close()
+
+    def test_failed_outcomes_are_returned(self):
+        # No such website: its Check row violates the foreign key
+        missing = Website(id=uuid.uuid4(), url="https://missing.example.com")
+        good, bad = self.outcome(self.website), self.outcome(missing)
+
+        writer = CheckResultWriter(batch_size=10, flush_interval=60)
+        writer.add(good)
+        writer.add(bad)
+        self.assertEqual(writer.flush(), [bad])
+        self.assertEqual(writer.close(), [bad])
+
+        self.assertTrue(good.persisted)
+        self.assertFalse(bad.persisted)
+        self.assertEqual(self.check_count(), 1)
+
+    def test_latest_state_is_kept_on_the_website(self):
+        changed_at = datetime.now(timezone.utc) - timedelta(minutes=5)
+        error_at = datetime.now(timezone.utc)
+        changed = CheckOutcome(None, self.website, 'changed', changed_at, content_hash='abc',
+                               website_updates={'last_check_status': 'changed', 'last_change_time': changed_at,
+                                                'last_error': None})
+        error = CheckOutcome(None, self.website, 'error', error_at, error_message='boom',
+                             website_updates={'last_check_status': 'error', 'last_error': 'boom'})
+
+        with CheckResultWriter(batch_size=10, flush_interval=60) as writer:
+            writer.add(changed)
+            writer.add(error)
+
+        self.assertEqual(self.state(), ('error', changed_at, 'boom'))
+        # The loaded object reflects the new state without a reload
+        self.assertEqual((self.website.last_check_status, self.website.last_error), ('error', 'boom'))
+
+    def test_migration_backfills_latest_state_from_checks(self):
+        changed_at = datetime.now(timezone.utc) - timedelta(minutes=5)
+        with CheckResultWriter(batch_size=10, flush_interval=60) as writer:
+            writer.add(CheckOutcome(None, self.website, 'changed', changed_at))
+            writer.add(CheckOutcome(None, self.website, 'error', datetime.now(timezone.utc), error_message='boom'))
+        self.assertEqual(self.state(), (None, None, None))
+
+        with db.engine.begin() as conn:
+            add_latest_state_columns(conn)
+        self.assertEqual(self.state(), ('error', changed_at, 'boom'))
+
+
+class CopyWriterModeTest(WriterTestCase):
+    """CHECK_WRITER_MODE=copy must store exactly what the batch mode stores"""
+
+    def setUp(self):
+        super().setUp()
+        self.other = Website(url=f"{self.website.url}/other", user_id=self.website.user_id)
+        db.session.add(self.other)
+        db.session.commit()
+        self.addCleanup(app.config.update, CHECK_WRITER_MODE=app.config.get("CHECK_WRITER_MODE", "batch"))
+
+    def write(self, mode, website):
+        app.config["CHECK_WRITER_MODE"] = mode
+        check_time = datetime(2024, 3, 4, 8, 0, tzinfo=timezone.utc)
+        outcomes = [
+            CheckOutcome(None, website, 'changed', check_time, content_hash='abc', simhash=-(1 << 63),
+                         diff_summary={'added': ["tab\there", "back\\slash\nnew line"]},
+                         website_updates={'last_content_hash': 'abc', 'last_check_status': 'changed',
+                                          'last_change_time': check_time, 'last_simhash': -5, 'etag': None}),
+            CheckOutcome(None, website, 'error', check_time + timedelta(minutes=1), error_message="bad\r\nthing",
+                         website_updates={'last_check_status': 'error', 'last_error': "bad\r\nthing"}),
+        ]
+        with CheckResultWriter(batch_size=10, flush_interval=60) as writer:
+            self.assertEqual(writer.mode, mode)
+            for outcome in outcomes:
+                writer.add(outcome)
+        self.assertEqual(writer.failed, [])
+
+        with db.engine.connect() as conn:
+            checks = conn.execute(text("SELECT check_time, status, content_hash, error_message, diff_summary::text, "
+                                       "simhash, created_at FROM checks WHERE website_id = :website_id "
+                                       "ORDER BY check_time"), {"website_id": str(website.id)}).fetchall()
+            state = conn.execute(text("SELECT last_content_hash, last_check_status, last_change_time, last_error, "
+                                      "last_simhash, etag FROM websites WHERE id = :website_id"),
+                                 {"website_id": str(website.id)}).fetchone()
+        return checks, state
+
+    def test_copy_mode_matches_batch_mode(self):
+        copied = self.write('copy', self.website)
+        inserted = self.write('batch', self.other)
+        self.assertEqual(copied, inserted)
+        self.assertEqual(copied[1], ('abc', 'error', datetime(2024, 3, 4, 8, 0, tzinfo=timezone.utc),
+                                     "bad\r\nthing", -5, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import unittest
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Importing the app connects to (and migrates) the database in DATABASE_URL
+if not os.environ.get("DATABASE_URL"):
+    raise unittest.SkipTest("needs a disposable PostgreSQL database in DATABASE_URL")
+
+from sqlalchemy import text  # noqa: E402
+
+from app import app, db  # noqa: E402
+from db_utils import (convert_checks_to_partitioned, is_checks_partitioned, maintain_check_partitions,  # noqa: E402
+                      month_start, prune_check_history)
+from models import Check, User, Website  # noqa: E402
+
+
+class WebsitesTestCase(unittest.TestCase):
+    """Three websites of a fresh user, removed with their checks afterwards"""
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+
+        name = uuid.uuid4().hex[:12]
+        user = User(email=f"{name}@example.com", username=name)
+        db.session.add(user)
+        db.session.flush()
+        self.websites = [Website(url=f"https://{name}-{i}.example.com", user_id=user.id) for i in range(3)]
+        db.session.add_all(self.websites)
+        db.session.commit()
+        self.addCleanup(self.delete_user, user.id)
+
+    def delete_user(self, user_id):
+        db.session.rollback()
+        with db.engine.begin() as conn:
+            conn.execute(text("DELETE FROM checks WHERE website_id IN (SELECT id FROM websites WHERE user_id = :user_id)"),
+                         {"user_id": str(user_id)})
+            conn.execute(text("DELETE FROM websites WHERE user_id = :user_id"), {"user_id": str(user_id)})
+            conn.execute(text("DELETE FROM users WHERE id = :user_id"), {"user_id": str(user_id)})
+
+
+class CheckRetentionTest(WebsitesTestCase):
+
+    def add_checks(self, website, statuses):
+        """Add checks one minute apart, oldest first"""
+        start = datetime.now(timezone.utc) - timedelta(hours=1)
+        db.session.add_all([
+            Check(website_id=website.id, check_time=start + timedelta(minutes=i), status=status)
+            for i, status in enumerate(statuses)
+        ])
+        db.session.commit()
+
+    def statuses(self, website):
+        with db.engine.connect() as conn:
+            return conn.execute(text("SELECT status FROM checks WHERE website_id = :website_id ORDER BY check_time"),
+                                {"website_id": str(website.id)}).scalars().all()
+
+    def test_latest_checks_and_latest_change_are_kept(self):
+        website = self.websites[0]
+        self.add_checks(website, ['changed', 'success', 'changed', 'error', 'success', 'success', 'success'])
+
+        self.assertEqual(prune_check_history(keep=3, website_ids=[website.id]), 3)
+        self.assertEqual(self.statuses(website), ['changed', 'success', 'success', 'success'])
+
+    def test_every_batch_is_pruned(self):
+        for website in self.websites:
+            self.add_checks(website, ['success'] * 4)
+
+        self.assertEqual(prune_check_history(keep=2, batch_size=1, website_ids=[w.id for w in self.websites]), 6)
+        self.assertTrue(all(len(self.statuses(website)) == 2 for website in self.websites))
+
+    def test_only_the_given_websites_are_pruned(self):
+        for website in self.websites:
+            self.add_checks(website, ['success'] * 4)
+
+        prune_check_history(keep=1, website_ids=[self.websites[0].id])
+        self.assertEqual([len(self.statuses(website)) for website in self.websites], [1, 4, 4])
+
+    def test_all_websites_are_walked_in_batches(self):
+        for website in self.websites:
+            self.add_checks(website, ['success'] * 4)
+
+        prune_check_history(keep=2, batch_size=2)
+        self.assertTrue(all(len(self.statuses(website)) == 2 for website in self.websites))
+
+
+class MonthStartTest(unittest.TestCase):
+
+    def test_month_start(self):
+        value = datetime(2024, 3, 17, 12, 30, tzinfo=timezone.utc)
+        self.assertEqual(month_start(value), datetime(2024, 3, 1, tzinfo=timezone.utc))
+        self.assertEqual(month_start(value, 10), datetime(2025, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(month_start(value, -3), datetime(2023, 12, 1, tzinfo=timezone.utc))
+
+
+class CheckPartitioningTest(WebsitesTestCase):
+
+    def partitions(self, conn):
+        return conn.execute(text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                                 "WHERE i.inhparent = 'checks'::regclass")).scalars().all()
+
+    def test_conversion_moves_rows_into_monthly_partitions(self):
+        website_id = str(self.websites[0].id)
+        old = datetime.now(timezone.utc) - timedelta(days=70)
+        db.session.add(Check(website_id=website_id, check_time=old, status='success'))
+        # Nothing may touch the session afterwards: the conversion locks websites
+        db.session.commit()
+
+        # DDL is transactional: convert, look, and roll back so other tests keep a plain table
+        with db.engine.connect() as conn:
+            with conn.begin() as transaction:
+                if is_checks_partitioned(conn):
+                    self.skipTest("checks is already partitioned in this database")
+                convert_checks_to_partitioned(conn)
+                self.assertTrue(is_checks_partitioned(conn))
+
+                now = datetime.now(timezone.utc)
+                premake = app.config.get("CHECK_PARTITION_PREMAKE_MONTHS", 2)
+                partitions = self.partitions(conn)
+                self.assertIn('checks_default', partitions)
+                start = month_start(old)
+                while start <= month_start(now, premake):
+                    self.assertIn(f"checks_p{start.strftime('%Y%m')}", partitions)
+                    start = month_start(start, 1)
+
+                partition = conn.execute(text("SELECT tableoid::regclass::text FROM checks "
+                                              "WHERE website_id = :website_id"),
+                                         {"website_id": website_id}).scalar()
+                self.assertEqual(partition, f"checks_p{old.strftime('%Y%m')}")
+                transaction.rollback()
+
+    def test_maintenance_needs_a_partitioned_table(self):
+        with db.engine.connect() as conn:
+            if is_checks_partitioned(conn):
+                self.skipTest("checks is already partitioned in this database")
+        self.assertEqual(maintain_check_partitions(), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
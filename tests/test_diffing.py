@@ -0,0 +1,106 @@
+import time
+import unittest
+
+from diffing import diff_texts, format_diff_summary, split_blocks
+
+
+class SplitBlocksTest(unittest.TestCase):
+
+    def test_skips_blank_lines_and_strips(self):
+        self.assertEqual(split_blocks("  First  \n\n\n Second\n"), ["First", "Second"])
+
+    def test_empty_text(self):
+        self.assertEqual(split_blocks(""), [])
+        self.assertEqual(split_blocks(None), [])
+
+    def test_long_line_is_split_into_sentences(self):
+        sentence = "word " * 300
+        blocks = split_blocks(f"{sentence.strip()}. {sentence.strip()}! {sentence.strip()}?")
+        self.assertEqual(len(blocks), 3)
+        self.assertTrue(blocks[0].endswith("."))
+
+    def test_long_sentence_is_split_at_spaces(self):
+        blocks = split_blocks(" ".join(f"w{i}" for i in range(2000)))
+        self.assertGreater(len(blocks), 1)
+        self.assertTrue(all(len(block) <= 2000 for block in blocks))
+        # No word is cut in half
+        self.assertEqual(" ".join(blocks).split(), [f"w{i}" for i in range(2000)])
+
+    def test_long_run_without_spaces_is_cut(self):
+        blocks = split_blocks("x" * 4500)
+        self.assertEqual([len(block) for block in blocks], [2000, 2000, 500])
+
+
+class DiffTextsTest(unittest.TestCase):
+
+    def test_identical_texts(self):
+        summary = diff_texts("a\nb\nc", "a\nb\nc")
+        self.assertEqual(summary['added_count'] + summary['removed_count'] + summary['modified_count'], 0)
+        self.assertEqual(summary['unchanged_count'], 3)
+        self.assertFalse(summary['truncated'])
+
+    def test_added_removed_and_modified(self):
+        old = "Intro\nPrice is 10 dollars\nOld footer"
+        new = "Intro\nPrice is 12 dollars\nNew section"
+        summary = diff_texts(old, new)
+        self.assertEqual(summary['unchanged_count'], 1)
+        self.assertEqual(summary['modified_count'], 2)
+        first = summary['modified'][0]
+        self.assertEqual(first['old'], "Price is 10 dollars")
+        self.assertEqual(first['removed'], ["10"])
+        self.assertEqual(first['added'], ["12"])
+
+    def test_pure_insert_and_delete(self):
+        summary = diff_texts("a\nb\nc", "a\nc\nd")
+        self.assertEqual(summary['removed'], ["b"])
+        self.assertEqual(summary['added'], ["d"])
+        self.assertEqual(summary['modified_count'], 0)
+
+    def test_lists_are_capped_but_counts_are_not(self):
+        old = "\n".join(f"old paragraph {i}" for i in range(50))
+        new = "\n".join(f"new paragraph {i}" for i in range(50))
+        summary = diff_texts(old, new, max_items=5)
+        self.assertEqual(summary['modified_count'], 50)
+        self.assertEqual(len(summary['modified']), 5)
+        self.assertTrue(summary['truncated'])
+
+    def test_entries_are_clipped(self):
+        summary = diff_texts("", "x" * 500, max_chars=50)
+        self.assertEqual(len(summary['added'][0]), 50)
+        self.assertTrue(summary['added'][0].endswith("…"))
+
+    def test_large_input_is_only_counted(self):
+        old = "\n".join(f"paragraph {i}" for i in range(100))
+        new = "\n".join(f"paragraph {i}" for i in range(1, 101))
+        summary = diff_texts(old, new, max_input_chars=100)
+        self.assertEqual(summary['added'], ["paragraph 100"])
+        self.assertEqual(summary['removed'], ["paragraph 0"])
+        self.assertEqual(summary['modified'], [])
+        self.assertEqual(summary['unchanged_count'], 99)
+        self.assertTrue(summary['truncated'])
+
+    def test_long_unpunctuated_line_is_fast(self):
+        words = [f"w{i}" for i in range(100000)]
+        changed = list(words)
+        changed[50000] = "changed"
+        started = time.perf_counter()
+        summary = diff_texts(" ".join(words), " ".join(changed))
+        self.assertLess(time.perf_counter() - started, 2)
+        self.assertGreater(summary['modified_count'] + summary['added_count'], 0)
+
+
+class FormatDiffSummaryTest(unittest.TestCase):
+
+    def test_empty_summary(self):
+        self.assertEqual(format_diff_summary(None), "")
+
+    def test_renders_counts_and_entries(self):
+        text = format_diff_summary(diff_texts("a\nPrice 10", "a\nPrice 12\nNew"))
+        lines = text.splitlines()
+        self.assertEqual(lines[0], "1 added, 0 removed, 1 modified paragraphs")
+        self.assertIn("~ -10 +12", lines)
+        self.assertIn("+ New", lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import random
+import time
+import unittest
+
+import extraction
+from extraction import (RawFingerprinter, default_raw_normalizer, hamming_distance, hash_content,
+                        load_raw_normalizer, simhash, simhash_to_signed)
+
+
+def random_text(words, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(500)]
+    return ' '.join(rng.choice(vocabulary) for _ in range(words))
+
+
+class HashContentTest(unittest.TestCase):
+
+    def test_whitespace_is_normalized(self):
+        self.assertEqual(hash_content("a  b\n\tc"), hash_content("a b c"))
+
+    def test_empty_content(self):
+        self.assertIsNone(hash_content(""))
+
+
+class SimhashTest(unittest.TestCase):
+
+    def test_empty_text(self):
+        self.assertIsNone(simhash(""))
+        self.assertIsNone(simhash("!!! ..."))
+
+    def test_deterministic_64_bit(self):
+        text = random_text(300)
+        value = simhash(text)
+        self.assertEqual(value, simhash(text))
+        self.assertTrue(0 <= value < 1 << 64)
+
+    def test_case_and_punctuation_are_ignored(self):
+        self.assertEqual(simhash("Hello, World! Again."), simhash("hello world again"))
+
+    def test_small_edit_is_closer_than_unrelated_text(self):
+        text = random_text(1000)
+        words = text.split()
+        words[500] = "edited"
+        edited = ' '.join(words)
+        self.assertLess(hamming_distance(simhash(text), simhash(edited)),
+                        hamming_distance(simhash(text), simhash(random_text(1000, seed=1))))
+
+    def test_fewer_words_than_shingle_size(self):
+        self.assertIsNotNone(simhash("two words"))
+
+    @unittest.skipIf(extraction.numpy is None, "numpy not installed")
+    def test_numpy_and_python_paths_agree(self):
+        for seed, words in ((0, 1), (1, 3), (2, 50), (3, 2000)):
+            text = random_text(words, seed)
+            tokens = extraction._WORD_RE.findall(text.lower())
+            size = min(extraction.SIMHASH_SHINGLE_SIZE, len(tokens))
+            vocabulary = {}
+            word_ids = [vocabulary.setdefault(word, len(vocabulary)) for word in tokens]
+            hashes = [extraction._word_hash(word) for word in vocabulary]
+            self.assertEqual(extraction._simhash_numpy(word_ids, hashes, size),
+                             extraction._simhash_python(word_ids, hashes, size))
+
+
+class SimhashHelpersTest(unittest.TestCase):
+
+    def test_hamming_distance(self):
+        self.assertEqual(hamming_distance(0b1011, 0b0001), 2)
+        # Signed values (as stored in BIGINT columns) compare like their unsigned form
+        self.assertEqual(hamming_distance(-1, (1 << 64) - 1), 0)
+
+    def test_simhash_to_signed(self):
+        self.assertIsNone(simhash_to_signed(None))
+        self.assertEqual(simhash_to_signed(5), 5)
+        self.assertEqual(simhash_to_signed((1 << 64) - 1), -1)
+        self.assertEqual(simhash_to_signed(1 << 63), -(1 << 63))
+
+
+class ExtractionPoolTest(unittest.TestCase):
+
+    def test_warm_up_starts_every_worker(self):
+        self.addCleanup(extraction.shutdown_extraction_pool, True)
+        extraction.warm_extraction_pool(2)
+        self.assertEqual(len(extraction.get_extraction_pool(2)._processes), 2)
+
+    def test_disabled_pool(self):
+        extraction.warm_extraction_pool(0)
+        self.assertIsNone(extraction.get_extraction_pool(0))
+
+
+class RawFingerprinterTest(unittest.TestCase):
+
+    PAGE = (b'<html>\n<head><meta name="csrf-token" content="abc123">\n'
+            b'<script nonce="r4nd0m">var x = 1;</script>\n</head>\n'
+            b'<body><form><input type="hidden" name="csrfmiddlewaretoken" value="t0k3n"></form>\n'
+            b'<p>Content</p></body>\n</html>')
+
+    def fingerprint(self, data, chunk_size=None, normalizer=default_raw_normalizer):
+        fingerprinter = RawFingerprinter(normalizer)
+        chunk_size = chunk_size or len(data)
+        for start in range(0, len(data), chunk_size):
+            fingerprinter.update(data[start:start + chunk_size])
+        return fingerprinter.hexdigest()
+
+    def test_chunking_does_not_change_the_fingerprint(self):
+        expected = self.fingerprint(self.PAGE)
+        for chunk_size in (1, 3, 7, 64):
+            self.assertEqual(self.fingerprint(self.PAGE, chunk_size), expected)
+
+    def test_volatile_tokens_are_ignored(self):
+        other = (self.PAGE.replace(b'abc123', b'xyz789').replace(b'r4nd0m', b'0th3r')
+                 .replace(b't0k3n', b'n3wt0k3n'))
+        self.assertEqual(self.fingerprint(other, 5), self.fingerprint(self.PAGE, 5))
+
+    def test_content_changes_are_detected(self):
+        self.assertNotEqual(self.fingerprint(self.PAGE.replace(b'Content', b'Changed')), self.fingerprint(self.PAGE))
+
+    def test_minified_page_in_small_chunks(self):
+        # One line of a few MB, as minified pages are: must stay linear in the body size
+        page = self.PAGE.replace(b'\n', b'') * 20000
+        started = time.perf_counter()
+        fingerprint = self.fingerprint(page, 1024)
+        self.assertLess(time.perf_counter() - started, 5)
+        self.assertEqual(fingerprint, self.fingerprint(page))
+        self.assertEqual(fingerprint, self.fingerprint(page.replace(b'r4nd0m', b'0th3r'), 1024))
+
+    def test_carry_over_is_bounded(self):
+        fingerprinter = RawFingerprinter()
+        for _ in range(100):
+            fingerprinter.update(b'x' * 4096)
+        self.assertLessEqual(len(fingerprinter._pending), extraction._MAX_PENDING_BYTES)
+
+    def test_tag_spanning_lines(self):
+        page = self.PAGE.replace(b'<input type="hidden"', b'<input\ntype="hidden"')
+        other = page.replace(b't0k3n', b'n3wt0k3n')
+        self.assertEqual(self.fingerprint(other, 7), self.fingerprint(page, 7))
+
+    def test_without_normalizer_tokens_count(self):
+        other = self.PAGE.replace(b'r4nd0m', b'0th3r')
+        self.assertNotEqual(self.fingerprint(other, normalizer=None), self.fingerprint(self.PAGE, normalizer=None))
+
+    def test_load_raw_normalizer(self):
+        self.assertIs(load_raw_normalizer(''), default_raw_normalizer)
+        self.assertIsNone(load_raw_normalizer('none'))
+        self.assertIs(load_raw_normalizer('extraction.default_raw_normalizer'), default_raw_normalizer)
+
+
+if __name__ == '__main__':
+    unittest.main()
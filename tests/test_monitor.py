@@ -0,0 +1,194 @@
+import asyncio
+import time
+import types
+import unittest
+
+from app import app  # noqa: F401 (imported first: monitor and routes import each other through app)
+from monitor import FetchCache, FetchEngine, FetchResult, HostRateLimiter, WebsiteMonitor, normalize_url
+
+
+def make_website(**fields):
+    website = dict(url='https://example.com/', last_content_hash=None, last_raw_hash=None, last_simhash=None,
+                   etag=None, last_modified=None, change_threshold=None)
+    website.update(fields)
+    return types.SimpleNamespace(**website)
+
+
+class FetchEngineRateLimitTest(unittest.TestCase):
+    """Fetch scheduling across hosts, with the network replaced by an instant fake"""
+
+    def setUp(self):
+        self.engine = FetchEngine()
+        self.engine._get_client = lambda: None
+        self.finished = {}
+
+        async def fake_fetch(client, url, headers, timeout, max_bytes=None):
+            await asyncio.sleep(0)
+            self.finished[url] = time.monotonic()
+            return FetchResult(url, body=b'ok', status_code=200)
+
+        self.engine._fetch = fake_fetch
+
+    def tearDown(self):
+        loop = self.engine._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            self.engine._thread.join()
+            loop.close()
+
+    def test_throttled_host_does_not_delay_other_hosts(self):
+        # slow.test allows one request per second; other hosts are unlimited
+        self.engine._rate_limiter = HostRateLimiter(0, 1, {'slow.test': (1, 1)})
+        urls = ['http://slow.test/1', 'http://slow.test/2', 'http://slow.test/3', 'http://fast.test/']
+
+        started = time.monotonic()
+        results = self.engine.fetch_many(urls, {}, concurrency=1, timeout=5)
+
+        self.assertEqual([result.url for result in results], urls)
+        self.assertTrue(all(result.ok for result in results))
+        # The fast host runs while the slow host's later requests wait for tokens
+        self.assertLess(self.finished['http://fast.test/'] - started, 0.5)
+        self.assertGreaterEqual(self.finished['http://slow.test/3'] - started, 1.5)
+
+
+class HostRateLimiterTest(unittest.TestCase):
+
+    def test_most_specific_domain_override_wins(self):
+        limiter = HostRateLimiter(1, 3, HostRateLimiter.parse_overrides('example.com=0.5:1,cdn.example.com=10:20'))
+        self.assertEqual(limiter.limits_for('www.example.com'), (0.5, 1))
+        self.assertEqual(limiter.limits_for('img.cdn.example.com'), (10.0, 20))
+        self.assertEqual(limiter.limits_for('example.org'), (1, 3))
+
+    def test_invalid_override_is_ignored(self):
+        self.assertEqual(HostRateLimiter.parse_overrides('example.com=0.5, bad'), {'example.com': (0.5, 1)})
+
+
+class ConditionalRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = WebsiteMonitor()
+
+    def test_validators_need_a_stored_hash(self):
+        website = make_website(etag='"v1"', last_modified='Mon, 04 Mar 2024 08:00:00 GMT')
+        self.assertEqual(self.monitor.get_conditional_headers(website), {})
+
+        website.last_content_hash = 'abc'
+        self.assertEqual(self.monitor.get_conditional_headers(website), {
+            'If-None-Match': '"v1"',
+            'If-Modified-Since': 'Mon, 04 Mar 2024 08:00:00 GMT',
+        })
+
+    def test_group_only_sends_validators_all_rows_agree_on(self):
+        first = make_website(last_content_hash='abc', etag='"v1"')
+        same = make_website(last_content_hash='abc', etag='"v1"')
+        self.assertEqual(self.monitor.get_group_conditional_headers([first, same]), {'If-None-Match': '"v1"'})
+
+        other_hash = make_website(last_content_hash='def', etag='"v1"')
+        self.assertEqual(self.monitor.get_group_conditional_headers([first, other_hash]), {})
+        other_etag = make_website(last_content_hash='abc', etag='"v2"')
+        self.assertEqual(self.monitor.get_group_conditional_headers([first, other_etag]), {})
+
+    def test_not_modified_keeps_the_stored_hash_and_validators(self):
+        website = make_website(last_content_hash='abc', etag='"v1"')
+        outcome = self.monitor.evaluate_website(website, FetchResult(website.url, status_code=304))
+
+        self.assertEqual(outcome.status, 'success')
+        self.assertEqual(outcome.website_updates['last_content_hash'], 'abc')
+        self.assertNotIn('etag', outcome.website_updates)
+        self.assertFalse(FetchResult(website.url, status_code=304).needs_extraction)
+
+
+class NormalizeUrlTest(unittest.TestCase):
+
+    def test_equivalent_spellings_share_a_key(self):
+        self.assertEqual(normalize_url(' HTTPS://Example.COM:443#top'), 'https://example.com/')
+        self.assertEqual(normalize_url('http://example.com:80/a'), 'http://example.com/a')
+
+    def test_significant_parts_are_kept(self):
+        self.assertEqual(normalize_url('http://example.com:8080/Path?b=2&a=1'), 'http://example.com:8080/Path?b=2&a=1')
+        self.assertEqual(normalize_url('https://user:pw@Example.com/'), 'https://user:pw@example.com/')
+
+    def test_invalid_port_is_left_alone(self):
+        self.assertEqual(normalize_url('http://example.com:bad/'), 'http://example.com:bad/')
+
+
+class FetchCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = FetchCache()
+
+    def test_result_is_reused_within_the_window(self):
+        result = FetchResult('https://example.com/', body=b'page', status_code=200)
+        self.cache.put('https://example.com/', result, 60)
+        self.assertIs(self.cache.get('https://example.com/', 60), result)
+        # A run that doesn't want cached results passes a zero window
+        self.assertIsNone(self.cache.get('https://example.com/', 0))
+
+    def test_result_expires(self):
+        self.cache.put('https://example.com/', FetchResult('https://example.com/', body=b'page'), 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('https://example.com/', 0.01))
+
+    def test_errors_and_not_modified_are_not_cached(self):
+        self.cache.put('a', FetchResult('a', error=ValueError('boom')), 60)
+        self.cache.put('b', FetchResult('b', status_code=304), 60)
+        self.assertIsNone(self.cache.get('a', 60))
+        self.assertIsNone(self.cache.get('b', 60))
+
+    def test_body_is_released_by_the_last_user(self):
+        result = FetchResult('https://example.com/', body=b'page', status_code=200)
+        result.retain()
+        self.assertTrue(result.retain(needs_body=True))
+        result.release()
+        self.assertEqual(result.body, b'page')
+        result.release()
+        self.assertIsNone(result.body)
+        # A later run that still has to extract the page must fetch it again
+        self.assertFalse(result.retain(needs_body=True))
+
+
+class SignificantChangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = WebsiteMonitor()
+        self.addCleanup(app.config.update, CHANGE_SIMHASH_THRESHOLD=app.config.get("CHANGE_SIMHASH_THRESHOLD", 0))
+        app.config["CHANGE_SIMHASH_THRESHOLD"] = 0
+
+    def test_every_change_counts_by_default(self):
+        website = make_website(last_simhash=0b1111)
+        self.assertTrue(self.monitor.is_significant_change(website, 0b1110))
+
+    def test_site_threshold(self):
+        website = make_website(last_simhash=0b1111, change_threshold=3)
+        self.assertFalse(self.monitor.is_significant_change(website, 0b1100))
+        self.assertTrue(self.monitor.is_significant_change(website, 0b1000))
+
+    def test_global_threshold_and_site_override(self):
+        app.config["CHANGE_SIMHASH_THRESHOLD"] = 3
+        website = make_website(last_simhash=0b1111)
+        self.assertFalse(self.monitor.is_significant_change(website, 0b1100))
+        # 0 on the site turns the global threshold off
+        website.change_threshold = 0
+        self.assertTrue(self.monitor.is_significant_change(website, 0b1100))
+
+    def test_unknown_simhash_counts(self):
+        website = make_website(change_threshold=3)
+        self.assertTrue(self.monitor.is_significant_change(website, 0b1111))
+        website.last_simhash = 0b1111
+        self.assertTrue(self.monitor.is_significant_change(website, None))
+
+    def test_insignificant_change_keeps_the_baseline(self):
+        website = make_website(last_content_hash='old', last_simhash=0b1111, change_threshold=3)
+        fetch_result = FetchResult(website.url, body=b'<p>page</p>', status_code=200)
+        fetch_result.set_extracted('page', 'new', None, simhash=0b1110)
+
+        outcome = self.monitor.evaluate_website(website, fetch_result)
+
+        self.assertEqual(outcome.status, 'success')
+        self.assertEqual(outcome.website_updates['last_content_hash'], 'new')
+        # Small edits are measured against the last reported version, so they can't add up unnoticed
+        self.assertNotIn('last_simhash', outcome.website_updates)
+
+
+if __name__ == '__main__':
+    unittest.main()
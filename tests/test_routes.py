@@ -0,0 +1,93 @@
+import os
+import unittest
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Importing the app connects to (and migrates) the database in DATABASE_URL
+if not os.environ.get("DATABASE_URL"):
+    raise unittest.SkipTest("needs a disposable PostgreSQL database in DATABASE_URL")
+
+from sqlalchemy import text  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import User, Website  # noqa: E402
+from routes import decode_website_cursor, encode_website_cursor, query_websites_page  # noqa: E402
+
+
+class WebsitesPageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+
+        self.user_id = self.add_user()
+        # Another user's websites must never show up
+        self.add_user()
+
+    def add_user(self):
+        name = uuid.uuid4().hex[:12]
+        user = User(email=f"{name}@example.com", username=name)
+        db.session.add(user)
+        db.session.flush()
+        now = datetime.now(timezone.utc)
+        db.session.add_all([
+            Website(url=f"https://site{i}.example.com", user_id=user.id, status='error' if i % 2 else 'success',
+                    last_check_status='changed' if i < 2 else 'success',
+                    last_change_time=now - timedelta(days=i))
+            for i in range(5)
+        ])
+        db.session.commit()
+        self.addCleanup(self.delete_user, user.id)
+        return user.id
+
+    def delete_user(self, user_id):
+        db.session.rollback()
+        with db.engine.begin() as conn:
+            conn.execute(text("DELETE FROM websites WHERE user_id = :user_id"), {"user_id": str(user_id)})
+            conn.execute(text("DELETE FROM users WHERE id = :user_id"), {"user_id": str(user_id)})
+
+    def all_pages(self, limit, **filters):
+        urls = []
+        cursor = None
+        while True:
+            rows, cursor = query_websites_page(self.user_id, limit, cursor=cursor, **filters)
+            urls.append([row.url for row in rows])
+            if cursor is None:
+                return urls
+
+    def test_pages_follow_each_other_in_url_order(self):
+        self.assertEqual(self.all_pages(2), [
+            ["https://site0.example.com", "https://site1.example.com"],
+            ["https://site2.example.com", "https://site3.example.com"],
+            ["https://site4.example.com"],
+        ])
+
+    def test_exact_last_page_has_no_cursor(self):
+        self.assertEqual([len(page) for page in self.all_pages(5)], [5])
+
+    def test_filters(self):
+        self.assertEqual(self.all_pages(10, status='changed'),
+                         [["https://site0.example.com", "https://site1.example.com"]])
+        self.assertEqual(self.all_pages(10, status='error'),
+                         [["https://site1.example.com", "https://site3.example.com"]])
+        since = datetime.now(timezone.utc) - timedelta(days=2, hours=1)
+        self.assertEqual(self.all_pages(1, changed_since=since),
+                         [["https://site0.example.com"], ["https://site1.example.com"],
+                          ["https://site2.example.com"]])
+
+    def test_selected_fields(self):
+        rows, cursor = query_websites_page(self.user_id, 1, fields=['status'])
+        self.assertEqual(rows[0].status, 'success')
+        # The url is always selected since the cursor is built from it
+        self.assertEqual(decode_website_cursor(cursor), rows[0].url)
+
+    def test_cursor(self):
+        self.assertEqual(decode_website_cursor(encode_website_cursor("https://example.com/ä?q=1")),
+                         "https://example.com/ä?q=1")
+        with self.assertRaises(ValueError):
+            decode_website_cursor("not a cursor!")
+
+
+if __name__ == '__main__':
+    unittest.main()
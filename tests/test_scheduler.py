@@ -0,0 +1,231 @@
+import os
+import types
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import text
+
+from app import app, db
+from models import User, Website
+from scheduler import (GLOBAL_CHECK_CRON, SCHEDULER_TIMEZONE, OffsetTrigger, create_scheduler, get_stored_jobs,
+                       has_stale_schedule_jobs, jitter_slots, normalize_cron, run_schedule, schedule_job_id,
+                       start_scheduler, user_schedules, user_slot)
+
+
+class JitterSlotsTest(unittest.TestCase):
+
+    def configure(self, window, step):
+        saved = {key: app.config.get(key) for key in ("SCHEDULE_JITTER_WINDOW", "SCHEDULE_JITTER_STEP")}
+        self.addCleanup(app.config.update, saved)
+        app.config.update(SCHEDULE_JITTER_WINDOW=window, SCHEDULE_JITTER_STEP=step)
+
+    def test_disabled(self):
+        self.configure(0, 60)
+        self.assertEqual(jitter_slots(), (1, 0))
+        self.configure(900, 0)
+        self.assertEqual(jitter_slots(), (1, 0))
+
+    def test_window_is_divided_into_steps(self):
+        self.configure(900, 60)
+        self.assertEqual(jitter_slots(), (15, 60))
+
+    def test_window_shorter_than_step(self):
+        self.configure(30, 60)
+        self.assertEqual(jitter_slots(), (1, 60))
+
+
+class UserSlotTest(unittest.TestCase):
+
+    def test_single_slot(self):
+        self.assertEqual(user_slot(uuid.uuid4(), 1), 0)
+        self.assertEqual(user_slot(uuid.uuid4(), 0), 0)
+
+    def test_stable_and_in_range(self):
+        user_id = uuid.UUID('12345678-1234-5678-1234-567812345678')
+        slot = user_slot(user_id, 15)
+        self.assertTrue(0 <= slot < 15)
+        self.assertEqual(user_slot(user_id, 15), slot)
+        # The id may arrive as a string (e.g. from a NOTIFY payload)
+        self.assertEqual(user_slot(str(user_id), 15), slot)
+
+    def test_users_are_spread_over_slots(self):
+        slots = [user_slot(uuid.UUID(int=i), 15) for i in range(1500)]
+        counts = [slots.count(slot) for slot in range(15)]
+        self.assertTrue(all(50 <= count <= 150 for count in counts), counts)
+
+
+class ScheduleJobIdTest(unittest.TestCase):
+
+    def test_unshifted_job(self):
+        self.assertEqual(schedule_job_id("0 8 * * *"), "schedule_0_8_*_*_*")
+        self.assertEqual(schedule_job_id("0  8 * *  *", 0, 60), "schedule_0_8_*_*_*")
+
+    def test_slot_offset_is_part_of_the_id(self):
+        self.assertEqual(schedule_job_id("0 8 * * *", 3, 60), "schedule_0_8_*_*_*@180")
+
+    def test_same_slot_with_another_step_gets_another_id(self):
+        self.assertNotEqual(schedule_job_id("0 8 * * *", 3, 60), schedule_job_id("0 8 * * *", 3, 30))
+
+
+class NormalizeCronTest(unittest.TestCase):
+
+    def test_spacing_is_normalized(self):
+        self.assertEqual(normalize_cron(" 0\t8  * * *\n"), "0 8 * * *")
+
+    def test_user_schedules_share_one_spelling(self):
+        user = types.SimpleNamespace(schedule_1="0 8 * * *", schedule_2="0  8 * * * ", schedule_3="  ",
+                                     schedule_4=None)
+        self.assertEqual(user_schedules(user), ["0 8 * * *"])
+
+
+@unittest.skipUnless(os.environ.get("DATABASE_URL"), "needs a disposable PostgreSQL database in DATABASE_URL")
+class RunScheduleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+        # Checks are only queued, not run
+        self.addCleanup(app.config.update, CHECK_QUEUE_ENABLED=app.config["CHECK_QUEUE_ENABLED"])
+        app.config["CHECK_QUEUE_ENABLED"] = True
+
+    def add_user(self, schedule):
+        name = uuid.uuid4().hex[:12]
+        user = User(email=f"{name}@example.com", username=name, schedule_1=schedule)
+        db.session.add(user)
+        db.session.flush()
+        website = Website(url=f"https://{name}.example.com", user_id=user.id)
+        db.session.add(website)
+        db.session.commit()
+        self.addCleanup(self.delete_user, user.id)
+        return website.id
+
+    def delete_user(self, user_id):
+        db.session.rollback()
+        with db.engine.begin() as conn:
+            conn.execute(text("DELETE FROM websites WHERE user_id = :user_id"), {"user_id": str(user_id)})
+            conn.execute(text("DELETE FROM users WHERE id = :user_id"), {"user_id": str(user_id)})
+
+    def test_spellings_sharing_a_job_are_all_checked(self):
+        website_ids = [self.add_user("7 3 * * 1"), self.add_user("7  3 * *  1"), self.add_user(" 7 3 * * 1 ")]
+
+        run_schedule("7 3 * * 1")
+
+        with db.engine.connect() as conn:
+            queued = conn.execute(text("SELECT website_id FROM check_tasks WHERE website_id = ANY(:ids)"),
+                                  {"ids": website_ids}).scalars().all()
+        self.assertEqual(set(queued), set(website_ids))
+
+
+@unittest.skipUnless(os.environ.get("DATABASE_URL"), "needs a disposable PostgreSQL database in DATABASE_URL")
+class PersistentJobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+
+        keys = ("SCHEDULER_JOBS_TABLE", "SCHEDULE_JITTER_WINDOW", "SCHEDULE_JITTER_STEP")
+        self.addCleanup(app.config.update, {key: app.config.get(key) for key in keys})
+        self.table = f"test_jobs_{uuid.uuid4().hex[:12]}"
+        app.config.update(SCHEDULER_JOBS_TABLE=self.table, SCHEDULE_JITTER_WINDOW=0)
+        self.addCleanup(self.drop_table)
+
+    def drop_table(self):
+        db.session.remove()
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {self.table}"))
+
+    def start(self, rebuild=False):
+        scheduler = create_scheduler()
+        start_scheduler(scheduler, rebuild)
+        scheduler.shutdown(wait=False)
+        return {job['id']: job['next_run_time'] for job in get_stored_jobs()}
+
+    def test_stored_jobs_are_resumed(self):
+        jobs = self.start()
+        self.assertIn(schedule_job_id(GLOBAL_CHECK_CRON), jobs)
+        self.assertIn('check_retention', jobs)
+        self.assertEqual(self.start(), jobs)
+
+    def test_changed_load_spreading_rebuilds_the_jobs(self):
+        self.start()
+        app.config.update(SCHEDULE_JITTER_WINDOW=120, SCHEDULE_JITTER_STEP=60)
+        jobs = self.start()
+        self.assertIn(schedule_job_id(GLOBAL_CHECK_CRON, 0, 60), jobs)
+        self.assertIn(schedule_job_id(GLOBAL_CHECK_CRON, 1, 60), jobs)
+
+        # Same slot count, other step: every shifted job gets a new ID
+        app.config.update(SCHEDULE_JITTER_STEP=30, SCHEDULE_JITTER_WINDOW=60)
+        jobs = self.start()
+        self.assertIn(schedule_job_id(GLOBAL_CHECK_CRON, 1, 30), jobs)
+        self.assertNotIn(schedule_job_id(GLOBAL_CHECK_CRON, 1, 60), jobs)
+
+    def test_unreadable_job_is_listed_and_kept(self):
+        self.start()
+        with db.engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {self.table} (id, next_run_time, job_state) "
+                              "VALUES ('unreadable', NULL, :state)"), {"state": b"not a pickle"})
+        jobs = {job['id']: job['next_run_time'] for job in get_stored_jobs()}
+        self.assertIsNone(jobs['unreadable'])
+        # Unpickling it through the job store would have deleted it
+        with db.engine.connect() as conn:
+            self.assertEqual(conn.execute(text(f"SELECT COUNT(*) FROM {self.table} WHERE id = 'unreadable'")).scalar(),
+                             1)
+
+
+class StaleScheduleJobsTest(unittest.TestCase):
+
+    def jobs(self, cron, slots, step):
+        return [
+            types.SimpleNamespace(id=schedule_job_id(cron, slot, step),
+                                  kwargs={'cron': cron, 'slot': slot, 'slots': slots})
+            for slot in range(slots)
+        ]
+
+    def test_current_jobs(self):
+        self.assertFalse(has_stale_schedule_jobs(self.jobs("0 8 * * *", 15, 60), 15, 60))
+        self.assertFalse(has_stale_schedule_jobs(self.jobs("0 8 * * *", 1, 0), 1, 0))
+
+    def test_slot_count_changed(self):
+        self.assertTrue(has_stale_schedule_jobs(self.jobs("0 8 * * *", 15, 60), 10, 60))
+        self.assertTrue(has_stale_schedule_jobs(self.jobs("0 8 * * *", 1, 0), 15, 60))
+
+    def test_step_changed_with_the_same_slot_count(self):
+        self.assertTrue(has_stale_schedule_jobs(self.jobs("0 8 * * *", 15, 60), 15, 30))
+
+    def test_jobs_from_before_load_spreading(self):
+        job = types.SimpleNamespace(id="schedule_0_8_*_*_*", kwargs={'cron': "0 8 * * *"})
+        self.assertFalse(has_stale_schedule_jobs([job], 1, 0))
+
+
+class OffsetTriggerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cron = CronTrigger(minute=0, hour=8, timezone=SCHEDULER_TIMEZONE)
+        self.trigger = OffsetTrigger(self.cron, 180)
+
+    def test_first_fire_time_is_shifted(self):
+        now = SCHEDULER_TIMEZONE.localize(datetime(2024, 3, 4, 7, 0))
+        self.assertEqual(self.trigger.get_next_fire_time(None, now),
+                         SCHEDULER_TIMEZONE.localize(datetime(2024, 3, 4, 8, 3)))
+
+    def test_inside_the_offset_window_fires_today(self):
+        # 08:01 is after the cron time but before the shifted one
+        now = SCHEDULER_TIMEZONE.localize(datetime(2024, 3, 4, 8, 1))
+        self.assertEqual(self.trigger.get_next_fire_time(None, now),
+                         SCHEDULER_TIMEZONE.localize(datetime(2024, 3, 4, 8, 3)))
+
+    def test_next_fire_time_follows_the_previous_one(self):
+        previous = SCHEDULER_TIMEZONE.localize(datetime(2024, 3, 4, 8, 3))
+        next_fire_time = self.trigger.get_next_fire_time(previous, previous + timedelta(seconds=1))
+        self.assertEqual(next_fire_time, SCHEDULER_TIMEZONE.localize(datetime(2024, 3, 5, 8, 3)))
+
+    def test_str(self):
+        self.assertEqual(str(self.trigger), f"{self.cron} +180s")
+
+
+if __name__ == '__main__':
+    unittest.main()
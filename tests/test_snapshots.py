@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import uuid
+
+# Importing the app connects to (and migrates) the database in DATABASE_URL
+if not os.environ.get("DATABASE_URL"):
+    raise unittest.SkipTest("needs a disposable PostgreSQL database in DATABASE_URL")
+
+from sqlalchemy import text  # noqa: E402
+
+from app import app, db  # noqa: E402
+import snapshots  # noqa: E402
+
+
+class SnapshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+        self.engine = db.engine
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.store = snapshots.FilesystemSnapshotStore(self.root)
+        self.hashes = []
+        self.addCleanup(self.delete_rows)
+
+    def delete_rows(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM content_snapshots WHERE content_hash = ANY(:hashes)"),
+                         {"hashes": self.hashes})
+
+    def new_hash(self):
+        content_hash = uuid.uuid4().hex * 2
+        self.hashes.append(content_hash)
+        return content_hash
+
+    def add(self, contents, refs):
+        with self.engine.begin() as conn:
+            self.store.add_references(conn, contents, refs)
+
+    def ref_count(self, content_hash):
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT ref_count FROM content_snapshots WHERE content_hash = :content_hash"),
+                                {"content_hash": content_hash}).scalar()
+
+    def store_codec(self, content_hash):
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT codec FROM content_snapshots WHERE content_hash = :content_hash"),
+                                {"content_hash": content_hash}).scalar()
+
+    def release(self, content_hash, refs):
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE content_snapshots SET ref_count = ref_count - :refs "
+                              "WHERE content_hash = :content_hash"), {"content_hash": content_hash, "refs": refs})
+
+    def get(self, content_hash):
+        with self.engine.connect() as conn:
+            return self.store.get(conn, content_hash)
+
+    def test_new_version_is_stored_once_with_its_references(self):
+        content_hash = self.new_hash()
+        self.add({content_hash: "Page text"}, {content_hash: 2})
+        self.assertEqual(self.ref_count(content_hash), 2)
+        self.assertEqual(self.get(content_hash), "Page text")
+
+        # Seen again: only the references are added
+        self.add({content_hash: "Page text"}, {content_hash: 3})
+        self.add({}, {content_hash: 1})
+        self.assertEqual(self.ref_count(content_hash), 6)
+
+    def test_references_without_text_are_ignored_until_stored(self):
+        content_hash = self.new_hash()
+        self.add({}, {content_hash: 1})
+        self.assertIsNone(self.ref_count(content_hash))
+        self.assertIsNone(self.get(content_hash))
+
+    def test_garbage_collection_removes_unreferenced_snapshots(self):
+        kept, removed = self.new_hash(), self.new_hash()
+        self.add({kept: "Kept", removed: "Removed"}, {kept: 1, removed: 1})
+        path = self.store.path_for(removed, self.store_codec(removed))
+        self.release(removed, 1)
+
+        snapshots.collect_snapshot_garbage(self.engine, self.store)
+
+        self.assertIsNone(self.ref_count(removed))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.get(kept), "Kept")
+
+    def test_collected_version_can_be_stored_again(self):
+        content_hash = self.new_hash()
+        self.add({content_hash: "Text"}, {content_hash: 1})
+        self.release(content_hash, 1)
+        snapshots.collect_snapshot_garbage(self.engine, self.store)
+
+        self.add({content_hash: "Text"}, {content_hash: 1})
+        self.assertEqual(self.ref_count(content_hash), 1)
+        self.assertEqual(self.get(content_hash), "Text")
+
+    def test_version_stored_again_during_collection_keeps_its_file(self):
+        content_hash = self.new_hash()
+        self.add({content_hash: "Text"}, {content_hash: 1})
+        self.release(content_hash, 1)
+
+        # A check writer stores the same version while the collector removes its file
+        writer = threading.Thread(target=self.add, args=({content_hash: "Text"}, {content_hash: 1}))
+        remove_data = self.store.remove_data
+
+        def remove_during_write(*args):
+            writer.start()
+            writer.join(timeout=1)
+            remove_data(*args)
+
+        self.store.remove_data = remove_during_write
+        snapshots.collect_snapshot_garbage(self.engine, self.store)
+        writer.join()
+
+        self.assertEqual(self.ref_count(content_hash), 1)
+        self.assertEqual(self.get(content_hash), "Text")
+
+    def test_leftover_file_is_rewritten(self):
+        # A file left behind by an interrupted collection must not stand in for the new one
+        content_hash = self.new_hash()
+        codec, _ = snapshots.compress_text("x")
+        path = self.store.path_for(content_hash, codec)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'stale')
+
+        self.add({content_hash: "Fresh"}, {content_hash: 1})
+        self.assertEqual(self.get(content_hash), "Fresh")
+
+
+if __name__ == '__main__':
+    unittest.main()
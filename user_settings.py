@@ -118,6 +118,9 @@ def user_settings():
         current_user.schedule_3 = form.schedule_3.data
         current_user.schedule_4 = form.schedule_4.data
         
+        # Have the scheduler pick up the new schedules once this commits
+        from scheduler import notify_schedule_change
+        notify_schedule_change(current_user.id)
         db.session.commit()
         
         # Set toast message in session
@@ -256,31 +259,16 @@ def update_settings():
                 else:
                     logger.error(f"Invalid cron expression format: {schedule}")
     
-    # Save changes
+    # Save changes; the scheduler process re-syncs only this user's jobs once they commit
+    from scheduler import notify_schedule_change
+    notify_schedule_change(current_user.id)
     db.session.commit()
     
-    # Restart the scheduler to apply new settings
-    try:
-        from app import init_scheduler
-        
-        # Log the schedules for debugging
-        logger = logging.getLogger(__name__)
-        logger.info(f"User {current_user.username} updated schedules: {current_user.schedule_1}, {current_user.schedule_2}, {current_user.schedule_3}, {current_user.schedule_4}")
-        
-        # Get current scheduler instance and shut it down
-        from flask import current_app
-        if hasattr(current_app, 'scheduler') and current_app.scheduler:
-            logger.info("Shutting down existing scheduler")
-            current_app.scheduler.shutdown()
-        
-        # Initialize and start a new scheduler
-        logger.info("Starting new scheduler with updated user schedules")
-        current_app.scheduler = init_scheduler()
-        
-        # Set toast message in session and return JSON response
-        from app import set_toast_message_in_session
-        set_toast_message_in_session('Settings updated successfully', 'success')
-        return jsonify({'message': 'Settings updated and schedule activated'})
-    except Exception as e:
-        logger.error(f"Failed to restart scheduler: {str(e)}")
-        return jsonify({'message': 'Settings updated but scheduler restart failed'})
\ No newline at end of file
+    # Log the schedules for debugging
+    logger = logging.getLogger(__name__)
+    logger.info(f"User {current_user.username} updated schedules: {current_user.schedule_1}, {current_user.schedule_2}, {current_user.schedule_3}, {current_user.schedule_4}")
+    
+    # Set toast message in session and return JSON response
+    from app import set_toast_message_in_session
+    set_toast_message_in_session('Settings updated successfully', 'success')
+    return jsonify({'message': 'Settings updated and schedule activated'})
\ No newline at end of file
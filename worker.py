@@ -0,0 +1,142 @@
+"""
+Check Worker for WebWatchDog
+Runs website checks from the check_tasks queue (see check_queue.py)
+
+Start as many workers as needed, on any number of hosts:
+
+    python worker.py [--batch-size N]
+
+Each worker claims a batch of queued websites, runs them through one shared check
+pipeline (so a URL shared by several websites is fetched once), notifies every
+website's owner or the global chat as requested by its task, and acks the batch.
+Tasks whose results couldn't be recorded are retried like a failed batch.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from app import app, db
+from check_queue import ack_check_tasks, claim_check_tasks, drop_exhausted_check_tasks, retry_check_tasks
+
+logger = logging.getLogger(__name__)
+
+
+class CheckWorker:
+    """Claims batches of check tasks and runs them until stopped"""
+
+    def __init__(self, batch_size=None, poll_interval=None):
+        self.batch_size = batch_size or app.config["CHECK_QUEUE_BATCH_SIZE"]
+        self.poll_interval = poll_interval or app.config["CHECK_QUEUE_POLL_INTERVAL"]
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.cleanup_interval = app.config["CHECK_QUEUE_CLEANUP_INTERVAL"]
+        self._next_cleanup = 0
+        self._stop = threading.Event()
+
+    def run(self):
+        """Process batches until stopped (blocking)"""
+        logger.info(f"Check worker {self.worker_id} started (batch size {self.batch_size})")
+        while not self._stop.is_set():
+            with app.app_context():
+                try:
+                    # On a timer rather than only when idle, so exhausted tasks are
+                    # dropped under steady load too
+                    if time.monotonic() >= self._next_cleanup:
+                        drop_exhausted_check_tasks()
+                        self._next_cleanup = time.monotonic() + self.cleanup_interval
+                    tasks = claim_check_tasks(self.worker_id, self.batch_size)
+                    if tasks:
+                        self.process(tasks)
+                        continue
+                except Exception as e:
+                    logger.error(f"Error claiming check tasks: {str(e)}")
+            # Queue is empty (or the database is unreachable): wait before polling again
+            self._stop.wait(self.poll_interval)
+        logger.info(f"Check worker {self.worker_id} stopped")
+
+    def stop(self):
+        """Stop after the current batch"""
+        self._stop.set()
+
+    def process(self, tasks):
+        """
+        Check the websites of a claimed batch and ack it
+
+        Args:
+            tasks: ClaimedTask objects
+        """
+        try:
+            from models import Website, User
+            from monitor import WebsiteMonitor
+            from check_writer import CheckResultWriter
+            from scheduler import create_user_monitor
+
+            tasks_by_website = {task.website_id: task for task in tasks}
+            websites = Website.query.filter(Website.id.in_(list(tasks_by_website))).all()
+
+            # For the global notifications we don't enable email notifications
+            global_monitor = WebsiteMonitor(
+                telegram_bot_token=app.config["TELEGRAM_BOT_TOKEN"],
+                telegram_chat_id=app.config["TELEGRAM_CHAT_ID"],
+                email_notifications_enabled=False,
+                notification_email=None
+            )
+            owner_ids = {website.user_id for website in websites if tasks_by_website[website.id].notify == 'owner'}
+            owners = User.query.filter(User.id.in_(list(owner_ids))).all() if owner_ids else []
+            monitors_by_user = {user.id: create_user_monitor(user) for user in owners}
+            monitors = {
+                website.id: monitors_by_user.get(website.user_id, global_monitor)
+                if tasks_by_website[website.id].notify == 'owner' else global_monitor
+                for website in websites
+            }
+
+            logger.info(f"Checking {len(websites)} queued websites")
+            with CheckResultWriter() as writer:
+                # Manual checks skip recently fetched pages
+                for use_cache in (True, False):
+                    batch = [website for website in websites if tasks_by_website[website.id].use_cache == use_cache]
+                    if batch:
+                        global_monitor.check_websites(batch, use_cache=use_cache, writer=writer, monitors=monitors)
+        except Exception as e:
+            logger.error(f"Error running {len(tasks)} queued checks, will retry: {str(e)}")
+            retry_check_tasks(tasks, str(e))
+            return
+        finally:
+            db.session.remove()
+
+        # Results that couldn't be recorded are checked again
+        unrecorded = {outcome.website.id for outcome in writer.failed}
+        if unrecorded:
+            logger.error(f"Failed to record {len(unrecorded)} queued check results, will retry")
+            retry_check_tasks([task for task in tasks if task.website_id in unrecorded], "Failed to record check result")
+        ack_check_tasks([task for task in tasks if task.website_id not in unrecorded])
+
+
+def main():
+    """Entry point for a check worker process"""
+    parser = argparse.ArgumentParser(description="WebWatchDog check worker")
+    parser.add_argument("--batch-size", type=int, help="Tasks claimed per batch (default CHECK_QUEUE_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    worker = CheckWorker(batch_size=args.batch_size)
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping after the current batch")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    worker.run()
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()